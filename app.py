@@ -7,27 +7,44 @@ videos de YouTube, generar subtítulos y gestionar archivos.
 Características principales:
 - Procesamiento de videos de YouTube
 - Gestión de archivos de entrada/salida
-- Manejo de listas de reproducción
+- Manejo de listas de reproducción (expandidas en streaming y con caché)
 - API RESTful para interactuar con el frontend
+- Progreso de los trabajos en tiempo real (Server-Sent Events)
+- Cola de trabajos persistente, compartida con workers de otros procesos
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, stream_with_context
 from processor import VideoProcessor
+from jobs import JobQueue, read_url_file
+from cache import PlaylistCache
+from playlists import PlaylistExpander
+from metrics import metrics
 import os
+import re
 from pathlib import Path
 from dotenv import load_dotenv
-from asgiref.sync import async_to_sync
-from yt_dlp import YoutubeDL
 import json
+import queue
 from datetime import datetime
 from werkzeug.utils import secure_filename
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Archivos de bases de datos SQLite que no se sirven desde output
+DATABASE_FILE = re.compile(r'\.db(-wal|-shm|-journal)?$', re.IGNORECASE)
+
 # Inicializar aplicación Flask
 app = Flask(__name__, static_url_path='/static')
 processor = VideoProcessor()
+job_queue = JobQueue(processor)
+# Las entradas de las playlists se comparten con la caché de metadatos del procesador
+playlist_expander = PlaylistExpander(PlaylistCache(processor.cache), processor.metadata)
+
+@app.before_request
+def start_job_queue():
+    """Arranca los workers al recibir la primera petición (retoma la cola pendiente)"""
+    job_queue.start()
 
 # Rutas principales
 @app.route('/')
@@ -36,11 +53,11 @@ def index():
     return render_template('dashboard.html')
 
 @app.route('/process', methods=['POST'])
-async def process_video():
+def process_video():
     """
-    Procesa un video de YouTube
+    Encola un video de YouTube para procesarlo en segundo plano
     Recibe: URL del video en formato JSON
-    Retorna: Estado del procesamiento
+    Retorna: Identificador y estado del trabajo
     """
     try:
         data = request.get_json()
@@ -49,61 +66,239 @@ async def process_video():
         if not url:
             return jsonify({'error': 'URL no proporcionada'}), 400
 
-        processor = VideoProcessor()
-        
-        # Validar API key antes de procesar
-        if not await processor.validate_api():
+        # Validar API key antes de encolar
+        if not job_queue.run(processor.validate_api()):
             return jsonify({'error': 'API key inválida'}), 401
 
-        await processor.process_video(url)
-        return jsonify({'success': True, 'message': 'Video procesado correctamente'})
+        job = job_queue.submit(url)
+        return jsonify({
+            'success': True,
+            'message': 'Video encolado correctamente',
+            'job_id': job.id,
+            'status': job.status
+        }), 202
     
     except Exception as e:
         print(f"Error en /process: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs')
+def list_jobs():
+    """
+    Lista los trabajos de procesamiento
+    Parámetros: status (opcional) para filtrar por estado
+    Retorna: Lista de trabajos con su estado
+    """
+    status = request.args.get('status')
+    return jsonify([job.to_dict() for job in job_queue.list(status)])
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """
+    Obtiene el estado de un trabajo
+    Retorna: Estado del trabajo y error si lo hubo
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/process-batch', methods=['POST'])
+def process_batch():
+    """
+    Encola un lote de videos que se procesan concurrentemente en el servidor
+    Recibe: JSON con 'filename' (archivo .txt de la carpeta input) o 'urls'
+    Retorna: Identificador del lote y sus trabajos
+    """
+    try:
+        data = request.get_json() or {}
+        filename = data.get('filename')
+        urls = data.get('urls') or []
+
+        if filename:
+            file_path = Path(os.getenv('INPUT_DIR', 'input')) / secure_filename(filename)
+            if not file_path.exists():
+                return jsonify({'error': 'Archivo no encontrado'}), 404
+            urls = [entry['url'] for entry in read_url_file(file_path)]
+
+        urls = [url.strip() for url in urls if url and url.strip()]
+        if not urls:
+            return jsonify({'error': 'No hay URLs para procesar'}), 400
+
+        # Validar API key antes de encolar
+        if not job_queue.run(processor.validate_api()):
+            return jsonify({'error': 'API key inválida'}), 401
+
+        batch_id = job_queue.submit_batch(urls)
+        return jsonify(job_queue.get_batch(batch_id)), 202
+
+    except Exception as e:
+        print(f"Error en /process-batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/batches/<batch_id>')
+def get_batch(batch_id):
+    """
+    Obtiene el estado de un lote
+    Retorna: Recuento por estado y estado de cada trabajo
+    """
+    batch = job_queue.get_batch(batch_id)
+    if not batch:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+    return jsonify(batch)
+
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+SSE_KEEPALIVE = 15
+
+def _sse(kind, data):
+    """Formatea un evento de Server-Sent Events"""
+    return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+def _event_stream(job_id=None, batch_id=None):
+    """
+    Genera los eventos de los trabajos como Server-Sent Events.
+
+    Primero envía el estado actual de los trabajos que coinciden con el filtro
+    y después cada cambio de estado, de cola o de progreso. Los eventos de la
+    cola se envían siempre, para que el cliente calcule su posición.
+
+    Args:
+        job_id (str): Solo eventos de este trabajo (opcional)
+        batch_id (str): Solo eventos de los trabajos de este lote (opcional)
+    """
+    batch_jobs = job_queue.batch_job_ids(batch_id) if batch_id else None
+
+    def matches(data):
+        if job_id:
+            return data.get('job_id', data.get('id')) == job_id
+        if batch_id:
+            return data.get('job_id', data.get('id')) in batch_jobs
+        return True
+
+    # Suscribirse antes de la instantánea para no perder eventos entre ambas
+    subscriber = job_queue.subscribe()
+    try:
+        # La instantánea solo consulta los trabajos pedidos
+        if job_id:
+            job = job_queue.get(job_id)
+            snapshot = [job.to_dict()] if job else []
+        elif batch_id:
+            batch = job_queue.get_batch(batch_id)
+            snapshot = batch['jobs'] if batch else []
+        else:
+            snapshot = [job.to_dict() for job in reversed(job_queue.list())]
+        for data in snapshot:
+            yield _sse('job', data)
+        yield _sse('queue', {'queued': [job.id for job in job_queue.queued()]})
+
+        while True:
+            try:
+                kind, data = subscriber.get(timeout=SSE_KEEPALIVE)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if kind == 'queue' or matches(data):
+                yield _sse(kind, data)
+    finally:
+        job_queue.unsubscribe(subscriber)
+
+def _stream_response(events):
+    """Respuesta de Flask para un flujo de Server-Sent Events"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/jobs/stream')
+def stream_jobs():
+    """
+    Transmite el estado y el progreso de los trabajos (Server-Sent Events)
+    Parámetros: job o batch (opcionales) para filtrar por trabajo o lote
+    Retorna: Eventos job, queue y progress hasta que el cliente cierra la conexión
+    """
+    return _stream_response(_event_stream(
+        job_id=request.args.get('job'),
+        batch_id=request.args.get('batch')
+    ))
+
+@app.route('/jobs/<job_id>/events')
+def stream_job(job_id):
+    """
+    Transmite el estado y el progreso de un trabajo (Server-Sent Events)
+    Retorna: Eventos job, queue y progress del trabajo
+    """
+    if not job_queue.get(job_id):
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return _stream_response(_event_stream(job_id=job_id))
+
+@app.route('/metrics')
+def get_metrics():
+    """
+    Exporta las métricas del procesamiento en formato Prometheus
+    Retorna: Contadores, gauges e histogramas en texto plano
+    """
+    for status, count in job_queue.counts().items():
+        metrics.set('srt_jobs', count, status=status)
+
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/videos')
 def list_videos():
     """
-    Lista todos los videos procesados en la carpeta output
-    Retorna: Lista de videos con sus metadatos
+    Lista los videos procesados desde el índice persistente
+    Parámetros: page, per_page, sort (timestamp/title), order (asc/desc), q
+    Retorna: Página de videos con sus metadatos y el total
     """
-    output_dir = Path(os.getenv('OUTPUT_DIR', 'output'))
-    videos = []
-    
-    if output_dir.exists():
-        for video_dir in output_dir.iterdir():
-            if video_dir.is_dir():
-                html_file = video_dir / 'index.html'
-                if html_file.exists():
-                    try:
-                        # Leer URL original del report.txt
-                        report_file = video_dir / 'report.txt'
-                        youtube_url = ''
-                        if report_file.exists():
-                            with open(report_file, 'r', encoding='utf-8') as f:
-                                for line in f:
-                                    if line.startswith('URL:'):
-                                        youtube_url = line.split('URL:')[1].strip()
-                                        break
-                        
-                        videos.append({
-                            'title': video_dir.name,
-                            'path': f'output/{video_dir.name}/index.html',
-                            'youtubeUrl': youtube_url,
-                            'timestamp': datetime.fromtimestamp(html_file.stat().st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                        })
-                    except Exception as e:
-                        print(f"Error leyendo información del video {video_dir.name}: {e}")
-    
-    # Ordenar por fecha de procesamiento (más reciente primero)
-    videos.sort(key=lambda x: x['timestamp'], reverse=True)
-    return jsonify(videos)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 24, type=int), 1), 200)
+    sort = request.args.get('sort', 'timestamp')
+    order = request.args.get('order', 'desc')
+    search = request.args.get('q', '').strip()
+
+    # Sincronizar con la carpeta output si ha pasado el intervalo de reconciliación
+    processor.catalog.reconcile()
+    videos, total = processor.catalog.query(page, per_page, sort, order, search)
+
+    return jsonify({
+        'videos': videos,
+        'total': total,
+        'page': page,
+        'per_page': per_page
+    })
+
+@app.route('/search')
+def search_transcripts():
+    """
+    Busca un texto en los subtítulos de todos los videos procesados
+    Parámetros: q (palabras o "frases"), lang (opcional), page, per_page
+    Retorna: Videos con coincidencias, cada uno con el tiempo y enlace de sus subtítulos
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Consulta no proporcionada'}), 400
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    language = request.args.get('lang') or None
+
+    videos, total = processor.catalog.search(query, page, per_page, language)
+    return jsonify({
+        'query': query,
+        'videos': videos,
+        'total': total,
+        'page': page,
+        'per_page': per_page
+    })
 
 # Rutas para servir archivos
 @app.route('/output/<path:filename>')
 def serve_output(filename):
-    """Sirve archivos desde la carpeta output"""
+    """Sirve archivos desde la carpeta output (excepto bases de datos SQLite)"""
+    # Las bases de datos de versiones anteriores (jobs.db, catalog.db) pueden
+    # seguir en output y guardan todas las URLs y errores de los trabajos
+    if DATABASE_FILE.search(filename):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
     return send_from_directory('output', filename)
 
 @app.route('/static/<path:path>')
@@ -136,21 +331,7 @@ def get_file_urls(filename):
         return jsonify([])
     
     try:
-        urls = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    parts = line.split('#', 1)
-                    url = parts[0].strip()
-                    title = parts[1].strip() if len(parts) > 1 else ''
-                    
-                    if url:
-                        urls.append({
-                            'url': url,
-                            'title': title
-                        })
-        return jsonify(urls)
+        return jsonify(read_url_file(file_path))
     except Exception as e:
         print(f"Error leyendo archivo: {str(e)}")
         return jsonify([])
@@ -160,53 +341,64 @@ def get_file_urls(filename):
 def process_playlist():
     """
     Procesa una lista de reproducción de YouTube
+    Recibe: JSON con 'url' y opcionalmente 'start' y 'end' (posiciones desde 1)
     Retorna: Lista de videos en la playlist
     """
-    url = request.json.get('url')
+    data = request.json or {}
+    url = data.get('url')
     if not url:
         return jsonify({'error': 'URL no proporcionada'}), 400
+    try:
+        start = max(int(data.get('start') or 1), 1)
+        end = int(data['end']) if data.get('end') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start y end deben ser números enteros'}), 400
+    if end is not None and end < start:
+        return jsonify({'error': 'end debe ser mayor o igual que start'}), 400
 
     try:
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': True,
-            'force_generic_extractor': False,
-            'ignoreerrors': True,
-            'no_warnings': True,
-            'playlistreverse': False,
-            'playliststart': 1,
-            'playlistend': None,
-            'extract_flat': 'in_playlist'
-        }
-
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            videos = []
-            
-            if 'entries' in info:
-                for entry in info['entries']:
-                    if entry:
-                        videos.append({
-                            'title': entry.get('title', ''),
-                            'url': entry.get('url', '') or entry.get('webpage_url', ''),
-                            'duration': entry.get('duration', 0),
-                            'id': entry.get('id', '')
-                        })
-            elif info.get('_type') == 'url' and info.get('ie_key') == 'Youtube':
-                videos.append({
-                    'title': info.get('title', ''),
-                    'url': info.get('webpage_url', ''),
-                    'duration': info.get('duration', 0),
-                    'id': info.get('id', '')
-                })
-            
-            return jsonify({'videos': videos}) if videos else (
-                jsonify({'error': 'No se encontraron videos en la playlist'}), 404
-            )
+        videos = [
+            {key: event[key] for key in ('title', 'url', 'duration', 'id')}
+            for event in playlist_expander.expand(url, start, end)
+            if event['type'] == 'entry'
+        ]
+        return jsonify({'videos': videos}) if videos else (
+            jsonify({'error': 'No se encontraron videos en la playlist'}), 404
+        )
     except Exception as e:
         print(f"Error procesando playlist: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/playlist-entries')
+def stream_playlist():
+    """
+    Expande una lista de reproducción enviando los videos a medida que se resuelven
+    Parámetros: url, start y end (posiciones desde 1, opcionales), refresh=1 para ignorar la caché
+    Retorna: NDJSON, una línea por evento: playlist, entry (un video), end o error
+    """
+    url = request.args.get('url', '').strip()
+    if not url:
+        return jsonify({'error': 'URL no proporcionada'}), 400
+    start = max(request.args.get('start', 1, type=int), 1)
+    end = request.args.get('end', type=int)
+    if end is not None and end < start:
+        return jsonify({'error': 'end debe ser mayor o igual que start'}), 400
+    refresh = request.args.get('refresh') in ('1', 'true')
+
+    def lines():
+        try:
+            for event in playlist_expander.expand(url, start, end, refresh):
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+        except Exception as e:
+            print(f"Error procesando playlist: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False) + '\n'
+
+    return Response(
+        stream_with_context(lines()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/save-playlist', methods=['POST'])
 def save_playlist():
     """
@@ -0,0 +1,438 @@
+"""
+SRT YouTube Generator - Benchmark
+-------------------------------------
+Este módulo mide el rendimiento del procesamiento sin red ni API key:
+- Servidor HTTP local que imita los endpoints de OpenAI (transcripción,
+  chat y modelos) con latencia configurable y errores 429
+- Procesador con YouTube simulado que descarga un archivo multimedia local
+- Ejecución directa de process_video o a través de las rutas de Flask,
+  con varios niveles de concurrencia
+- Percentiles de latencia por etapa y videos por hora
+
+Uso:
+    python benchmark.py --videos 12 --concurrency 1,4,8 --latency 0.2
+
+Clases:
+    OpenAIStub: Servidor local que imita la API de OpenAI
+    BenchmarkProcessor: Procesador con YouTube simulado y tiempos por etapa
+
+Funciones:
+    make_fixture: Genera el archivo multimedia de prueba
+    percentile: Calcula un percentil de una lista de tiempos
+    run_processor: Mide process_video directamente
+    run_flask: Mide el procesamiento a través de /process-batch
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import inspect
+import tempfile
+import threading
+from pathlib import Path
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import ffmpeg
+import subtitles
+from processor import VideoProcessor
+from cache import ResultCache, MetadataCache
+from catalog import VideoCatalog
+from jobs import JobQueue
+from workqueue import WorkQueue
+
+# Métodos del procesador cronometrados y etapa a la que corresponden
+TIMED_STAGES = {
+    '_extract_info': 'metadata',
+    '_download': 'download',
+    '_extract_audio': 'audio',
+    'transcribe_audio': 'transcription',
+    'translate_subtitles': 'translation',
+    'generate_html': 'html',
+    'process_video': 'total'
+}
+
+# Percentiles incluidos en el informe
+PERCENTILES = (50, 90, 99)
+
+class OpenAIStub:
+    """
+    Servidor local que imita la API de OpenAI.
+
+    La transcripción devuelve un SRT determinista y el chat devuelve la
+    lista JSON recibida con cada texto marcado como traducido. Cada petición
+    espera `latency` segundos (más un margen aleatorio de `jitter`) y, con
+    probabilidad `error_rate`, responde 429 con cabecera retry-after.
+
+    Atributos:
+        latency (float): Latencia base de cada respuesta en segundos
+        jitter (float): Latencia aleatoria adicional máxima en segundos
+        error_rate (float): Probabilidad de responder 429
+        cues (int): Subtítulos de cada transcripción
+        requests (dict): Peticiones recibidas por endpoint
+        url (str): URL base para el cliente de OpenAI
+    """
+
+    def __init__(self, latency=0.2, jitter=0.05, error_rate=0.0, cues=30, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.cues = cues
+        self.requests = defaultdict(int)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_port}/v1'
+
+    def start(self):
+        """Arranca el servidor en un hilo en segundo plano"""
+        threading.Thread(target=self._server.serve_forever, name='openai-stub', daemon=True).start()
+        return self
+
+    def stop(self):
+        """Detiene el servidor"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _delay(self):
+        """Latencia de una respuesta y si debe fallar con 429"""
+        with self._lock:
+            return (
+                self.latency + self._random.uniform(0, self.jitter),
+                self._random.random() < self.error_rate
+            )
+
+    def _transcript(self):
+        """SRT determinista de una transcripción"""
+        return subtitles.compose(
+            subtitles.Cue(i * 2000, i * 2000 + 1800, f"Frase número {i + 1} de la prueba")
+            for i in range(self.cues)
+        )
+
+    def _completion(self, body):
+        """Respuesta de chat con la lista de textos del último mensaje traducida"""
+        texts = json.loads(body['messages'][-1]['content'])
+        return {
+            'id': 'chatcmpl-bench',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', ''),
+            'choices': [{
+                'index': 0,
+                'message': {
+                    'role': 'assistant',
+                    'content': json.dumps([f"[en] {text}" for text in texts], ensure_ascii=False)
+                },
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 10 * len(texts), 'completion_tokens': 10 * len(texts), 'total_tokens': 20 * len(texts)}
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type='application/json', headers=None):
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                stub.requests['models'] += 1
+                self._send(200, json.dumps({'object': 'list', 'data': []}))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                endpoint = self.path.rsplit('/', 1)[-1]
+                stub.requests[endpoint] += 1
+
+                delay, rate_limited = stub._delay()
+                time.sleep(delay)
+                if rate_limited:
+                    stub.requests['429'] += 1
+                    self._send(429, json.dumps({'error': {'message': 'Rate limit', 'type': 'rate_limit'}}),
+                               headers={'retry-after-ms': '100'})
+                elif endpoint == 'transcriptions':
+                    self._send(200, stub._transcript(), 'text/plain; charset=utf-8')
+                elif endpoint == 'completions':
+                    self._send(200, json.dumps(stub._completion(json.loads(body)), ensure_ascii=False))
+                else:
+                    self._send(404, json.dumps({'error': {'message': 'Not found'}}))
+
+        return Handler
+
+class BenchmarkProcessor(VideoProcessor):
+    """
+    Procesador con YouTube simulado y tiempos por etapa.
+
+    La extracción de metadatos devuelve información sintética y la descarga
+    copia el archivo de prueba, esperando `youtube_latency` segundos en cada
+    caso. Las llamadas a OpenAI van al servidor local.
+
+    Atributos:
+        fixture (Path): Archivo multimedia de prueba
+        duration (int): Duración del archivo de prueba en segundos
+        youtube_latency (float): Latencia simulada de YouTube en segundos
+        timings (dict): Duraciones registradas por etapa
+    """
+
+    def __init__(self, fixture, duration, work_dir, api_url, youtube_latency=0.1):
+        super().__init__()
+        self.fixture = fixture
+        self.duration = duration
+        self.youtube_latency = youtube_latency
+        self.timings = defaultdict(list)
+
+        self.api_key = 'bench'
+        self.api_base_url = api_url
+        self.output_dir = work_dir / 'output'
+        self.cache = ResultCache(work_dir / 'cache')
+        self.metadata = MetadataCache(self.cache)
+        self.catalog = VideoCatalog(self.output_dir)
+
+        for name, stage in TIMED_STAGES.items():
+            setattr(self, name, self._timed(stage, getattr(self, name)))
+
+    def _timed(self, stage, method):
+        """Envuelve un método (síncrono o asíncrono) para cronometrarlo"""
+        if inspect.iscoroutinefunction(method):
+            async def wrapper(*args, **kwargs):
+                with self._timer(stage):
+                    return await method(*args, **kwargs)
+        else:
+            def wrapper(*args, **kwargs):
+                with self._timer(stage):
+                    return method(*args, **kwargs)
+        return wrapper
+
+    @contextmanager
+    def _timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage].append(time.perf_counter() - start)
+
+    def _extract_info(self, url):
+        time.sleep(self.youtube_latency)
+        video_id = url.rsplit('=', 1)[-1]
+        return {
+            'id': video_id,
+            'title': f'Benchmark {video_id}',
+            'duration': self.duration,
+            'thumbnail': '',
+            'description': ''
+        }
+
+    def _download(self, info, output_dir, media_format, name, progress=None):
+        time.sleep(self.youtube_latency)
+        path = output_dir / f'{name}{self.fixture.suffix}'
+        shutil.copyfile(self.fixture, path)
+        return info, path
+
+def make_fixture(path, duration):
+    """
+    Genera el archivo multimedia de prueba: video pequeño con un tono
+    interrumpido por un segundo de silencio cada diez, para que la detección
+    de silencios tenga dónde cortar.
+
+    Args:
+        path (Path): Ruta del archivo MP4
+        duration (int): Duración en segundos
+
+    Returns:
+        Path: Ruta del archivo generado
+    """
+    audio = ffmpeg.input(f"aevalsrc='sin(440*2*PI*t)*gt(mod(t,10),1)':d={duration}", f='lavfi')
+    video = ffmpeg.input(f'color=c=black:s=64x64:r=5:d={duration}', f='lavfi')
+    ffmpeg.output(
+        video, audio, str(path),
+        vcodec='mpeg4', acodec='aac', shortest=None
+    ).overwrite_output().run(capture_stdout=True, capture_stderr=True)
+    return path
+
+def percentile(values, q):
+    """
+    Calcula un percentil por el método del rango más cercano.
+
+    Args:
+        values (list): Tiempos en segundos
+        q (float): Percentil (0-100)
+
+    Returns:
+        float: Valor del percentil o None si no hay valores
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def _urls(level, videos):
+    # IDs de 11 caracteres, como los de YouTube, para que no se deduplican entre sí
+    return [f'https://www.youtube.com/watch?v=b{level:04d}{i:06d}' for i in range(videos)]
+
+def run_processor(processor, urls, concurrency):
+    """
+    Mide process_video directamente con un número fijo de videos en curso.
+
+    Args:
+        processor (BenchmarkProcessor): Procesador de prueba
+        urls (list): URLs a procesar
+        concurrency (int): Videos procesados a la vez
+
+    Returns:
+        int: Número de videos fallidos
+    """
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(url):
+            async with semaphore:
+                await processor.process_video(url)
+
+        try:
+            results = await asyncio.gather(*(run(url) for url in urls), return_exceptions=True)
+        finally:
+            await processor.close()
+        return sum(isinstance(result, Exception) for result in results)
+
+    return asyncio.run(run_all())
+
+def run_flask(processor, urls, concurrency, poll_interval=0.2):
+    """
+    Mide el procesamiento a través de /process-batch y /batches/<id>, con
+    una cola de trabajos de `concurrency` workers.
+
+    Args:
+        processor (BenchmarkProcessor): Procesador de prueba
+        urls (list): URLs a procesar
+        concurrency (int): Workers de la cola de trabajos
+        poll_interval (float): Segundos entre consultas del lote
+
+    Returns:
+        int: Número de videos fallidos
+    """
+    import app as web
+
+    web.processor = processor
+    web.job_queue = JobQueue(processor, max_workers=concurrency, store=WorkQueue(processor.output_dir / 'jobs.db'))
+    client = web.app.test_client()
+
+    response = client.post('/process-batch', json={'urls': urls})
+    if response.status_code != 202:
+        raise RuntimeError(f"/process-batch respondió {response.status_code}: {response.get_json()}")
+    batch_id = response.get_json()['id']
+
+    while True:
+        batch = client.get(f'/batches/{batch_id}').get_json()
+        if batch['finished']:
+            return batch['counts']['failed']
+        time.sleep(poll_interval)
+
+def _report(mode, level, videos, failed, elapsed, timings):
+    """Resultado de un nivel de concurrencia"""
+    return {
+        'mode': mode,
+        'concurrency': level,
+        'videos': videos,
+        'failed': failed,
+        'elapsed': round(elapsed, 3),
+        'videos_per_hour': round((videos - failed) / elapsed * 3600, 1) if elapsed else 0,
+        'stages': {
+            stage: {
+                'count': len(timings[stage]),
+                **{f'p{q}': round(percentile(timings[stage], q), 4) for q in PERCENTILES},
+                'max': round(max(timings[stage]), 4)
+            }
+            for stage in TIMED_STAGES.values() if timings.get(stage)
+        }
+    }
+
+def _print_report(result):
+    print(f"\n=== {result['mode']} · concurrencia {result['concurrency']} ===")
+    print(f"Videos: {result['videos']} ({result['failed']} fallidos) en {result['elapsed']:.2f} s "
+          f"-> {result['videos_per_hour']:.0f} videos/hora")
+    print(f"{'etapa':<14}{'n':>5}" + ''.join(f"{f'p{q}':>10}" for q in PERCENTILES) + f"{'max':>10}")
+    for stage, stats in result['stages'].items():
+        print(f"{stage:<14}{stats['count']:>5}"
+              + ''.join(f"{stats[f'p{q}']:>10.3f}" for q in PERCENTILES)
+              + f"{stats['max']:>10.3f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark sin red del procesamiento de videos')
+    parser.add_argument('--videos', type=int, default=8, help='Videos por nivel de concurrencia')
+    parser.add_argument('--concurrency', default='1,4', help='Niveles de concurrencia separados por comas')
+    parser.add_argument('--mode', choices=('processor', 'flask', 'both'), default='processor')
+    parser.add_argument('--duration', type=int, default=60, help='Duración del archivo de prueba en segundos')
+    parser.add_argument('--latency', type=float, default=0.2, help='Latencia de la API simulada en segundos')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Latencia aleatoria adicional máxima')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probabilidad de respuestas 429')
+    parser.add_argument('--youtube-latency', type=float, default=0.1, help='Latencia simulada de YouTube')
+    parser.add_argument('--audio-only', action='store_true', help='Simular DOWNLOAD_VIDEO=false')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', type=Path, help='Guardar los resultados en un archivo JSON')
+    parser.add_argument('--min-throughput', type=float, default=0,
+                        help='Videos/hora mínimos; si algún nivel no llega, se sale con código 1')
+    args = parser.parse_args(argv)
+
+    # Las plantillas y el archivo .env se buscan en la carpeta del proyecto
+    os.chdir(Path(__file__).resolve().parent)
+
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    modes = ('processor', 'flask') if args.mode == 'both' else (args.mode,)
+    stub = OpenAIStub(args.latency, args.jitter, args.error_rate, cues=max(1, args.duration // 2), seed=args.seed).start()
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix='srt-bench-') as tmp:
+        tmp = Path(tmp)
+        # La aplicación y el procesador base crean sus bases de datos y
+        # cachés al iniciarse: se apuntan a la carpeta temporal para no
+        # tocar las del proyecto
+        os.environ['OUTPUT_DIR'] = str(tmp / 'output')
+        os.environ['CACHE_DIR'] = str(tmp / 'cache')
+        os.environ['JOBS_DB'] = str(tmp / 'cache' / 'jobs.db')
+        os.environ['CATALOG_DB'] = str(tmp / 'cache' / 'catalog.db')
+        fixture = make_fixture(tmp / 'fixture.mp4', args.duration)
+
+        for mode in modes:
+            for level in levels:
+                work_dir = tmp / f'{mode}-{level}'
+                processor = BenchmarkProcessor(fixture, args.duration, work_dir, stub.url, args.youtube_latency)
+                processor.download_video = not args.audio_only
+                urls = _urls(level, args.videos)
+
+                start = time.perf_counter()
+                runner = run_processor if mode == 'processor' else run_flask
+                failed = runner(processor, urls, level)
+                result = _report(mode, level, len(urls), failed, time.perf_counter() - start, processor.timings)
+                results.append(result)
+                _print_report(result)
+
+    stub.stop()
+    print(f"\nPeticiones a la API simulada: {dict(stub.requests)}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'requests': dict(stub.requests)}, f, indent=2)
+
+    slow = [result for result in results if result['videos_per_hour'] < args.min_throughput]
+    failed = [result for result in results if result['failed']]
+    return 1 if slow or failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""
+SRT YouTube Generator - Result Cache
+-------------------------------------
+Este módulo implementa una caché persistente en disco para los resultados de
+las llamadas de pago a OpenAI (transcripciones y traducciones):
+- Claves derivadas del contenido (ID del video, hash del audio, modelo, idioma)
+- Expiración por antigüedad
+- Expulsión de las entradas menos usadas al superar el tamaño máximo
+- Metadatos de yt-dlp por ID de video, compartidos entre procesamiento y playlists
+- Entradas de las playlists ya expandidas, para reabrirlas sin consultar YouTube
+
+Clases:
+    ResultCache: Caché de resultados en disco
+    MetadataCache: Metadatos de yt-dlp por ID de video
+    PlaylistCache: Entradas de las playlists expandidas
+
+Funciones:
+    file_hash: Calcula el hash SHA-256 del contenido de un archivo
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Segundos mínimos entre dos barridos de expulsión
+EVICT_INTERVAL = 300
+
+# Campos de la información de yt-dlp que no hacen falta para descargar y
+# que ocupan la mayor parte del JSON (subtítulos automáticos, miniaturas...)
+METADATA_SKIP_KEYS = ('automatic_captions', 'subtitles', 'thumbnails', 'heatmap')
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Calcula el hash SHA-256 del contenido de un archivo.
+
+    Args:
+        path (Path): Ruta al archivo
+        chunk_size (int): Tamaño de lectura en bytes
+
+    Returns:
+        str: Hash hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Caché de resultados en disco direccionada por contenido.
+
+    Cada entrada es un archivo de texto en `cache_dir/<espacio>/<xx>/<clave>`.
+    La fecha de modificación se actualiza en cada acierto, de modo que sirve
+    tanto para la expiración como para expulsar las entradas menos usadas.
+
+    Atributos:
+        cache_dir (Path): Directorio raíz de la caché
+        max_bytes (int): Tamaño máximo total de la caché
+        max_age (float): Antigüedad máxima de una entrada en segundos
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, max_age_days=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CACHE_DIR', '.cache'))
+        self.max_bytes = max_bytes or int(float(os.getenv('CACHE_MAX_MB', '500')) * 1024 * 1024)
+        self.max_age = (max_age_days or float(os.getenv('CACHE_MAX_AGE_DAYS', '30'))) * 86400
+        self._lock = threading.Lock()
+        self._last_evict = 0
+
+    @staticmethod
+    def key(*parts):
+        """
+        Genera una clave estable a partir de sus componentes.
+
+        Args:
+            *parts: Componentes de la clave (ID del video, hash, modelo...)
+
+        Returns:
+            str: Clave hexadecimal
+        """
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _path(self, namespace, key):
+        return self.cache_dir / namespace / key[:2] / key
+
+    def get(self, namespace, key, max_age=None, touch=True):
+        """
+        Obtiene una entrada de la caché.
+
+        Args:
+            namespace (str): Espacio de la entrada (p. ej. transcripts)
+            key (str): Clave de la entrada
+            max_age (float): Antigüedad máxima en segundos para esta consulta
+                (por defecto la de la caché)
+            touch (bool): Renovar la fecha de la entrada al leerla
+
+        Returns:
+            str: Contenido almacenado o None si no existe o ha expirado
+        """
+        path = self._path(namespace, key)
+        try:
+            if time.time() - path.stat().st_mtime > min(max_age or self.max_age, self.max_age):
+                path.unlink()
+                return None
+            value = path.read_text(encoding='utf-8')
+            if touch:
+                os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+
+    def put(self, namespace, key, value):
+        """
+        Guarda una entrada en la caché de forma atómica.
+
+        Args:
+            namespace (str): Espacio de la entrada
+            key (str): Clave de la entrada
+            value (str): Contenido a almacenar
+        """
+        path = self._path(namespace, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        if time.time() - self._last_evict > EVICT_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        """
+        Elimina las entradas expiradas y, si la caché supera el tamaño máximo,
+        las menos usadas recientemente.
+
+        Returns:
+            int: Número de entradas eliminadas
+        """
+        with self._lock:
+            self._last_evict = time.time()
+            if not self.cache_dir.exists():
+                return 0
+
+            now = time.time()
+            removed = 0
+            entries = []
+            for path in self.cache_dir.glob('*/*/*'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+
+            return removed
+
+class MetadataCache:
+    """
+    Metadatos de yt-dlp por ID de video.
+
+    Guarda tanto la información completa de un video (con sus formatos, que
+    permite descargarlo sin volver a consultar YouTube) como las entradas
+    parciales de las playlists. Una entrada parcial nunca sustituye a una
+    completa. La antigüedad máxima es corta porque las URLs de los formatos
+    caducan.
+
+    Atributos:
+        cache (ResultCache): Caché en disco subyacente
+        max_age (float): Antigüedad máxima de los metadatos en segundos
+    """
+
+    NAMESPACE = 'metadata'
+
+    def __init__(self, cache=None, max_age=None):
+        self.cache = cache or ResultCache()
+        self.max_age = max_age or float(os.getenv('METADATA_TTL', '10800'))
+
+    def get(self, video_id, full=True):
+        """
+        Obtiene los metadatos de un video.
+
+        Args:
+            video_id (str): ID del video
+            full (bool): Exigir la información completa (con formatos)
+
+        Returns:
+            dict: Metadatos o None si no hay entrada válida
+        """
+        if not video_id:
+            return None
+        value = self.cache.get(self.NAMESPACE, self.cache.key(video_id), self.max_age, touch=False)
+        if value is None:
+            return None
+        info = json.loads(value)
+        if full and not info.get('formats'):
+            return None
+        return info
+
+    def put(self, info):
+        """
+        Guarda la información completa de un video.
+
+        Args:
+            info (dict): Información de yt-dlp ya saneada (serializable)
+        """
+        if not info.get('id'):
+            return
+        info = {key: value for key, value in info.items() if key not in METADATA_SKIP_KEYS}
+        self.cache.put(self.NAMESPACE, self.cache.key(info['id']), json.dumps(info, ensure_ascii=False))
+
+    def put_entries(self, entries):
+        """
+        Guarda las entradas parciales de una playlist sin pisar información
+        completa que ya esté en la caché.
+
+        Args:
+            entries (list): Diccionarios con id, title, url y duration
+        """
+        for entry in entries:
+            if entry.get('id') and not self.get(entry['id']):
+                self.cache.put(self.NAMESPACE, self.cache.key(entry['id']), json.dumps(entry, ensure_ascii=False))
+
+class PlaylistCache:
+    """
+    Entradas de las playlists expandidas, por URL.
+
+    Cada entrada guarda el título de la playlist, sus videos en orden, la
+    fecha en que se obtuvieron y si se llegó al final de la lista. Las
+    entradas caducadas no se borran al leerlas: sirven de base para
+    actualizar la playlist de forma incremental.
+
+    Atributos:
+        cache (ResultCache): Caché en disco subyacente
+        ttl (float): Segundos durante los que una playlist se da por actual
+    """
+
+    NAMESPACE = 'playlists'
+
+    def __init__(self, cache=None, ttl=None):
+        self.cache = cache or ResultCache()
+        self.ttl = ttl or float(os.getenv('PLAYLIST_TTL', '3600'))
+
+    def get(self, url):
+        """
+        Obtiene una playlist guardada, actual o caducada.
+
+        Args:
+            url (str): URL de la playlist
+
+        Returns:
+            dict: title, entries, fetched_at, complete y fresh, o None si no hay
+        """
+        value = self.cache.get(self.NAMESPACE, self.cache.key(url))
+        if value is None:
+            return None
+        playlist = json.loads(value)
+        playlist['fresh'] = time.time() - playlist['fetched_at'] < self.ttl
+        return playlist
+
+    def put(self, url, title, entries, complete):
+        """
+        Guarda las entradas de una playlist.
+
+        Args:
+            url (str): URL de la playlist
+            title (str): Título de la playlist
+            entries (list): Videos en el orden de la playlist
+            complete (bool): Si las entradas llegan hasta el final de la lista
+        """
+        self.cache.put(self.NAMESPACE, self.cache.key(url), json.dumps({
+            'title': title,
+            'entries': entries,
+            'fetched_at': time.time(),
+            'complete': complete
+        }, ensure_ascii=False))
@@ -0,0 +1,510 @@
+"""
+SRT YouTube Generator - Video Catalog
+-------------------------------------
+Este módulo mantiene un índice persistente (SQLite) de los videos procesados
+para que el listado del dashboard no tenga que recorrer la carpeta output:
+- El procesamiento actualiza el índice al terminar cada video
+- Una reconciliación periódica (y al arrancar) detecta cambios externos
+- Consultas paginadas, ordenadas y filtradas
+- Búsqueda de la carpeta de un video por su ID
+- Índice de texto completo (FTS5) de los subtítulos, con el tiempo de cada
+  coincidencia, actualizado por archivo cuando cambian los .srt
+
+Clases:
+    VideoCatalog: Índice de videos procesados
+
+Funciones:
+    video_id_from_url: Extrae el ID del video de una URL de YouTube
+"""
+
+import os
+import re
+import html
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime
+from dotenv import load_dotenv
+import subtitles
+from workqueue import journal_mode
+from partial import MARKER as PARTIAL_MARKER
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Columnas por las que se puede ordenar el listado
+SORT_COLUMNS = {
+    'timestamp': 'processed_at',
+    'title': 'title COLLATE NOCASE'
+}
+
+# Archivos de subtítulos indexados (subtitles_<idioma>.srt)
+SUBTITLES_PATTERN = 'subtitles_*.srt'
+
+# Términos de una búsqueda: frases entre comillas o palabras sueltas
+SEARCH_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+# Marcas de inicio y fin de coincidencia que devuelve highlight()
+MATCH_START = '\x01'
+MATCH_END = '\x02'
+
+def _fts_query(text):
+    """
+    Convierte el texto buscado en una consulta FTS5 segura.
+
+    Cada palabra o frase entre comillas se busca literalmente (sin operadores
+    de FTS5) y todas deben aparecer en el subtítulo; la última palabra se
+    busca también como prefijo, para buscar mientras se escribe.
+
+    Args:
+        text (str): Texto introducido por el usuario
+
+    Returns:
+        str: Consulta FTS5, vacía si no hay términos
+    """
+    terms = []
+    prefix = False
+    for phrase, word in SEARCH_TERM.findall(text):
+        value = (phrase or word).replace('"', '""').strip()
+        if value:
+            terms.append(f'"{value}"')
+            prefix = bool(word)
+    if terms and prefix:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+# Formas del ID de un video en las URLs de YouTube
+VIDEO_ID_PATTERNS = [
+    r'(?:v=|\/)([0-9A-Za-z_-]{11}).*',
+    r'youtu\.be\/([0-9A-Za-z_-]{11})',
+    r'youtube\.com\/embed\/([0-9A-Za-z_-]{11})'
+]
+
+def video_id_from_url(url):
+    """
+    Extrae el ID del video de una URL de YouTube.
+
+    Args:
+        url (str): URL del video
+
+    Returns:
+        str: ID del video o None si no se encuentra
+    """
+    for pattern in VIDEO_ID_PATTERNS:
+        match = re.search(pattern, url or '')
+        if match:
+            return match.group(1)
+    return None
+
+class VideoCatalog:
+    """
+    Índice persistente de los videos procesados.
+
+    La base de datos está fuera de la carpeta de salida: sus archivos
+    temporales (-journal, -wal) cambiarían la fecha de modificación de la
+    carpeta con cada conexión. La carpeta se recorre al crear el catálogo y
+    después como mucho una vez por intervalo; los videos que se procesan se
+    añaden al terminar con upsert().
+
+    Atributos:
+        output_dir (Path): Carpeta de salida indexada
+        db_path (Path): Ruta de la base de datos SQLite
+        reconcile_interval (int): Segundos entre reconciliaciones completas
+        search_matches (int): Coincidencias que se devuelven por video al buscar
+    """
+
+    def __init__(self, output_dir=None, db_path=None):
+        self.output_dir = Path(output_dir or os.getenv('OUTPUT_DIR', 'output'))
+        self.db_path = Path(db_path or os.getenv('CATALOG_DB', Path(os.getenv('CACHE_DIR', '.cache')) / 'catalog.db'))
+        self.reconcile_interval = int(os.getenv('CATALOG_RECONCILE_INTERVAL', '300'))
+        self.search_matches = int(os.getenv('SEARCH_MATCHES_PER_VIDEO', '5'))
+        self._lock = threading.Lock()
+        self._last_reconcile = 0
+        self._init_db()
+        self.reconcile()
+
+    @contextmanager
+    def _connect(self):
+        """
+        Conexión nueva para una operación (segura entre hilos): confirma la
+        transacción al salir del bloque, o la deshace si hay error, y se cierra
+        """
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _init_db(self):
+        """Crea las tablas si no existen"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute(f'PRAGMA journal_mode={journal_mode().upper()}')
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS videos (
+                    dir TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    url TEXT NOT NULL DEFAULT '',
+                    video_id TEXT NOT NULL DEFAULT '',
+                    has_video INTEGER NOT NULL DEFAULT 0,
+                    processed_at TEXT NOT NULL,
+                    html_mtime REAL NOT NULL
+                )
+            ''')
+            db.execute('CREATE INDEX IF NOT EXISTS videos_processed_at ON videos (processed_at)')
+            db.execute('CREATE INDEX IF NOT EXISTS videos_video_id ON videos (video_id)')
+
+            # Subtítulos indexados; cues_fts es el índice invertido de su texto
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS cues (
+                    id INTEGER PRIMARY KEY,
+                    dir TEXT NOT NULL,
+                    lang TEXT NOT NULL,
+                    start_ms INTEGER NOT NULL,
+                    end_ms INTEGER NOT NULL,
+                    text TEXT NOT NULL
+                )
+            ''')
+            db.execute('CREATE INDEX IF NOT EXISTS cues_dir ON cues (dir, lang)')
+            db.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS cues_fts USING fts5(
+                    text, content='cues', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+            db.execute('''
+                CREATE TRIGGER IF NOT EXISTS cues_insert AFTER INSERT ON cues BEGIN
+                    INSERT INTO cues_fts (rowid, text) VALUES (new.id, new.text);
+                END
+            ''')
+            db.execute('''
+                CREATE TRIGGER IF NOT EXISTS cues_delete AFTER DELETE ON cues BEGIN
+                    INSERT INTO cues_fts (cues_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                END
+            ''')
+            # Fecha de modificación de cada archivo .srt indexado
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    dir TEXT NOT NULL,
+                    lang TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    PRIMARY KEY (dir, lang)
+                )
+            ''')
+
+    def _read_report(self, video_dir):
+        """Lee la URL original del report.txt de un video"""
+        report_file = video_dir / 'report.txt'
+        if report_file.exists():
+            with open(report_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('URL:'):
+                        return line.split('URL:')[1].strip()
+        return ''
+
+    def read_video_id(self, video_dir):
+        """
+        Lee el ID del video del manifest.json de su carpeta o, en las
+        carpetas anteriores al manifiesto (solo con el título), de la URL
+        de su report.txt
+        """
+        try:
+            with open(video_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+                return json.load(f)['stages']['metadata']['data'].get('id') or ''
+        except FileNotFoundError:
+            return video_id_from_url(self._read_report(video_dir)) or ''
+        except (ValueError, KeyError, TypeError):
+            return ''
+
+    def _row(self, video_dir, html_mtime, url=None, video_id=''):
+        """Construye la fila de un video a partir de su carpeta"""
+        return (
+            video_dir.name,
+            video_dir.name,
+            url if url is not None else self._read_report(video_dir),
+            video_id or self.read_video_id(video_dir),
+            int((video_dir / 'video.mp4').exists()),
+            datetime.fromtimestamp(html_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+            html_mtime
+        )
+
+    def _upsert_rows(self, db, rows):
+        db.executemany('''
+            INSERT INTO videos (dir, title, url, video_id, has_video, processed_at, html_mtime)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (dir) DO UPDATE SET
+                title = excluded.title,
+                url = excluded.url,
+                video_id = CASE WHEN excluded.video_id != '' THEN excluded.video_id ELSE videos.video_id END,
+                has_video = excluded.has_video,
+                processed_at = excluded.processed_at,
+                html_mtime = excluded.html_mtime
+        ''', rows)
+
+    def upsert(self, video_dir, url=None, video_id=''):
+        """
+        Añade o actualiza un video en el índice.
+
+        Args:
+            video_dir (Path): Carpeta del video
+            url (str): URL original (si no se indica, se lee del reporte)
+            video_id (str): ID del video de YouTube
+        """
+        html_file = video_dir / 'index.html'
+        if not html_file.exists():
+            return
+        with self._connect() as db:
+            self._upsert_rows(db, [self._row(video_dir, html_file.stat().st_mtime, url, video_id)])
+
+    def _index_transcripts(self, db, video_dir):
+        """Reindexa los archivos .srt de un video que han cambiado desde la última vez"""
+        indexed = {
+            row['lang']: row['mtime'] for row in
+            db.execute('SELECT lang, mtime FROM transcripts WHERE dir = ?', (video_dir.name,))
+        }
+        files = {path.stem.split('_', 1)[1]: path for path in video_dir.glob(SUBTITLES_PATTERN)}
+
+        for language, path in files.items():
+            mtime = path.stat().st_mtime
+            if indexed.get(language) == mtime:
+                continue
+            db.execute('DELETE FROM cues WHERE dir = ? AND lang = ?', (video_dir.name, language))
+            db.executemany(
+                'INSERT INTO cues (dir, lang, start_ms, end_ms, text) VALUES (?, ?, ?, ?, ?)',
+                ((video_dir.name, language, cue.start, cue.end, cue.text) for cue in subtitles.iter_file(path))
+            )
+            db.execute('''
+                INSERT INTO transcripts (dir, lang, mtime) VALUES (?, ?, ?)
+                ON CONFLICT (dir, lang) DO UPDATE SET mtime = excluded.mtime
+            ''', (video_dir.name, language, mtime))
+
+        for language in indexed.keys() - files.keys():
+            db.execute('DELETE FROM cues WHERE dir = ? AND lang = ?', (video_dir.name, language))
+            db.execute('DELETE FROM transcripts WHERE dir = ? AND lang = ?', (video_dir.name, language))
+
+    def index_transcripts(self, video_dir):
+        """
+        Actualiza el índice de texto completo con los subtítulos de un video.
+
+        Solo se vuelven a leer los archivos .srt cuya fecha de modificación
+        ha cambiado desde que se indexaron.
+
+        Args:
+            video_dir (Path): Carpeta del video
+        """
+        with self._connect() as db:
+            self._index_transcripts(db, video_dir)
+
+    def reconcile(self, force=False):
+        """
+        Sincroniza el índice con la carpeta de salida.
+
+        Solo se recorre la carpeta si ha pasado el intervalo de
+        reconciliación, y solo se leen los reportes de los videos nuevos o
+        cuyo index.html ha cambiado.
+
+        Args:
+            force (bool): Recorrer la carpeta aunque no haya pasado el intervalo
+        """
+        if not self.output_dir.exists():
+            return
+
+        with self._lock:
+            if not force and time.time() - self._last_reconcile <= self.reconcile_interval:
+                return
+            self._last_reconcile = time.time()
+
+            with self._connect() as db:
+                known = {}
+                missing_id = set()
+                for row in db.execute('SELECT dir, html_mtime, video_id FROM videos'):
+                    known[row['dir']] = row['html_mtime']
+                    if not row['video_id']:
+                        missing_id.add(row['dir'])
+
+                rows = []
+                seen = set()
+                changed = set()
+                for video_dir in self.output_dir.iterdir():
+                    # Las páginas parciales (video en curso o fallido) no se listan
+                    if (video_dir / PARTIAL_MARKER).exists():
+                        continue
+                    html_file = video_dir / 'index.html'
+                    try:
+                        html_mtime = html_file.stat().st_mtime
+                    except (FileNotFoundError, NotADirectoryError):
+                        continue
+                    seen.add(video_dir.name)
+                    # Las filas sin ID (de antes de guardarlo) se vuelven a leer
+                    if known.get(video_dir.name) != html_mtime or video_dir.name in missing_id:
+                        changed.add(video_dir.name)
+                        try:
+                            rows.append(self._row(video_dir, html_mtime))
+                        except Exception as e:
+                            print(f"Error leyendo información del video {video_dir.name}: {e}")
+
+                self._upsert_rows(db, rows)
+
+                # Subtítulos de los videos cambiados y de los que aún no están indexados
+                indexed = {row['dir'] for row in db.execute('SELECT DISTINCT dir FROM transcripts')}
+                for name in seen:
+                    if name in changed or name not in indexed:
+                        try:
+                            self._index_transcripts(db, self.output_dir / name)
+                        except Exception as e:
+                            print(f"Error indexando los subtítulos de {name}: {e}")
+
+                removed = [(name,) for name in known.keys() - seen]
+                db.executemany('DELETE FROM videos WHERE dir = ?', removed)
+                db.executemany('DELETE FROM cues WHERE dir = ?', removed)
+                db.executemany('DELETE FROM transcripts WHERE dir = ?', removed)
+
+    def find(self, video_id):
+        """
+        Busca la carpeta de un video por su ID.
+
+        Args:
+            video_id (str): ID del video de YouTube
+
+        Returns:
+            str: Nombre de la carpeta o None si el video no está en el índice
+        """
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT dir FROM videos WHERE video_id = ? ORDER BY processed_at DESC LIMIT 1',
+                (video_id,)
+            ).fetchone()
+        return row['dir'] if row else None
+
+    def query(self, page=1, per_page=24, sort='timestamp', order='desc', search=''):
+        """
+        Consulta una página del listado de videos.
+
+        Args:
+            page (int): Número de página, empezando en 1
+            per_page (int): Videos por página
+            sort (str): Campo de ordenación (timestamp, title)
+            order (str): asc o desc
+            search (str): Texto a buscar en el título
+
+        Returns:
+            tuple: (lista de videos, total de videos que cumplen el filtro)
+        """
+        column = SORT_COLUMNS.get(sort, SORT_COLUMNS['timestamp'])
+        direction = 'ASC' if order == 'asc' else 'DESC'
+        where, params = '', []
+        if search:
+            where = "WHERE title LIKE ? ESCAPE '\\'"
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+
+        with self._connect() as db:
+            total = db.execute(f'SELECT COUNT(*) FROM videos {where}', params).fetchone()[0]
+            rows = db.execute(
+                f'SELECT * FROM videos {where} ORDER BY {column} {direction} LIMIT ? OFFSET ?',
+                params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+
+        return [self._video(row) for row in rows], total
+
+    def _video(self, row):
+        """Datos de un video del listado a partir de su fila"""
+        return {
+            'title': row['title'],
+            'path': f"output/{row['dir']}/index.html",
+            'youtubeUrl': row['url'],
+            'videoId': row['video_id'],
+            'hasVideo': bool(row['has_video']),
+            'timestamp': row['processed_at']
+        }
+
+    def search(self, text, page=1, per_page=20, language=None):
+        """
+        Busca un texto en los subtítulos de todos los videos.
+
+        Los videos se ordenan por relevancia (la de su mejor coincidencia) y
+        de cada uno se devuelven las primeras coincidencias en orden de
+        tiempo, con el enlace que abre la página del video en ese momento.
+
+        Args:
+            text (str): Palabras o "frases entre comillas"; deben aparecer todas
+            page (int): Número de página, empezando en 1
+            per_page (int): Videos por página
+            language (str): Buscar solo en los subtítulos de este idioma (opcional)
+
+        Returns:
+            tuple: (lista de videos con sus coincidencias, total de videos con coincidencias)
+        """
+        match = _fts_query(text)
+        if not match:
+            return [], 0
+
+        self.reconcile()
+        where, params = '', [match]
+        if language:
+            where = 'WHERE cues.lang = ?'
+            params.append(language)
+        hits = f'''
+            SELECT cues.dir, found.rank FROM (
+                SELECT rowid, rank FROM cues_fts WHERE cues_fts MATCH ?
+            ) AS found JOIN cues ON cues.id = found.rowid {where}
+        '''
+
+        with self._connect() as db:
+            total = db.execute(f'SELECT COUNT(DISTINCT dir) FROM ({hits})', params).fetchone()[0]
+            groups = db.execute(
+                f'SELECT dir, COUNT(*) AS hits FROM ({hits}) GROUP BY dir ORDER BY MIN(rank) LIMIT ? OFFSET ?',
+                params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+            if not groups:
+                return [], total
+
+            dirs = [group['dir'] for group in groups]
+            marks = ', '.join('?' * len(dirs))
+            rows = {
+                row['dir']: row for row in
+                db.execute(f'SELECT * FROM videos WHERE dir IN ({marks})', dirs)
+            }
+            cues = db.execute(f'''
+                SELECT cues.dir, cues.lang, cues.start_ms, cues.end_ms, cues.text,
+                       highlight(cues_fts, 0, ?, ?) AS marked
+                FROM cues_fts JOIN cues ON cues.id = cues_fts.rowid
+                WHERE cues_fts MATCH ? AND cues.dir IN ({marks}) {where.replace('WHERE', 'AND')}
+                ORDER BY cues.dir, cues.start_ms
+            ''', [MATCH_START, MATCH_END, match] + dirs + params[1:]).fetchall()
+
+        matches = {name: [] for name in dirs}
+        for cue in cues:
+            if len(matches[cue['dir']]) < self.search_matches:
+                matches[cue['dir']].append(cue)
+
+        videos = []
+        for group in groups:
+            name = group['dir']
+            row = rows.get(name)
+            # Un video sin fila en el índice (aún sin reporte) se muestra igualmente
+            video = self._video(row) if row else {
+                'title': name,
+                'path': f"output/{name}/index.html",
+                'youtubeUrl': '',
+                'videoId': '',
+                'hasVideo': False,
+                'timestamp': ''
+            }
+            video['hits'] = group['hits']
+            video['matches'] = [{
+                'lang': cue['lang'],
+                'start': cue['start_ms'] / 1000,
+                'end': cue['end_ms'] / 1000,
+                'time': subtitles.format_timestamp(cue['start_ms']).split(',')[0],
+                'text': cue['text'],
+                'highlight': html.escape(cue['marked']).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'),
+                'link': f"{video['path']}#t={cue['start_ms'] / 1000:.3f}"
+            } for cue in matches[name]]
+            videos.append(video)
+        return videos, total
@@ -0,0 +1,605 @@
+"""
+SRT YouTube Generator - Job Queue
+-------------------------------------
+Este módulo implementa la cola de trabajos en segundo plano que procesa los
+videos sin mantener abiertas las peticiones HTTP:
+- Encolado de URLs con identificador de trabajo en una cola persistente
+- Pool acotado de workers sobre un bucle de eventos dedicado
+- Workers en otros procesos o máquinas que reclaman trabajos con leases
+- Consulta del estado de cada trabajo (queued/running/done/failed)
+- Lotes de URLs procesados concurrentemente
+- Deduplicación por ID de video (ya procesados o en curso)
+- Suscripción a los eventos de estado y progreso de los trabajos
+
+Clases:
+    Job: Estado de un trabajo de procesamiento
+    JobWorker: Reclama y procesa trabajos de la cola persistente
+    JobQueue: Cola de trabajos con un pool acotado de workers
+
+Funciones:
+    parse_url_lines: Extrae las URLs de las líneas de un archivo de entrada
+    read_url_file: Lee las URLs de un archivo de entrada .txt
+"""
+
+import os
+import uuid
+import queue
+import asyncio
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from processor import VideoProcessor
+from workqueue import WorkQueue
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Segundos máximos entre renovaciones del lease (y escrituras del progreso)
+HEARTBEAT_INTERVAL = 1.0
+
+def parse_url_lines(lines):
+    """
+    Extrae las URLs de las líneas de un archivo de entrada.
+
+    Cada línea contiene una URL seguida opcionalmente de `# título`. Las
+    líneas vacías y las que empiezan por `#` se ignoran.
+
+    Args:
+        lines (iterable): Líneas del archivo
+
+    Returns:
+        list: Lista de diccionarios con url y título
+    """
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            parts = line.split('#', 1)
+            url = parts[0].strip()
+            title = parts[1].strip() if len(parts) > 1 else ''
+
+            if url:
+                urls.append({
+                    'url': url,
+                    'title': title
+                })
+    return urls
+
+def read_url_file(file_path):
+    """
+    Lee las URLs de un archivo de entrada (ver parse_url_lines).
+
+    Args:
+        file_path (Path): Ruta al archivo .txt
+
+    Returns:
+        list: Lista de diccionarios con url y título
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return parse_url_lines(f)
+
+class Job:
+    """
+    Trabajo de procesamiento de un video.
+
+    Atributos:
+        id (str): Identificador único del trabajo
+        url (str): URL del video a procesar
+        batch_id (str): Lote al que pertenece el trabajo, si lo hay
+        video_id (str): ID del video extraído de la URL, si se reconoce
+        skipped (bool): El video ya estaba procesado y no se ha repetido
+        status (str): Estado actual (queued, running, done, failed)
+        error (str): Mensaje de error si el trabajo ha fallado
+        attempts (int): Veces que un worker ha reclamado el trabajo
+        worker (str): Worker que tiene el lease del trabajo en curso
+        created_at (str): Fecha de encolado
+        started_at (str): Fecha de inicio del procesamiento
+        finished_at (str): Fecha de finalización
+        progress (dict): Último progreso notificado (etapa, porcentaje...)
+        result (dict): Página y archivos generados al terminar
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, url, batch_id=None, video_id=None):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.batch_id = batch_id
+        self.video_id = video_id
+        self.skipped = False
+        self.status = self.QUEUED
+        self.error = None
+        self.attempts = 0
+        self.worker = None
+        self.created_at = self._now()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.result = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Reconstruye un trabajo a partir de sus campos guardados.
+
+        Args:
+            data (dict): Campos del trabajo (ver to_dict y WorkQueue)
+
+        Returns:
+            Job: Trabajo
+        """
+        job = cls(data['url'], data['batch_id'], data['video_id'])
+        for field in ('id', 'skipped', 'status', 'error', 'attempts', 'worker', 'created_at',
+                      'started_at', 'finished_at', 'progress', 'result'):
+            setattr(job, field, data[field])
+        return job
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def finish(self, error=None):
+        """
+        Marca el trabajo como terminado.
+
+        Args:
+            error (str): Mensaje de error si el trabajo ha fallado
+        """
+        self.status = self.FAILED if error else self.DONE
+        self.error = error
+        self.finished_at = self._now()
+
+    def skip(self, result):
+        """
+        Marca el trabajo como terminado sin procesar, porque el video ya
+        estaba procesado.
+
+        Args:
+            result (dict): Página y archivos del video ya procesado
+        """
+        self.skipped = True
+        self.result = result
+        self.finish()
+
+    def to_dict(self):
+        """Representación serializable del trabajo"""
+        return {
+            'id': self.id,
+            'url': self.url,
+            'batch_id': self.batch_id,
+            'video_id': self.video_id,
+            'skipped': self.skipped,
+            'status': self.status,
+            'error': self.error,
+            'attempts': self.attempts,
+            'worker': self.worker,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': self.progress,
+            'result': self.result
+        }
+
+class JobWorker:
+    """
+    Worker que reclama trabajos de la cola persistente y los procesa.
+
+    Procesa hasta `concurrency` trabajos a la vez. Mientras un trabajo está
+    en curso se renueva su lease y se guarda su progreso cada
+    HEARTBEAT_INTERVAL segundos; si el lease se pierde (otro worker lo ha
+    reclamado por creerlo abandonado) el procesamiento se cancela. Al parar
+    el worker, sus trabajos en curso vuelven a la cola.
+
+    Atributos:
+        processor (VideoProcessor): Procesador de los trabajos
+        store (WorkQueue): Cola persistente de la que se reclaman trabajos
+        concurrency (int): Trabajos procesados a la vez
+        poll_interval (float): Segundos entre comprobaciones de la cola vacía
+        running (dict): Trabajos en curso indexados por identificador
+    """
+
+    def __init__(self, processor, store, concurrency, publish=None):
+        self.processor = processor
+        self.store = store
+        self.concurrency = concurrency
+        self.poll_interval = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+        self.running = {}
+        self._publish = publish or (lambda kind, data: None)
+        self._loop = None
+        self._wake = None
+
+    def wake(self):
+        """Avisa de que hay trabajos nuevos (se puede llamar desde cualquier hilo)"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def queued_ids(self):
+        """Identificadores de los trabajos en cola, por orden"""
+        return [job['id'] for job in self.store.list(Job.QUEUED)]
+
+    async def run(self):
+        """Reclama y procesa trabajos hasta que se cancela"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        tasks = set()
+        try:
+            while True:
+                if len(self.running) < self.concurrency:
+                    try:
+                        data = await asyncio.to_thread(self.store.claim)
+                    except Exception as e:
+                        print(f"Error reclamando trabajos: {str(e)}")
+                        data = None
+                    if data is not None:
+                        job = Job.from_dict(data)
+                        self.running[job.id] = job
+                        task = asyncio.create_task(self._process(job))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                        continue
+
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _process(self, job):
+        """Procesa un trabajo reclamado mientras se renueva su lease"""
+        self._publish('job', job.to_dict())
+        self._publish('queue', {'queued': await asyncio.to_thread(self.queued_ids)})
+
+        processing = asyncio.ensure_future(self.processor.process_video(
+            job.url,
+            progress=lambda stage, data: self._progress(job, stage, data)
+        ))
+        heartbeat = asyncio.create_task(self._heartbeat(job, processing))
+        try:
+            try:
+                await processing
+                job.finish()
+            except asyncio.CancelledError:
+                if heartbeat.done() and not heartbeat.cancelled() and heartbeat.result():
+                    # Otro worker tiene ya el trabajo
+                    return
+                # El worker se está parando: el trabajo vuelve a la cola
+                self.store.release(job.id)
+                print(f"Trabajo {job.id} devuelto a la cola")
+                raise
+            except Exception as e:
+                print(f"Error en el trabajo {job.id}: {str(e)}")
+                job.finish(error=str(e))
+            finally:
+                heartbeat.cancel()
+
+            if await asyncio.to_thread(self.store.finish, job.to_dict()):
+                job.worker = None
+                self._publish('job', job.to_dict())
+            else:
+                print(f"El trabajo {job.id} había perdido su lease; se descarta su resultado")
+        finally:
+            self.running.pop(job.id, None)
+            self._wake.set()
+
+    async def _heartbeat(self, job, processing):
+        """
+        Renueva el lease de un trabajo y guarda su progreso hasta que termina.
+
+        Returns:
+            bool: True si el lease se ha perdido y se ha cancelado el procesamiento
+        """
+        interval = min(HEARTBEAT_INTERVAL, self.store.lease_seconds / 3)
+        while not processing.done():
+            await asyncio.sleep(interval)
+            try:
+                owned = await asyncio.to_thread(self.store.heartbeat, job.to_dict())
+            except Exception as e:
+                print(f"Error renovando el lease del trabajo {job.id}: {str(e)}")
+                continue
+            if not owned:
+                print(f"El trabajo {job.id} ha perdido su lease; se cancela")
+                processing.cancel()
+                return True
+        return False
+
+    def _progress(self, job, stage, data):
+        """Guarda y publica un evento de progreso del procesador"""
+        if stage == 'artifacts':
+            job.result = data
+        else:
+            job.progress = {'stage': stage, **data}
+        self._publish('progress', {'job_id': job.id, 'batch_id': job.batch_id, 'stage': stage, **data})
+
+class JobQueue:
+    """
+    Cola de trabajos con un pool acotado de workers.
+
+    Los trabajos se guardan en una cola persistente (WorkQueue), así que
+    sobreviven a un reinicio del servidor y los pueden procesar también
+    workers de otros procesos o máquinas (`python main.py --worker`) que
+    compartan la carpeta output y la base de datos de la cola. Los workers locales son tareas de un bucle
+    de eventos propio que corre en un hilo en segundo plano, de modo que las
+    peticiones de Flask solo encolan la URL y devuelven el identificador del
+    trabajo inmediatamente. Con max_workers=0 el servidor solo encola.
+
+    Los trabajos se identifican por el ID del video de su URL: si el video
+    ya está procesado el trabajo termina sin encolarse, y si ya está en cola
+    o en curso se devuelve ese mismo trabajo en lugar de crear otro.
+
+    Cada cambio de estado, de posición en la cola o de progreso se publica a
+    los suscriptores (una cola por suscriptor) como una tupla (tipo, datos):
+    - job: estado completo de un trabajo
+    - queue: identificadores de los trabajos en cola, por orden
+    - progress: progreso de una etapa de un trabajo
+    Los cambios hechos por otros procesos se leen de la cola persistente
+    cada poll_interval segundos.
+
+    Atributos:
+        processor (VideoProcessor): Procesador compartido por los workers
+        max_workers (int): Número máximo de videos procesados a la vez aquí
+        store (WorkQueue): Cola persistente de trabajos y lotes
+        worker (JobWorker): Workers locales
+        poll_interval (float): Segundos entre lecturas de cambios de otros procesos
+    """
+
+    def __init__(self, processor=None, max_workers=None, store=None):
+        self.processor = processor or VideoProcessor()
+        self.max_workers = max_workers if max_workers is not None else int(os.getenv('MAX_WORKERS', '4'))
+        self.store = store or WorkQueue()
+        self.worker = JobWorker(self.processor, self.store, self.max_workers, self._publish)
+        self.poll_interval = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._loop = None
+        self._subscribers = set()
+
+    def start(self):
+        """Arranca el bucle de eventos y los workers si aún no están activos"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run_loop,
+                    name='job-queue',
+                    daemon=True
+                )
+                self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        """Punto de entrada del hilo en segundo plano"""
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        if self.max_workers > 0:
+            self._loop.create_task(self.worker.run())
+        self._loop.create_task(self._watch())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _watch(self):
+        """Publica los cambios de los trabajos hechos por otros procesos"""
+        version = await asyncio.to_thread(self.store.version)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changed, version = await asyncio.to_thread(self.store.changes, version)
+                queued = await asyncio.to_thread(self.worker.queued_ids) if changed else None
+            except Exception as e:
+                print(f"Error leyendo cambios de la cola de trabajos: {str(e)}")
+                continue
+
+            for data in changed:
+                self._publish('job', Job.from_dict(data).to_dict())
+                if data['status'] == Job.RUNNING and data['progress']:
+                    self._publish('progress', {'job_id': data['id'], 'batch_id': data['batch_id'], **data['progress']})
+            if changed:
+                self._publish('queue', {'queued': queued})
+
+    def _publish(self, kind, data):
+        """
+        Envía un evento a todos los suscriptores.
+
+        Puede llamarse desde cualquier hilo. Si la cola de un suscriptor está
+        llena (un cliente que no lee), el evento se descarta para él.
+
+        Args:
+            kind (str): Tipo de evento (job, queue, progress)
+            data (dict): Datos del evento
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((kind, data))
+            except queue.Full:
+                pass
+
+    def subscribe(self, maxsize=1000):
+        """
+        Crea una suscripción a los eventos de los trabajos.
+
+        Args:
+            maxsize (int): Eventos pendientes como máximo
+
+        Returns:
+            queue.Queue: Cola de la que leer los eventos (tipo, datos)
+        """
+        self.start()
+        subscriber = queue.Queue(maxsize)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """
+        Cancela una suscripción.
+
+        Args:
+            subscriber (queue.Queue): Cola devuelta por subscribe
+        """
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def submit(self, url, batch_id=None):
+        """
+        Encola una URL para procesarla en segundo plano.
+
+        Antes de encolar se comprueba el ID del video: si ya está procesado
+        el trabajo se da por terminado sin descargar nada, y si ya hay un
+        trabajo en cola o en curso para el mismo video (en cualquier proceso)
+        se devuelve ese.
+
+        Args:
+            url (str): URL del video de YouTube
+            batch_id (str): Lote al que pertenece el trabajo (opcional)
+
+        Returns:
+            Job: Trabajo creado o el trabajo existente del mismo video
+        """
+        self.start()
+        video_id = self.processor.extract_video_id(url)
+        job = Job(url, batch_id, video_id)
+
+        video_dir = self.processor.processed_dir(video_id) if video_id else None
+        if video_dir is not None:
+            print(f"El video {video_id} ya está procesado en {video_dir}")
+            job.skip(self.processor.artifacts(video_dir))
+            self.store.add(job.to_dict())
+            self._publish('job', job.to_dict())
+            return job
+
+        stored = Job.from_dict(self.store.add(job.to_dict()))
+        if stored.id != job.id:
+            print(f"El video {video_id} ya está en proceso (trabajo {stored.id})")
+            return stored
+
+        self.worker.wake()
+        self._publish('job', job.to_dict())
+        return job
+
+    def submit_batch(self, urls):
+        """
+        Encola un lote de URLs que los workers procesan concurrentemente.
+
+        Las URLs de videos ya procesados o en curso no se vuelven a procesar:
+        el lote incluye el trabajo existente o uno terminado al instante.
+
+        Args:
+            urls (list): URLs de los videos
+
+        Returns:
+            str: Identificador del lote
+        """
+        batch_id = uuid.uuid4().hex
+        job_ids = [self.submit(url, batch_id).id for url in urls]
+        self.store.add_batch(batch_id, job_ids)
+        return batch_id
+
+    def get_batch(self, batch_id):
+        """
+        Obtiene el resumen de un lote.
+
+        Args:
+            batch_id (str): Identificador del lote
+
+        Returns:
+            dict: Recuento por estado y trabajos del lote, o None si no existe
+        """
+        rows = self.store.batch(batch_id)
+        if rows is None:
+            return None
+        jobs = [Job.from_dict(row) for row in rows]
+
+        counts = {status: 0 for status in (Job.QUEUED, Job.RUNNING, Job.DONE, Job.FAILED)}
+        for job in jobs:
+            counts[job.status] += 1
+
+        return {
+            'id': batch_id,
+            'total': len(jobs),
+            'counts': counts,
+            'skipped': sum(job.skipped for job in jobs),
+            'finished': counts[Job.DONE] + counts[Job.FAILED] == len(jobs),
+            'jobs': [job.to_dict() for job in jobs]
+        }
+
+    def batch_job_ids(self, batch_id):
+        """
+        Identificadores de los trabajos de un lote.
+
+        Un lote puede incluir trabajos de otros lotes (videos que ya estaban
+        en curso), así que la pertenencia no se deduce de job.batch_id.
+
+        Args:
+            batch_id (str): Identificador del lote
+
+        Returns:
+            set: Identificadores de trabajo (vacío si el lote no existe)
+        """
+        return set(self.store.batch_job_ids(batch_id))
+
+    def get(self, job_id):
+        """
+        Obtiene un trabajo por su identificador.
+
+        Args:
+            job_id (str): Identificador del trabajo
+
+        Returns:
+            Job: Trabajo o None si no existe
+        """
+        data = self.store.get(job_id)
+        return Job.from_dict(data) if data else None
+
+    def list(self, status=None):
+        """
+        Lista los trabajos conocidos, del más reciente al más antiguo.
+
+        Args:
+            status (str): Filtrar por estado (opcional)
+
+        Returns:
+            list: Trabajos
+        """
+        return [Job.from_dict(data) for data in reversed(self.store.list(status))]
+
+    def queued(self):
+        """
+        Lista los trabajos en cola en el orden en que se procesarán.
+
+        Returns:
+            list: Trabajos en cola, del más antiguo al más reciente
+        """
+        return [Job.from_dict(data) for data in self.store.list(Job.QUEUED)]
+
+    def counts(self):
+        """
+        Cuenta los trabajos por estado.
+
+        Returns:
+            dict: Número de trabajos de cada estado
+        """
+        counts = {status: 0 for status in (Job.QUEUED, Job.RUNNING, Job.DONE, Job.FAILED)}
+        counts.update(self.store.counts())
+        return counts
+
+    def run(self, coro, timeout=None):
+        """
+        Ejecuta una corrutina en el bucle de la cola y espera su resultado.
+
+        Args:
+            coro: Corrutina a ejecutar
+            timeout (float): Tiempo máximo de espera en segundos
+
+        Returns:
+            Resultado de la corrutina
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
@@ -0,0 +1,86 @@
+"""
+SRT YouTube Generator - Stage Limits
+-------------------------------------
+Este módulo limita la concurrencia de cada etapa del procesamiento para que
+varios videos puedan solaparse sin saturar la red, la CPU o la API:
+- download: descargas y consultas a YouTube (yt-dlp)
+- ffmpeg: procesos de ffmpeg (extracción, silencios, fragmentos)
+- io: lectura y escritura de archivos, hashes, caché y catálogo
+
+Clases:
+    StageLimits: Límites de concurrencia independientes por etapa
+"""
+
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv()
+
+class StageLimits:
+    """
+    Límites de concurrencia independientes por etapa.
+
+    Las etapas bloqueantes (download, io) se ejecutan en un pool de hilos
+    propio cuyo tamaño es el límite de la etapa, para no bloquear el bucle
+    de eventos. La etapa asíncrona (ffmpeg, que corre como subproceso) se
+    limita con un semáforo por bucle de eventos. Las llamadas a OpenAI las
+    limita el planificador de ratelimit (OPENAI_CONCURRENCY).
+
+    Atributos:
+        sizes (dict): Número máximo de operaciones simultáneas por etapa
+    """
+
+    def __init__(self, download=None, ffmpeg=None, io=None):
+        self.sizes = {
+            'download': download or int(os.getenv('DOWNLOAD_CONCURRENCY', '2')),
+            'ffmpeg': ffmpeg or int(os.getenv('FFMPEG_CONCURRENCY', str(os.cpu_count() or 2))),
+            'io': io or int(os.getenv('IO_CONCURRENCY', '4'))
+        }
+        self._executors = {}
+        self._semaphores = {}
+
+    def _executor(self, stage):
+        """Pool de hilos de una etapa bloqueante, creado bajo demanda"""
+        if stage not in self._executors:
+            self._executors[stage] = ThreadPoolExecutor(
+                max_workers=self.sizes[stage],
+                thread_name_prefix=f'stage-{stage}'
+            )
+        return self._executors[stage]
+
+    async def run(self, stage, func, *args):
+        """
+        Ejecuta una función bloqueante en el pool de su etapa.
+
+        Args:
+            stage (str): Nombre de la etapa (download, io)
+            func (callable): Función a ejecutar
+            *args: Argumentos de la función
+
+        Returns:
+            Resultado de la función
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(stage), func, *args)
+
+    @asynccontextmanager
+    async def slot(self, stage):
+        """
+        Reserva un hueco de una etapa asíncrona mientras dura el bloque.
+
+        Args:
+            stage (str): Nombre de la etapa (ffmpeg)
+        """
+        loop = asyncio.get_running_loop()
+        key = (stage, loop)
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.sizes[stage])
+        async with self._semaphores[key]:
+            yield
+
+# Límites compartidos por todos los procesadores del proceso
+stage_limits = StageLimits()
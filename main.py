@@ -1,15 +1,61 @@
+"""
+SRT YouTube Generator - Command Line
+-------------------------------------
+Punto de entrada de consola. Sin argumentos muestra el menú interactivo; con
+URLs o archivos de entrada procesa el lote sin intervención, pensado para
+cron o nodos de trabajo:
+- Varios videos a la vez por proceso y, opcionalmente, varios procesos
+- Ejecución hasta una etapa concreta
+- Un resultado JSON por video (JSON lines)
+- Código de salida que indica si ha fallado algún video
+- Workers de la cola de trabajos persistente y encolado de URLs en ella
+
+Clases:
+    Menu: Menú interactivo
+
+Funciones:
+    parse_args: Interpreta los argumentos de la línea de comandos
+    collect_urls: Reúne las URLs de los argumentos y archivos, sin repetir videos
+    process_urls: Procesa URLs concurrentemente y entrega un resultado por video
+    run_headless: Ejecuta el modo por lotes y devuelve el código de salida
+    run_worker: Procesa trabajos de la cola persistente hasta que se detiene
+    run_enqueue: Encola las URLs en la cola persistente sin procesarlas
+"""
+
+import sys
+import json
+import time
+import queue
+import signal
 import asyncio
+import argparse
+import contextlib
+import multiprocessing
 from processor import VideoProcessor
+from manifest import STAGES
+from jobs import JobQueue, JobWorker, read_url_file, parse_url_lines
+from workqueue import WorkQueue
 from pathlib import Path
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Códigos de salida del modo por lotes
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_FAILED = 2
+
 class Menu:
     def __init__(self):
         self.processor = VideoProcessor()
 
+    async def run(self):
+        try:
+            await self.main_menu()
+        finally:
+            await self.processor.close()
+
     async def main_menu(self):
         # Validar API key
         print("Validando API key...")
@@ -41,8 +87,7 @@ class Menu:
             print(f"Archivo no encontrado: {input_file}")
             return
 
-        with open(input_file, 'r') as f:
-            urls = [line.strip() for line in f if line.strip()]
+        urls = [entry['url'] for entry in read_url_file(input_file)]
 
         print(f"\nEncontradas {len(urls)} URLs")
         print("1. Procesar todas")
@@ -51,9 +96,7 @@ class Menu:
         option = input("\nSeleccione una opción: ")
         
         if option == "1":
-            for url in urls:
-                print(f"\nProcesando: {url}")
-                await self.processor.process_video(url)
+            await self.process_batch(urls)
         elif option == "2":
             for i, url in enumerate(urls, 1):
                 print(f"{i}. {url}")
@@ -66,11 +109,397 @@ class Menu:
             except ValueError:
                 print("Entrada no válida")
 
+    async def process_batch(self, urls):
+        # Procesar varias URLs a la vez; los límites por etapa del procesador
+        # reparten descargas, ffmpeg y llamadas a OpenAI entre los videos
+        semaphore = asyncio.Semaphore(int(os.getenv('MAX_WORKERS', '4')))
+
+        async def run(url):
+            async with semaphore:
+                print(f"\nProcesando: {url}")
+                await self.processor.process_video(url)
+
+        results = await asyncio.gather(*(run(url) for url in urls), return_exceptions=True)
+        failed = [url for url, result in zip(urls, results) if isinstance(result, Exception)]
+
+        print(f"\nProcesadas {len(urls) - len(failed)} de {len(urls)} URLs")
+        for url in failed:
+            print(f"Error: {url}")
+
     async def process_single(self):
         url = input("\nIntroduzca la URL de YouTube: ")
         if url.strip():
             await self.processor.process_video(url)
 
+def parse_args(argv=None):
+    """
+    Interpreta los argumentos de la línea de comandos.
+
+    Args:
+        argv (list): Argumentos (por defecto los del proceso)
+
+    Returns:
+        Namespace: Argumentos interpretados
+    """
+    parser = argparse.ArgumentParser(
+        description="Genera subtítulos de videos de YouTube. Sin argumentos muestra el menú interactivo.",
+        epilog=(
+            f"Códigos de salida: {EXIT_OK} todos los videos bien, {EXIT_PARTIAL} algún video "
+            f"falló, {EXIT_FAILED} no se procesó ninguno (o argumentos/API key inválidos)."
+        )
+    )
+    parser.add_argument('urls', nargs='*', help="URLs de YouTube")
+    parser.add_argument('-i', '--input', action='append', default=[], metavar='ARCHIVO',
+                        help="Archivo .txt de URLs (se puede repetir; '-' lee de la entrada estándar)")
+    # MAX_WORKERS=0 deja el servidor solo encolando; aquí hace falta al menos uno
+    parser.add_argument('-c', '--concurrency', type=int, default=max(int(os.getenv('MAX_WORKERS', '4')), 1),
+                        help="Videos a la vez por proceso (por defecto MAX_WORKERS)")
+    parser.add_argument('-p', '--processes', type=int, default=1,
+                        help="Procesos en paralelo; las URLs se reparten entre ellos")
+    parser.add_argument('--until', choices=STAGES, metavar='ETAPA',
+                        help=f"Última etapa a ejecutar ({', '.join(STAGES)})")
+    parser.add_argument('-o', '--output', default='-', metavar='ARCHIVO',
+                        help="Archivo JSON lines con un resultado por video ('-': salida estándar)")
+    parser.add_argument('--skip-validation', action='store_true',
+                        help="No validar la API key antes de empezar")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--worker', action='store_true',
+                      help="Procesar trabajos de la cola persistente (JOBS_DB) hasta detener el proceso")
+    mode.add_argument('--enqueue', action='store_true',
+                      help="Encolar las URLs en la cola persistente para que las procesen los workers")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency debe ser al menos 1")
+    if args.processes < 1:
+        parser.error("--processes debe ser al menos 1")
+    if args.worker and (args.urls or args.input):
+        parser.error("--worker no admite URLs: las toma de la cola persistente")
+    return args
+
+def _open_output(path):
+    """Abre el archivo de resultados (--output); None si no se puede abrir"""
+    if path == '-':
+        return sys.stdout
+    try:
+        return open(path, 'a', encoding='utf-8')
+    except OSError as e:
+        print(f"Error abriendo el archivo de resultados: {str(e)}", file=sys.stderr)
+        return None
+
+def collect_urls(args, processor):
+    """
+    Reúne las URLs de los argumentos y archivos de entrada.
+
+    Las URLs del mismo video (mismo ID) se procesan una sola vez.
+
+    Args:
+        args (Namespace): Argumentos interpretados
+        processor (VideoProcessor): Procesador, para extraer el ID de cada URL
+
+    Returns:
+        list: URLs sin videos repetidos, en orden de aparición
+
+    Raises:
+        OSError: Si no se puede leer un archivo de entrada
+    """
+    urls = list(args.urls)
+    for input_file in args.input:
+        if input_file == '-':
+            entries = parse_url_lines(sys.stdin)
+        else:
+            entries = read_url_file(Path(input_file))
+        urls.extend(entry['url'] for entry in entries)
+
+    unique = {}
+    for url in urls:
+        unique.setdefault(processor.extract_video_id(url) or url, url)
+    return list(unique.values())
+
+async def process_urls(processor, urls, concurrency, until=None, on_result=print):
+    """
+    Procesa URLs concurrentemente y entrega un resultado por video.
+
+    Args:
+        processor (VideoProcessor): Procesador de videos
+        urls (list): URLs de los videos
+        concurrency (int): Videos procesados a la vez
+        until (str): Última etapa a ejecutar (opcional)
+        on_result (callable): Recibe el resultado (dict) de cada video al terminar
+
+    Returns:
+        list: Resultados en el orden de las URLs
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(url):
+        result = {
+            'url': url,
+            'video_id': processor.extract_video_id(url),
+            'status': 'done',
+            'error': None,
+            'stages': {},
+            'page': None,
+            'files': []
+        }
+
+        def listener(stage, data):
+            if stage == 'artifacts':
+                result.update(data)
+            elif data.get('status') == 'finished':
+                result['stages'][stage] = data['seconds']
+
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await processor.process_video(url, progress=listener, until=until)
+                # Sin ninguna etapa ejecutada el video ya estaba hecho
+                if not result['stages']:
+                    result['status'] = 'skipped'
+            except Exception as e:
+                result['status'] = 'failed'
+                result['error'] = str(e)
+            result['seconds'] = round(time.perf_counter() - start, 3)
+
+        on_result(result)
+        return result
+
+    return await asyncio.gather(*(run(url) for url in urls))
+
+async def _validate_api(processor):
+    """Valida la API key y cierra el cliente de OpenAI usado para ello"""
+    try:
+        return await processor.validate_api()
+    finally:
+        await processor.close()
+
+async def _process_shard(urls, concurrency, until, on_result):
+    """Procesa un grupo de URLs con un procesador propio"""
+    processor = VideoProcessor()
+    try:
+        return await process_urls(processor, urls, concurrency, until, on_result)
+    finally:
+        await processor.close()
+
+def _shard_worker(urls, concurrency, until, results):
+    """Punto de entrada de cada proceso: procesa su parte y envía los resultados"""
+    try:
+        # La salida estándar queda para los resultados del proceso principal
+        with contextlib.redirect_stdout(sys.stderr):
+            asyncio.run(_process_shard(urls, concurrency, until, results.put))
+    finally:
+        results.put(None)
+
+def _run_processes(urls, args, write):
+    """
+    Reparte las URLs entre varios procesos y recoge sus resultados.
+
+    Args:
+        urls (list): URLs de los videos
+        args (Namespace): Argumentos interpretados
+        write (callable): Recibe cada resultado
+
+    Returns:
+        list: Resultados de todos los videos
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_shard_worker,
+            args=(urls[i::args.processes], args.concurrency, args.until, results),
+            daemon=True
+        )
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    collected = []
+    finished = 0
+    while finished < len(processes):
+        try:
+            result = results.get(timeout=1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+        if result is None:
+            finished += 1
+        else:
+            write(result)
+            collected.append(result)
+
+    for process in processes:
+        process.join()
+
+    # Los videos de un proceso que ha muerto sin terminar cuentan como fallidos
+    reported = {result['url'] for result in collected}
+    for url in urls:
+        if url not in reported:
+            result = {'url': url, 'status': 'failed', 'error': 'El proceso de trabajo terminó inesperadamente'}
+            write(result)
+            collected.append(result)
+    return collected
+
+def run_headless(args):
+    """
+    Ejecuta el modo por lotes sin intervención.
+
+    Los mensajes de progreso se escriben en la salida de errores y los
+    resultados (una línea JSON por video) en --output.
+
+    Args:
+        args (Namespace): Argumentos interpretados
+
+    Returns:
+        int: Código de salida (EXIT_OK, EXIT_PARTIAL o EXIT_FAILED)
+    """
+    output = _open_output(args.output)
+    if output is None:
+        return EXIT_FAILED
+
+    def write(result):
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output.flush()
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            processor = VideoProcessor()
+            try:
+                urls = collect_urls(args, processor)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Error leyendo las URLs: {str(e)}")
+                return EXIT_FAILED
+            if not urls:
+                print("No hay URLs para procesar")
+                return EXIT_FAILED
+            print(f"Procesando {len(urls)} videos")
+
+            if not args.skip_validation:
+                valid = asyncio.run(_validate_api(processor))
+                if not valid:
+                    print("Error: API key inválida")
+                    return EXIT_FAILED
+
+            if args.processes > 1:
+                results = _run_processes(urls, args, write)
+            else:
+                results = asyncio.run(_process_shard(urls, args.concurrency, args.until, write))
+
+        failed = sum(result['status'] == 'failed' for result in results)
+        print(f"Procesados {len(results) - failed} de {len(results)} videos", file=sys.stderr)
+        if failed == 0:
+            return EXIT_OK
+        return EXIT_FAILED if failed == len(results) else EXIT_PARTIAL
+
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+async def _work(concurrency):
+    """Procesa trabajos de la cola persistente con un procesador propio"""
+    processor = VideoProcessor()
+    try:
+        await JobWorker(processor, WorkQueue(), concurrency).run()
+    finally:
+        await processor.close()
+
+def _worker_process(concurrency):
+    """Punto de entrada de cada proceso de trabajo de la cola persistente"""
+    # SIGTERM se trata como Ctrl+C para devolver a la cola los trabajos en curso
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(_work(concurrency))
+
+def run_worker(args):
+    """
+    Procesa trabajos de la cola persistente hasta que se detiene el proceso
+    (Ctrl+C o SIGTERM). Los trabajos en curso al parar vuelven a la cola.
+
+    Se pueden arrancar workers en varias máquinas siempre que compartan la
+    carpeta output y la base de datos de la cola (JOBS_DB).
+
+    Args:
+        args (Namespace): Argumentos interpretados
+
+    Returns:
+        int: Código de salida (EXIT_OK o EXIT_FAILED si la API key no es válida)
+    """
+    if not args.skip_validation:
+        processor = VideoProcessor()
+        if not asyncio.run(_validate_api(processor)):
+            print("Error: API key inválida", file=sys.stderr)
+            return EXIT_FAILED
+
+    print(f"Worker de la cola {WorkQueue().db_path}: {args.processes} procesos, "
+          f"{args.concurrency} videos a la vez por proceso", file=sys.stderr)
+    if args.processes <= 1:
+        _worker_process(args.concurrency)
+        return EXIT_OK
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=_worker_process, args=(args.concurrency,))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    return EXIT_OK
+
+def run_enqueue(args):
+    """
+    Encola las URLs en la cola persistente como un lote y escribe su resumen
+    (JSON) en --output. Los videos ya procesados o en curso no se repiten.
+
+    Args:
+        args (Namespace): Argumentos interpretados
+
+    Returns:
+        int: Código de salida (EXIT_OK o EXIT_FAILED si no hay URLs o no se
+            pueden leer o escribir los archivos)
+    """
+    # El archivo de resultados se abre antes de encolar para no dejar un
+    # lote encolado sin su resumen
+    output = _open_output(args.output)
+    if output is None:
+        return EXIT_FAILED
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            job_queue = JobQueue(max_workers=0)
+            try:
+                urls = collect_urls(args, job_queue.processor)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Error leyendo las URLs: {str(e)}")
+                return EXIT_FAILED
+            if not urls:
+                print("No hay URLs para procesar")
+                return EXIT_FAILED
+            batch = job_queue.get_batch(job_queue.submit_batch(urls))
+            print(f"Encolados {batch['total']} videos en el lote {batch['id']}")
+
+        output.write(json.dumps(batch, ensure_ascii=False) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return EXIT_OK
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        args = parse_args()
+        if args.worker:
+            sys.exit(run_worker(args))
+        if args.enqueue:
+            sys.exit(run_enqueue(args))
+        sys.exit(run_headless(args))
     menu = Menu()
-    asyncio.run(menu.main_menu())
\ No newline at end of file
+    asyncio.run(menu.run())
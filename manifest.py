@@ -0,0 +1,169 @@
+"""
+SRT YouTube Generator - Stage Manifest
+-------------------------------------
+Este módulo registra en cada carpeta de video qué etapas del procesamiento
+han terminado y con qué archivos, para que una nueva ejecución pueda
+reanudarse desde la primera etapa pendiente o desactualizada.
+
+Clases:
+    StageManifest: Manifiesto de etapas de un video (manifest.json)
+"""
+
+import os
+import json
+import tempfile
+from datetime import datetime
+from cache import file_hash
+
+# Etapas del procesamiento, en orden
+STAGES = (
+    'metadata',
+    'download',
+    'audio',
+    'transcription',
+    'translation',
+    'html',
+    'report'
+)
+
+class StageManifest:
+    """
+    Manifiesto de etapas de un video.
+
+    Cada etapa terminada guarda su fecha, los checksums de sus archivos y
+    datos opcionales. Una etapa está al día si está registrada y sus
+    archivos no han cambiado. Completar una etapa invalida las posteriores,
+    de modo que tras un fallo se reanuda desde la primera etapa pendiente.
+
+    Atributos:
+        video_dir (Path): Carpeta del video
+        path (Path): Ruta del manifiesto
+        stages (dict): Etapas registradas
+    """
+
+    FILENAME = 'manifest.json'
+
+    def __init__(self, video_dir):
+        self.video_dir = video_dir
+        self.path = video_dir / self.FILENAME
+        self.stages = {}
+        self.load()
+
+    def load(self):
+        """Carga el manifiesto desde disco, si existe"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.stages = json.load(f).get('stages', {})
+        except FileNotFoundError:
+            self.stages = {}
+        except (ValueError, AttributeError) as e:
+            print(f"Manifiesto inválido en {self.path}, se ignora: {str(e)}")
+            self.stages = {}
+
+    def save(self):
+        """Guarda el manifiesto de forma atómica"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.video_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'stages': self.stages}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _checksum(self, path):
+        """Checksum de un archivo junto con su tamaño y fecha de modificación"""
+        stat = path.stat()
+        return {
+            'sha256': file_hash(path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns
+        }
+
+    def _artifact_ok(self, name, recorded):
+        """Comprueba que un archivo registrado existe y no ha cambiado"""
+        path = self.video_dir / name
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+        if stat.st_size != recorded['size']:
+            return False
+        # Solo se recalcula el hash si el archivo se ha tocado
+        if stat.st_mtime_ns == recorded['mtime_ns']:
+            return True
+        return file_hash(path) == recorded['sha256']
+
+    def is_fresh(self, stage):
+        """
+        Indica si una etapa está terminada y sus archivos siguen intactos.
+
+        Args:
+            stage (str): Nombre de la etapa
+
+        Returns:
+            bool: True si la etapa no necesita repetirse
+        """
+        entry = self.stages.get(stage)
+        if entry is None:
+            return False
+        return all(
+            self._artifact_ok(name, recorded)
+            for name, recorded in entry.get('artifacts', {}).items()
+        )
+
+    def first_pending(self):
+        """
+        Obtiene la primera etapa pendiente o desactualizada.
+
+        Returns:
+            str: Nombre de la etapa o None si todas están al día
+        """
+        for stage in STAGES:
+            if not self.is_fresh(stage):
+                return stage
+        return None
+
+    def complete(self, stage, artifacts=(), data=None):
+        """
+        Registra una etapa como terminada e invalida las posteriores.
+
+        Args:
+            stage (str): Nombre de la etapa
+            artifacts (list): Archivos generados por la etapa (Path)
+            data (dict): Datos de la etapa necesarios para reanudar
+        """
+        index = STAGES.index(stage)
+        for later in STAGES[index + 1:]:
+            self.stages.pop(later, None)
+
+        self.stages[stage] = {
+            'completed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'artifacts': {
+                path.name: self._checksum(path) for path in artifacts
+            },
+            'data': data or {}
+        }
+        self.save()
+
+    def data(self, stage):
+        """
+        Obtiene los datos guardados de una etapa.
+
+        Args:
+            stage (str): Nombre de la etapa
+
+        Returns:
+            dict: Datos de la etapa
+        """
+        return self.stages.get(stage, {}).get('data', {})
+
+    def checksum(self, stage, name):
+        """
+        Obtiene el SHA-256 registrado de un archivo de una etapa.
+
+        Args:
+            stage (str): Nombre de la etapa
+            name (str): Nombre del archivo
+
+        Returns:
+            str: Hash hexadecimal o None si no está registrado
+        """
+        recorded = self.stages.get(stage, {}).get('artifacts', {}).get(name)
+        return recorded['sha256'] if recorded else None
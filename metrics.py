@@ -0,0 +1,300 @@
+"""
+SRT YouTube Generator - Metrics
+-------------------------------------
+Este módulo recoge métricas del procesamiento para localizar cuellos de
+botella y planificar capacidad:
+- Tramos cronometrados por etapa de cada video (trazas)
+- Contadores de bytes descargados, tamaño del audio y tokens de OpenAI
+- Histogramas de duración por etapa
+- Exportación en formato de texto de Prometheus
+- Eventos de progreso de cada video para quien los escuche
+
+Clases:
+    VideoTrace: Tiempos y contadores del procesamiento de un video
+    MetricsRegistry: Contadores, gauges e histogramas del proceso
+
+Funciones:
+    current_trace: Obtiene la traza del video en curso
+    count: Suma un valor a un contador global y a la traza en curso
+    emit: Envía un evento de progreso del video en curso
+"""
+
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Límites (en segundos) de los histogramas de duración
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Traza del video que se procesa en la tarea actual; las tareas creadas con
+# asyncio.gather heredan el contexto, así que las llamadas anidadas la ven
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+def current_trace():
+    """
+    Obtiene la traza del video en curso en la tarea actual.
+
+    Returns:
+        VideoTrace: Traza activa o None
+    """
+    return _current_trace.get()
+
+def count(name, value, **labels):
+    """
+    Suma un valor a un contador global y, si hay un video en curso, a su traza.
+
+    Args:
+        name (str): Nombre del contador (sin prefijo ni _total)
+        value (float): Valor a sumar
+        **labels: Etiquetas del contador global
+    """
+    trace = current_trace()
+    if trace is not None:
+        trace.add(name, value, **labels)
+    else:
+        metrics.inc(f'srt_{name}_total', value, **labels)
+
+def emit(stage, **data):
+    """
+    Envía un evento de progreso del video en curso, si lo hay.
+
+    Args:
+        stage (str): Etapa a la que se refiere el evento
+        **data: Datos del evento (percent, done, total...)
+    """
+    trace = current_trace()
+    if trace is not None:
+        trace.emit(stage, **data)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+class MetricsRegistry:
+    """
+    Contadores, gauges e histogramas del proceso en formato Prometheus.
+
+    Atributos:
+        buckets (tuple): Límites de los histogramas en segundos
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def describe(self, name, kind, text):
+        """
+        Registra el tipo y la descripción de una métrica.
+
+        Args:
+            name (str): Nombre de la métrica
+            kind (str): counter, gauge o histogram
+            text (str): Descripción
+        """
+        self._help[name] = (kind, text)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Incrementa un contador.
+
+        Args:
+            name (str): Nombre del contador
+            value (float): Incremento
+            **labels: Etiquetas de la serie
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Fija el valor de un gauge.
+
+        Args:
+            name (str): Nombre del gauge
+            value (float): Valor
+            **labels: Etiquetas de la serie
+        """
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Añade una observación a un histograma.
+
+        Args:
+            name (str): Nombre del histograma
+            value (float): Valor observado
+            **labels: Etiquetas de la serie
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            counts, total, count = self._histograms.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            counts = tuple(bucket + (value <= bound) for bucket, bound in zip(counts, self.buckets))
+            self._histograms[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        """
+        Exporta todas las métricas en formato de texto de Prometheus.
+
+        Returns:
+            str: Exposición de métricas
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = dict(self._histograms)
+
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                text = self._help.get(name, (kind, ''))[1]
+                if text:
+                    lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(counters.items()):
+            declare(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), value in sorted(gauges.items()):
+            declare(name, 'gauge')
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            declare(name, 'histogram')
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {bucket}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {round(total, 6)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+class VideoTrace:
+    """
+    Tiempos y contadores del procesamiento de un video.
+
+    Cada tramo se guarda en la traza y se observa en el histograma de su
+    etapa; cada contador se suma en la traza y en el contador global. El
+    inicio y el fin de cada tramo, y el progreso dentro de una etapa, se
+    envían como eventos al listener.
+
+    Atributos:
+        url (str): URL del video
+        listener (callable): Recibe los eventos de progreso (etapa, datos);
+            puede llamarse desde hilos del pool de descargas
+        stages (dict): Segundos empleados en cada etapa
+        counters (dict): Contadores del video (bytes, tokens...)
+        started_at (float): Instante de inicio (time.time)
+        skipped (bool): Si no se ha hecho nada porque el video ya estaba
+            procesado; se cuenta con el estado skipped en lugar de done
+    """
+
+    def __init__(self, url, listener=None, registry=None):
+        self.url = url
+        self.listener = listener
+        self.registry = registry or metrics
+        self.stages = {}
+        self.counters = {}
+        self.started_at = time.time()
+        self.skipped = False
+        self._start = time.perf_counter()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._token)
+        elapsed = time.perf_counter() - self._start
+        status = 'failed' if exc_type else ('skipped' if self.skipped else 'done')
+        self.stages['total'] = round(elapsed, 3)
+        self.registry.observe('srt_video_duration_seconds', elapsed, status=status)
+        self.registry.inc('srt_videos_total', status=status)
+        return False
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Cronometra una etapa mientras dura el bloque.
+
+        Args:
+            stage (str): Nombre de la etapa
+        """
+        self.emit(stage, status='started')
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[stage] = round(self.stages.get(stage, 0) + elapsed, 3)
+            self.registry.observe('srt_stage_duration_seconds', elapsed, stage=stage)
+            self.emit(stage, status='finished', seconds=round(elapsed, 3))
+
+    def emit(self, stage, **data):
+        """
+        Envía un evento de progreso al listener.
+
+        Args:
+            stage (str): Etapa a la que se refiere el evento
+            **data: Datos del evento (percent, done, total...)
+        """
+        if self.listener is None:
+            return
+        try:
+            self.listener(stage, data)
+        except Exception as e:
+            print(f"Error enviando progreso: {str(e)}")
+
+    def add(self, name, value, **labels):
+        """
+        Suma un valor a un contador del video y al contador global.
+
+        Args:
+            name (str): Nombre del contador (sin prefijo ni _total)
+            value (float): Valor a sumar
+            **labels: Etiquetas del contador global
+        """
+        key = '_'.join([name] + [str(label) for label in labels.values()])
+        self.counters[key] = self.counters.get(key, 0) + value
+        self.registry.inc(f'srt_{name}_total', value, **labels)
+
+    def to_dict(self):
+        """Representación serializable de la traza"""
+        return {
+            'url': self.url,
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'stages': dict(self.stages),
+            'counters': dict(self.counters)
+        }
+
+# Registro compartido por todo el proceso
+metrics = MetricsRegistry()
+metrics.describe('srt_stage_duration_seconds', 'histogram', 'Duración de cada etapa del procesamiento')
+metrics.describe('srt_video_duration_seconds', 'histogram', 'Duración total del procesamiento de un video')
+metrics.describe('srt_videos_total', 'counter', 'Videos procesados por resultado (done, skipped o failed)')
+metrics.describe('srt_downloaded_bytes_total', 'counter', 'Bytes descargados de YouTube')
+metrics.describe('srt_audio_bytes_total', 'counter', 'Bytes de audio extraído')
+metrics.describe('srt_audio_seconds_total', 'counter', 'Segundos de audio transcritos')
+metrics.describe('srt_upload_bytes_total', 'counter', 'Bytes de audio enviados a transcribir')
+metrics.describe('srt_trimmed_seconds_total', 'counter', 'Segundos de silencio quitados antes de transcribir')
+metrics.describe('srt_openai_tokens_total', 'counter', 'Tokens de OpenAI por modelo y tipo')
+metrics.describe('srt_openai_requests_total', 'counter', 'Llamadas a la API de OpenAI por endpoint')
+metrics.describe('srt_openai_retries_total', 'counter', 'Reintentos de llamadas a OpenAI por modelo y motivo')
+metrics.describe('srt_openai_concurrency', 'gauge', 'Llamadas simultáneas a OpenAI permitidas ahora por modelo')
+metrics.describe('srt_cache_hits_total', 'counter', 'Resultados de OpenAI obtenidos de la caché')
+metrics.describe('srt_jobs', 'gauge', 'Trabajos de la cola por estado')
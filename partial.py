@@ -0,0 +1,115 @@
+"""
+SRT YouTube Generator - Partial Output
+-------------------------------------
+Este módulo publica los subtítulos de un video mientras se generan, para
+poder revisar el principio de un video largo antes de que termine:
+- Cada fragmento se añade al final de su archivo SRT en cuanto están
+  escritos todos los anteriores
+- La página del video se vuelve a generar como mucho cada
+  PARTIAL_HTML_INTERVAL segundos, marcada como parcial (MARKER)
+
+Clases:
+    PartialPublisher: Publicación incremental de los subtítulos de un video
+"""
+
+import os
+import time
+import threading
+from dotenv import load_dotenv
+import subtitles
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Archivo que marca la carpeta de un video con la página parcial; el catálogo
+# no lista ni indexa esas carpetas hasta que se genera la página definitiva
+MARKER = '.partial'
+
+class PartialPublisher:
+    """
+    Publica los subtítulos de un video a medida que se generan.
+
+    Los fragmentos (trozos de audio transcritos o lotes traducidos) terminan
+    en cualquier orden; se guardan hasta que están todos los anteriores y
+    entonces se añaden al archivo SRT de su idioma, numerados a continuación
+    de los ya escritos. Así el archivo es siempre un SRT válido con el
+    principio del video.
+
+    Los métodos son bloqueantes y pueden llamarse desde varios hilos.
+
+    Atributos:
+        paths (callable): Devuelve la ruta del archivo SRT de un idioma
+        render (callable): Regenera la página con los idiomas publicados
+            (opcional)
+        interval (float): Segundos mínimos entre dos regeneraciones de la página
+        published (dict): Milisegundos publicados de cada idioma
+    """
+
+    def __init__(self, paths, render=None, interval=None):
+        self.paths = paths
+        self.render = render
+        self.interval = interval if interval is not None else float(os.getenv('PARTIAL_HTML_INTERVAL', '60'))
+        self.published = {}
+        self._pending = {}
+        self._next = {}
+        self._written = {}
+        self._rendered_at = None
+        self._lock = threading.Lock()
+
+    def add(self, language, position, cues):
+        """
+        Añade un fragmento y publica los que ya tienen escritos los anteriores.
+
+        El primer fragmento de un idioma vacía su archivo, que puede tener
+        restos de una ejecución anterior.
+
+        Args:
+            language (str): Código del idioma
+            position (int): Posición del fragmento, desde 0
+            cues (list): Subtítulos del fragmento, con los tiempos del video
+
+        Returns:
+            bool: True si se ha regenerado la página
+        """
+        with self._lock:
+            path = self.paths(language)
+            if language not in self._next:
+                path.write_text('', encoding='utf-8')
+                self._pending[language] = {}
+                self._next[language] = 0
+                self._written[language] = 0
+                self.published[language] = 0
+
+            pending = self._pending[language]
+            pending[position] = cues
+            while self._next[language] in pending:
+                chunk = pending.pop(self._next[language])
+                self._written[language] += subtitles.write_file(
+                    chunk, path, start=self._written[language] + 1, append=True
+                )
+                if chunk:
+                    self.published[language] = max(self.published[language], chunk[-1].end)
+                self._next[language] += 1
+
+            return self._refresh()
+
+    def refresh(self):
+        """
+        Regenera la página con lo publicado, sin esperar al intervalo.
+
+        Returns:
+            bool: True si se ha regenerado la página
+        """
+        with self._lock:
+            return self._refresh(force=True)
+
+    def _refresh(self, force=False):
+        """Regenera la página si ha pasado el intervalo (con el lock tomado)"""
+        if self.render is None or not any(self.published.values()):
+            return False
+        now = time.monotonic()
+        if not force and self._rendered_at is not None and now - self._rendered_at < self.interval:
+            return False
+        self.render(list(self.published))
+        self._rendered_at = now
+        return True
@@ -0,0 +1,296 @@
+"""
+SRT YouTube Generator - Playlists
+-------------------------------------
+Este módulo expande listas de reproducción y canales de YouTube sin esperar
+a tener todas sus entradas:
+- Las entradas se generan a medida que yt-dlp resuelve cada página
+- Paginación por posición (start/end): cada página continúa donde acabó la
+  anterior en lugar de volver a pedir la lista desde el principio
+- Caché de las playlists expandidas con caducidad (PLAYLIST_TTL)
+- Actualización incremental: solo se piden las entradas nuevas del principio
+
+Clases:
+    PlaylistExpander: Expande playlists en streaming con caché
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from yt_dlp import YoutubeDL
+from cache import PlaylistCache
+
+# Redirecciones de yt-dlp (_type url) que se siguen hasta llegar a la playlist
+MAX_REDIRECTS = 3
+
+# Recorridos abiertos que se conservan para continuar en la página siguiente
+MAX_CURSORS = 8
+
+class _Cursor:
+    """
+    Recorrido abierto de las entradas de una playlist.
+
+    Las listas paginadas de yt-dlp (PagedList) permiten pedir cualquier
+    tramo; el resto (p. ej. los canales y playlists de YouTube) son
+    generadores que solo avanzan, así que se guardan abiertos para que la
+    página siguiente continúe donde acabó la anterior.
+
+    Atributos:
+        title (str): Título de la playlist
+        position (int): Entradas ya recorridas
+        exhausted (bool): Si se ha llegado al final de la lista
+        used (float): Último uso (time.monotonic)
+    """
+
+    def __init__(self, ydl, info):
+        self._ydl = ydl
+        self.title = info.get('title', '') or ''
+        self.position = 0
+        self.exhausted = False
+        self.used = time.monotonic()
+        entries = (info['entries'] or []) if 'entries' in info else [info]
+        self._paged = entries if hasattr(entries, 'getslice') else None
+        self._iterator = None if self._paged is not None else iter(entries)
+
+    def can_reach(self, offset):
+        """Indica si el recorrido puede llegar a offset sin volver a empezar"""
+        return self._paged is not None or offset >= self.position
+
+    def take(self, offset, end):
+        """
+        Entradas entre las posiciones offset y end (desde 0, end excluida).
+
+        Args:
+            offset (int): Primera posición
+            end (int): Posición final (None: hasta el final de la lista)
+
+        Yields:
+            dict: Información sin procesar de cada entrada
+        """
+        self.used = time.monotonic()
+        if self._paged is not None:
+            # Solo se descargan las páginas del tramo pedido
+            self.position = offset
+            items = self._paged.getslice(offset, end)
+            for raw in items:
+                self.position += 1
+                if raw:
+                    yield raw
+            self.exhausted = end is None or len(items) < end - offset
+            return
+
+        while end is None or self.position < end:
+            try:
+                raw = next(self._iterator)
+            except StopIteration:
+                self.exhausted = True
+                return
+            self.position += 1
+            if raw and self.position > offset:
+                yield raw
+
+    def close(self):
+        self._ydl.close()
+
+class PlaylistExpander:
+    """
+    Expande playlists generando sus entradas a medida que se resuelven.
+
+    La información de la playlist se pide sin procesar (process=False), de
+    modo que yt-dlp devuelve las entradas como un generador que descarga
+    cada página al recorrerlo, en lugar de resolver la lista entera antes de
+    devolver nada.
+
+    Si la playlist está en la caché y es actual, se sirve sin consultar
+    YouTube; si la caché no llega hasta la página pedida, solo se piden las
+    entradas que faltan y se añaden a la caché. Si ha caducado, se recorre
+    desde el principio solo hasta encontrar la primera entrada ya conocida;
+    esas entradas nuevas se anteponen a las de la caché. Esto cubre los
+    canales y las listas ordenadas de más reciente a más antiguo; con
+    refresh se vuelve a expandir la lista entera.
+
+    Atributos:
+        cache (PlaylistCache): Caché de playlists expandidas
+        metadata (MetadataCache): Caché de metadatos con la que se comparten
+            las entradas nuevas (opcional)
+    """
+
+    def __init__(self, cache=None, metadata=None):
+        self.cache = cache or PlaylistCache()
+        self.metadata = metadata
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ydl_opts(self):
+        """Opciones de yt-dlp para obtener las entradas sin resolver cada video"""
+        return {
+            'quiet': True,
+            'extract_flat': 'in_playlist',
+            'ignoreerrors': True,
+            'no_warnings': True
+        }
+
+    @staticmethod
+    def _entry(info):
+        """Datos de un video de la playlist"""
+        return {
+            'title': info.get('title', '') or '',
+            'url': info.get('url', '') or info.get('webpage_url', ''),
+            'duration': info.get('duration', 0),
+            'id': info.get('id', '')
+        }
+
+    def _resolve(self, ydl, url):
+        """Información de la URL sin procesar, siguiendo las redirecciones a la playlist"""
+        info = ydl.extract_info(url, download=False, process=False)
+        for _ in range(MAX_REDIRECTS):
+            # Una redirección a un video concreto es ya la entrada buscada
+            if not info or info.get('_type') not in ('url', 'url_transparent') or info.get('ie_key') == 'Youtube':
+                break
+            info = ydl.extract_info(info['url'], download=False, ie_key=info.get('ie_key'), process=False)
+        return info
+
+    def _open(self, url, offset=0, reuse=True):
+        """
+        Recorrido de una playlist que puede llegar a offset: el que quedó
+        abierto en la página anterior o uno nuevo.
+        """
+        with self._lock:
+            cursor = self._cursors.pop(url, None)
+        if cursor is not None:
+            if reuse and cursor.can_reach(offset) and time.monotonic() - cursor.used < self.cache.ttl:
+                return cursor
+            cursor.close()
+
+        ydl = YoutubeDL(self._ydl_opts())
+        try:
+            info = self._resolve(ydl, url)
+        except Exception:
+            ydl.close()
+            raise
+        if not info:
+            ydl.close()
+            raise ValueError('No se encontraron videos en la playlist')
+        return _Cursor(ydl, info)
+
+    def _keep(self, url, cursor):
+        """Guarda un recorrido sin terminar para la página siguiente"""
+        closed = []
+        if cursor.exhausted:
+            closed.append(cursor)
+        else:
+            with self._lock:
+                replaced = self._cursors.pop(url, None)
+                if replaced is not None:
+                    closed.append(replaced)
+                self._cursors[url] = cursor
+                while len(self._cursors) > MAX_CURSORS:
+                    closed.append(self._cursors.popitem(last=False)[1])
+        for old in closed:
+            old.close()
+
+    @staticmethod
+    def _in_range(index, start, end):
+        return index >= start and (end is None or index <= end)
+
+    def expand(self, url, start=1, end=None, refresh=False):
+        """
+        Expande una playlist generando eventos a medida que se resuelven.
+
+        Eventos (diccionarios con la clave type):
+        - playlist: title y cached (True si no se ha consultado YouTube)
+        - entry: index (posición en la playlist, desde 1) y title, url,
+          duration e id del video
+        - end: count (entradas enviadas), total (None si no se conoce el
+          final de la lista) y more (si hay entradas después de end)
+
+        Args:
+            url (str): URL de la playlist, canal o video
+            start (int): Primera posición a devolver, desde 1
+            end (int): Última posición a devolver (None: hasta el final)
+            refresh (bool): Ignorar la caché y expandir la lista entera
+
+        Yields:
+            dict: Eventos de la expansión
+        """
+        cached = None if refresh else self.cache.get(url)
+        count = 0
+
+        if cached and cached['fresh'] and (cached['complete'] or (end and len(cached['entries']) >= end)):
+            yield {'type': 'playlist', 'title': cached['title'], 'cached': True}
+            for index, entry in enumerate(cached['entries'], 1):
+                if self._in_range(index, start, end):
+                    count += 1
+                    yield {'type': 'entry', 'index': index, **entry}
+            yield self._end(len(cached['entries']), end, cached['complete'], count)
+            return
+
+        # Una caché actual se continúa después de su última entrada; con una
+        # caducada se recorre el principio hasta la primera entrada conocida
+        fresh = bool(cached and cached['fresh'])
+        entries = cached['entries'] if fresh else []
+        known = {entry['id']: i for i, entry in enumerate(cached['entries'])} if cached and not fresh else {}
+        # Sin caché se empieza directamente en la página pedida
+        offset = len(entries) if fresh else (0 if known else start - 1)
+
+        cursor = self._open(url, offset, reuse=not refresh)
+        title = cursor.title or (cached['title'] if cached else '')
+        fetched = []
+        tail = []
+        after = []
+        complete = None
+        try:
+            yield {'type': 'playlist', 'title': title, 'cached': False}
+            for index, entry in enumerate(entries, 1):
+                if self._in_range(index, start, end):
+                    count += 1
+                    yield {'type': 'entry', 'index': index, **entry}
+
+            for raw in cursor.take(offset, end):
+                entry = self._entry(raw)
+                if entry['id'] in known:
+                    # El resto de la lista ya está en la caché
+                    tail = cached['entries'][known[entry['id']]:]
+                    break
+                fetched.append(entry)
+                if self._in_range(offset + len(fetched), start, end):
+                    count += 1
+                    yield {'type': 'entry', 'index': offset + len(fetched), **entry}
+
+            for index, entry in enumerate(tail, offset + len(fetched) + 1):
+                if self._in_range(index, start, end):
+                    count += 1
+                    yield {'type': 'entry', 'index': index, **entry}
+
+            if tail:
+                reached = len(fetched) + len(tail)
+                if cached['complete'] or (end is not None and reached >= end):
+                    complete = cached['complete']
+                else:
+                    # La caché no llega hasta end: se sigue después de ella
+                    for raw in cursor.take(reached, end):
+                        after.append(self._entry(raw))
+                        if self._in_range(reached + len(after), start, end):
+                            count += 1
+                            yield {'type': 'entry', 'index': reached + len(after), **after[-1]}
+        finally:
+            self._keep(url, cursor)
+
+        if complete is None:
+            complete = cursor.exhausted
+        result = entries + fetched + tail + after
+        # Una página suelta, sin las anteriores, no se guarda en la caché
+        if result and offset == len(entries):
+            self.cache.put(url, title, result, complete)
+        if self.metadata is not None:
+            self.metadata.put_entries(fetched + after)
+        yield self._end(offset - len(entries) + len(result), end, complete, count)
+
+    @staticmethod
+    def _end(total, end, complete, count):
+        """Evento final de una expansión con total posiciones recorridas"""
+        return {
+            'type': 'end',
+            'count': count,
+            'total': total if complete else None,
+            'more': not complete or (end is not None and total > end)
+        }
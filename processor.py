@@ -6,25 +6,87 @@ Este módulo maneja el procesamiento de videos de YouTube, incluyendo:
 - Extracción de audio
 - Generación de subtítulos usando OpenAI
 - Creación de archivos HTML con transcripciones
+- Publicación de los subtítulos parciales mientras se generan
 
 Clases:
     VideoProcessor: Clase principal que maneja todo el procesamiento de videos
 """
 
 import os
+import copy
+import json
+import shutil
+import time
+import weakref
+import itertools
+import threading
 import yt_dlp
 import ffmpeg
 import asyncio
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, AuthenticationError
 from jinja2 import Environment, FileSystemLoader
+from limits import stage_limits
+from ratelimit import rate_limiter, estimate_tokens
+from cache import ResultCache, MetadataCache, file_hash
+from manifest import StageManifest, STAGES
+from catalog import VideoCatalog, video_id_from_url
+from partial import PartialPublisher, MARKER as PARTIAL_MARKER
+import subtitles
+import metrics
 import re
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Contenedor al que se copia el stream de audio sin recodificar, según la
+# extensión del archivo descargado (todos son formatos aceptados por Whisper)
+AUDIO_COPY_FORMATS = {
+    'mp4': 'm4a',
+    'm4a': 'm4a',
+    'webm': 'webm',
+    'mp3': 'mp3',
+    'ogg': 'ogg',
+    'opus': 'ogg'
+}
+
+# Perfiles de codificación del audio que se envía a transcribir. Es una
+# copia aparte del audio que se guarda para reproducir: a Whisper le basta
+# voz mono a 16 kHz, y un archivo pequeño se sube antes y cabe en el límite
+# de tamaño de la API. Con 'original' se envía el audio guardado tal cual.
+AUDIO_PROFILES = {
+    'original': None,
+    'speech-mp3': {'ext': 'mp3', 'acodec': 'libmp3lame', 'ab': '32k', 'ac': 1, 'ar': 16000},
+    'speech-opus': {'ext': 'ogg', 'acodec': 'libopus', 'ab': '24k', 'ac': 1, 'ar': 16000, 'application': 'voip'}
+}
+
+# Idioma en el que se transcribe el audio
+SOURCE_LANGUAGE = 'es'
+
+# Idiomas conocidos: código -> (nombre para el prompt y la página, etiqueta
+# de la pista de subtítulos). Un código que no está aquí se usa tal cual.
+LANGUAGES = {
+    'es': ('español', 'Español'),
+    'en': ('inglés', 'English'),
+    'fr': ('francés', 'Français'),
+    'de': ('alemán', 'Deutsch'),
+    'it': ('italiano', 'Italiano'),
+    'pt': ('portugués', 'Português'),
+    'ca': ('catalán', 'Català'),
+    'nl': ('neerlandés', 'Nederlands'),
+    'ja': ('japonés', '日本語'),
+    'zh': ('chino', '中文')
+}
+
+# Intentos de traducción de un lote antes de dividirlo
+TRANSLATION_RETRIES = 2
+
+# Bloque de código Markdown (```json ... ```) con el que los modelos de chat
+# suelen envolver el JSON de la respuesta
+JSON_FENCE = re.compile(r'^```[\w-]*\s*(.*?)\s*```$', re.DOTALL)
+
 class VideoProcessor:
     """
     Clase principal para procesar videos de YouTube y generar subtítulos.
@@ -35,6 +97,27 @@ class VideoProcessor:
         template_dir (Path): Directorio de plantillas HTML
         jinja_env: Entorno Jinja2 para renderizar plantillas
         ydl_opts (dict): Opciones para youtube-dl
+        limits (StageLimits): Límites de concurrencia por etapa
+        rate_limiter (RateLimiter): Planificador de las llamadas a OpenAI
+        download_video (bool): Descargar el video o solo el audio
+        chunk_seconds (int): Duración objetivo de cada fragmento de transcripción
+        silence_noise (str): Umbral de ruido para detectar silencios
+        silence_min_duration (float): Duración mínima de un silencio en segundos
+        trim_silence (bool): Quitar los silencios largos antes de transcribir
+        trim_min_silence (float): Duración mínima de un silencio para quitarlo
+        trim_padding (float): Segundos que se conservan a cada lado de la voz
+        asr_profile (str): Perfil de AUDIO_PROFILES del audio que se transcribe
+        target_languages (list): Códigos de los idiomas a los que se traduce
+        transcription_model (str): Modelo usado para transcribir
+        translation_model (str): Modelo de chat usado para traducir
+        translation_batch_size (int): Subtítulos por llamada de traducción
+        publish_partial (bool): Publicar los subtítulos y la página mientras
+            se generan
+        cache (ResultCache): Caché de transcripciones y traducciones
+        catalog (VideoCatalog): Índice de videos procesados
+        metadata (MetadataCache): Metadatos de yt-dlp por ID de video
+        api_base_url (str): URL base de la API de OpenAI (opcional)
+        api_validation_ttl (float): Segundos que se da por válida la API key
     """
 
     def __init__(self):
@@ -48,57 +131,309 @@ class VideoProcessor:
             'no_warnings': True,
             'extract_flat': True
         }
+        self.limits = stage_limits
+        self.rate_limiter = rate_limiter
+        self.download_video = os.getenv('DOWNLOAD_VIDEO', 'true').lower() in ('1', 'true', 'yes')
+        self.chunk_seconds = int(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', '600'))
+        self.silence_noise = os.getenv('SILENCE_NOISE', '-35dB')
+        self.silence_min_duration = float(os.getenv('SILENCE_MIN_DURATION', '0.5'))
+        self.trim_silence = os.getenv('TRIM_SILENCE', 'false').lower() in ('1', 'true', 'yes')
+        self.trim_min_silence = float(os.getenv('TRIM_MIN_SILENCE', '2'))
+        self.trim_padding = float(os.getenv('TRIM_PADDING', '0.25'))
+        self.asr_profile = os.getenv('ASR_AUDIO_PROFILE', 'speech-mp3')
+        if self.asr_profile not in AUDIO_PROFILES:
+            raise ValueError(f"Perfil de audio desconocido: {self.asr_profile}")
+        self.transcription_model = os.getenv('TRANSCRIPTION_MODEL', 'whisper-1')
+        self.translation_model = os.getenv('TRANSLATION_MODEL', 'gpt-4')
+        self.translation_batch_size = int(os.getenv('TRANSLATION_BATCH_SIZE', '40'))
+        self.publish_partial = os.getenv('PUBLISH_PARTIAL', 'true').lower() in ('1', 'true', 'yes')
+        self.target_languages = list(dict.fromkeys(
+            code.strip().lower() for code in os.getenv('TARGET_LANGUAGES', 'en').split(',')
+            if code.strip() and code.strip().lower() != SOURCE_LANGUAGE
+        ))
+        self.cache = ResultCache()
+        self.catalog = VideoCatalog(self.output_dir)
+        self.metadata = MetadataCache(self.cache)
+        self._ydl_local = threading.local()
+        self.api_base_url = os.getenv('OPENAI_BASE_URL') or None
+        self.api_validation_ttl = float(os.getenv('API_VALIDATION_TTL', '600'))
+        self._api_valid_until = 0
+        self._clients = weakref.WeakKeyDictionary()
 
-    def _download_video(self, url, output_dir):
+    def _download(self, info, output_dir, media_format, name, progress=None):
         """
-        Descarga un video de YouTube y extrae su audio.
+        Descarga un stream de YouTube con yt-dlp a partir de su información.
+        
+        Se reutiliza la información ya extraída (como hace --load-info-json),
+        de modo que la descarga no vuelve a consultar los metadatos.
         
         Args:
-            url (str): URL del video de YouTube
+            info (dict): Información del video devuelta por _extract_info
             output_dir (Path): Directorio donde guardar los archivos
+            media_format (str): Selector de formato de yt-dlp
+            name (str): Nombre base del archivo descargado
+            progress (callable): Recibe los eventos de progreso (opcional)
             
+        Returns:
+            tuple: (información de yt-dlp, ruta del archivo descargado)
+        """
+        ydl_opts = {
+            'format': media_format,
+            'outtmpl': str(output_dir / f'{name}.%(ext)s'),
+            'quiet': True,
+            'no_warnings': True
+        }
+        if progress:
+            ydl_opts['progress_hooks'] = [self._progress_hook(progress)]
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+            return info, list(output_dir.glob(f'{name}.*'))[0]
+
+    def _progress_hook(self, progress):
+        """
+        Crea un progress hook de yt-dlp que envía el porcentaje descargado.
+
+        Se envía como mucho un evento por punto porcentual.
+
+        Args:
+            progress (callable): Recibe los eventos (etapa, **datos)
+
+        Returns:
+            callable: Hook para la opción progress_hooks de yt-dlp
+        """
+        last_percent = [-1]
+
+        def hook(status):
+            total = status.get('total_bytes') or status.get('total_bytes_estimate')
+            downloaded = status.get('downloaded_bytes', 0)
+            if status.get('status') == 'finished':
+                percent = 100
+            elif status.get('status') == 'downloading' and total:
+                percent = min(int(downloaded * 100 / total), 99)
+            else:
+                return
+            if percent > last_percent[0]:
+                last_percent[0] = percent
+                progress(
+                    'download',
+                    percent=percent,
+                    downloaded_bytes=downloaded,
+                    total_bytes=total,
+                    speed=status.get('speed'),
+                    eta=status.get('eta')
+                )
+
+        return hook
+
+    def _video_info(self, info, path):
+        """Resume la información de yt-dlp que usa el resto del proceso"""
+        return {
+            'title': info.get('title', ''),
+            'duration': info.get('duration', 0),
+            'thumbnail': info.get('thumbnail', ''),
+            'description': info.get('description', ''),
+            'filesize': path.stat().st_size,
+            'path': path
+        }
+
+    def _download_video(self, info, output_dir, progress=None):
+        """
+        Descarga un video de YouTube en formato MP4.
+        
+        Args:
+            info (dict): Información del video devuelta por _extract_info
+            output_dir (Path): Directorio donde guardar los archivos
+            progress (callable): Recibe los eventos de progreso (opcional)
+
         Returns:
             dict: Información del video descargado
         """
         try:
-            # Configurar opciones de descarga
-            ydl_opts = {
-                'format': 'best[height<=720]',
-                'outtmpl': str(output_dir / 'video.%(ext)s'),
-                'quiet': True,
-                'no_warnings': True
-            }
-
-            # Descargar video y extraer información
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                
-                # Asegurar formato MP4
-                video_path = list(output_dir.glob('video.*'))[0]
-                if video_path.suffix != '.mp4':
-                    new_path = output_dir / 'video.mp4'
-                    video_path.rename(new_path)
-                
-                # Extraer audio en MP3
-                audio_path = output_dir / 'audio.mp3'
-                ffmpeg.input(str(output_dir / 'video.mp4')).output(
-                    str(audio_path), 
-                    acodec='libmp3lame', 
-                    ab='128k'
-                ).overwrite_output().run(capture_stdout=True, capture_stderr=True)
-
-                return {
-                    'title': info.get('title', ''),
-                    'duration': info.get('duration', 0),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'description': info.get('description', '')
-                }
+            info, video_path = self._download(info, output_dir, 'best[height<=720]', 'video', progress)
+
+            # Asegurar formato MP4
+            if video_path.suffix != '.mp4':
+                new_path = output_dir / 'video.mp4'
+                video_path = video_path.rename(new_path)
+
+            return self._video_info(info, video_path)
 
         except Exception as e:
             print(f"Error descargando video: {str(e)}")
             raise
 
-    def _extract_video_id(self, url):
+    def _download_audio(self, info, output_dir, progress=None):
+        """
+        Descarga únicamente el mejor stream de audio de un video de YouTube.
+        
+        Args:
+            info (dict): Información del video devuelta por _extract_info
+            output_dir (Path): Directorio donde guardar los archivos
+            progress (callable): Recibe los eventos de progreso (opcional)
+
+        Returns:
+            dict: Información del video descargado
+        """
+        try:
+            info, source_path = self._download(info, output_dir, 'bestaudio/best', 'source', progress)
+            return self._video_info(info, source_path)
+
+        except Exception as e:
+            print(f"Error descargando audio: {str(e)}")
+            raise
+
+    async def _run_ffmpeg(self, stream, stage=None, duration=None):
+        """
+        Ejecuta un comando de ffmpeg como subproceso asíncrono.
+
+        Mientras ffmpeg trabaja no se ocupa ningún hilo, y el proceso se
+        mata si la tarea se cancela. La etapa ffmpeg limita cuántos procesos
+        corren a la vez. Si se indican la etapa y la duración, el progreso
+        que ffmpeg escribe con -progress se envía como eventos de esa etapa.
+
+        Args:
+            stream: Comando construido con ffmpeg-python
+            stage (str): Etapa a la que se atribuye el progreso (opcional)
+            duration (float): Duración de la entrada en segundos (opcional)
+
+        Returns:
+            tuple: (stdout, stderr) en bytes
+
+        Raises:
+            ffmpeg.Error: Si ffmpeg termina con error
+        """
+        report_progress = bool(stage and duration)
+        if report_progress:
+            stream = stream.global_args('-progress', 'pipe:1', '-nostats')
+
+        args = stream.compile()
+        async with self.limits.slot('ffmpeg'):
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                if report_progress:
+                    stdout, stderr = await asyncio.gather(
+                        self._read_ffmpeg_progress(process.stdout, stage, duration),
+                        process.stderr.read()
+                    )
+                    await process.wait()
+                else:
+                    stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+
+        if process.returncode:
+            raise ffmpeg.Error(args[0], stdout, stderr)
+        return stdout, stderr
+
+    async def _read_ffmpeg_progress(self, reader, stage, duration):
+        """
+        Lee la salida de -progress de ffmpeg y envía el porcentaje procesado.
+
+        Args:
+            reader (StreamReader): Salida estándar de ffmpeg
+            stage (str): Etapa a la que se atribuye el progreso
+            duration (float): Duración de la entrada en segundos
+
+        Returns:
+            bytes: Salida vacía (ffmpeg solo escribe el progreso)
+        """
+        last_percent = -1
+        async for line in reader:
+            key, _, value = line.decode('utf-8', errors='ignore').strip().partition('=')
+            # out_time_ms también está en microsegundos
+            if key in ('out_time_us', 'out_time_ms') and value.isdigit():
+                percent = min(int(int(value) / 1e6 * 100 / duration), 99)
+                if percent > last_percent:
+                    last_percent = percent
+                    metrics.emit(stage, percent=percent)
+        return b''
+
+    async def _extract_audio(self, source_path, duration=None):
+        """
+        Extrae el audio del archivo descargado.
+        
+        Si el contenedor lo permite, el stream de audio se copia sin recodificar
+        (p. ej. AAC a .m4a u Opus a .webm). Si no, se recodifica a MP3.
+        
+        Args:
+            source_path (Path): Video o stream de audio descargado
+            duration (float): Duración en segundos, para informar del progreso
+
+        Returns:
+            Path: Ruta al archivo de audio
+        """
+        output_dir = source_path.parent
+        audio_only = source_path.stem == 'source'
+
+        try:
+            copy_ext = AUDIO_COPY_FORMATS.get(source_path.suffix.lstrip('.'))
+            if copy_ext:
+                audio_path = output_dir / f'audio.{copy_ext}'
+                try:
+                    await self._run_ffmpeg(ffmpeg.input(str(source_path)).output(
+                        str(audio_path),
+                        acodec='copy',
+                        vn=None
+                    ).overwrite_output(), 'audio', duration)
+                    if audio_only:
+                        source_path.unlink()
+                    return audio_path
+                except ffmpeg.Error:
+                    # El codec no es compatible con el contenedor: recodificar
+                    if audio_path.exists():
+                        audio_path.unlink()
+
+            audio_path = output_dir / 'audio.mp3'
+            await self._run_ffmpeg(ffmpeg.input(str(source_path)).output(
+                str(audio_path), 
+                acodec='libmp3lame',
+                ab='128k'
+            ).overwrite_output(), 'audio', duration)
+            if audio_only:
+                source_path.unlink()
+            return audio_path
+
+        except Exception as e:
+            print(f"Error extrayendo audio: {str(e)}")
+            raise
+
+    def _ydl(self):
+        """YoutubeDL de extracción reutilizado por cada hilo del pool de descargas"""
+        if not hasattr(self._ydl_local, 'ydl'):
+            self._ydl_local.ydl = yt_dlp.YoutubeDL(self.ydl_opts)
+        return self._ydl_local.ydl
+
+    def _extract_info(self, url):
+        """
+        Obtiene la información de un video sin descargarlo.
+        
+        Se consulta primero la caché de metadatos por ID de video; la
+        información extraída se guarda saneada para reutilizarla en la
+        descarga y en posteriores envíos del mismo video.
+        
+        Args:
+            url (str): URL del video de YouTube
+            
+        Returns:
+            dict: Información devuelta por yt-dlp
+        """
+        info = self.metadata.get(self.extract_video_id(url))
+        if info:
+            return info
+
+        info = yt_dlp.YoutubeDL.sanitize_info(self._ydl().extract_info(url, download=False))
+        self.metadata.put(info)
+        return info
+
+    def extract_video_id(self, url):
         """
         Extrae el ID del video de una URL de YouTube.
         
@@ -109,260 +444,1050 @@ class VideoProcessor:
             str: ID del video o None si no se encuentra
         """
         try:
-            patterns = [
-                r'(?:v=|\/)([0-9A-Za-z_-]{11}).*',
-                r'youtu\.be\/([0-9A-Za-z_-]{11})',
-                r'youtube\.com\/embed\/([0-9A-Za-z_-]{11})'
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, url)
-                if match:
-                    return match.group(1)
-            return None
+            return video_id_from_url(url)
             
         except Exception as e:
             print(f"Error extrayendo ID del video: {str(e)}")
             return None
 
-    def _generate_report(self, video_dir, video_info, url):
+    def _generate_report(self, video_dir, video_info, url, trace=None):
         """
         Genera un reporte del procesamiento del video.
-        
+
+        Además de report.txt se escribe report.json con los mismos datos y,
+        si se indica la traza, los tiempos por etapa y los contadores.
+
         Args:
             video_dir (Path): Directorio del video
             video_info (dict): Información del video
             url (str): URL original del video
+            trace (VideoTrace): Traza del procesamiento (opcional)
         """
         try:
+            processed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            timings = trace.to_dict() if trace else {'stages': {}, 'counters': {}}
+            languages = [SOURCE_LANGUAGE] + [
+                language for language in self.target_languages
+                if (video_dir / self._srt_name(language)).exists()
+            ]
+
             report_path = video_dir / 'report.txt'
             with open(report_path, 'w', encoding='utf-8') as f:
                 f.write(f"URL: {url}\n")
                 f.write(f"Título: {video_info['title']}\n")
                 f.write(f"Duración: {video_info['duration']} segundos\n")
-                f.write(f"Fecha de procesamiento: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                
+                f.write(f"Idiomas: {', '.join(languages)}\n")
+                f.write(f"Fecha de procesamiento: {processed_at}\n")
+                if timings['stages']:
+                    f.write("\nTiempos por etapa:\n")
+                    for stage, seconds in timings['stages'].items():
+                        f.write(f"  {stage}: {seconds:.3f} s\n")
+                if timings['counters']:
+                    f.write("\nContadores:\n")
+                    for name, value in timings['counters'].items():
+                        f.write(f"  {name}: {value}\n")
+
+            with open(video_dir / 'report.json', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'url': url,
+                    'title': video_info['title'],
+                    'duration': video_info['duration'],
+                    'languages': languages,
+                    'subtitles': {language: self._srt_name(language) for language in languages},
+                    'processed_at': processed_at,
+                    'stages': timings['stages'],
+                    'counters': timings['counters']
+                }, f, ensure_ascii=False, indent=2)
+
         except Exception as e:
             print(f"Error generando reporte: {str(e)}")
             raise
 
+    def _client(self):
+        """
+        Obtiene el cliente de OpenAI del bucle de eventos actual.
+
+        El cliente se crea una sola vez por bucle y se reutiliza en todas las
+        llamadas, de modo que las conexiones HTTP se mantienen abiertas entre
+        videos. No se comparte entre bucles porque su pool de conexiones
+        queda ligado al bucle en el que se usa. Los reintentos del cliente
+        están desactivados: de ellos se encarga rate_limiter.
+
+        Returns:
+            AsyncOpenAI: Cliente compartido
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(api_key=self.api_key, base_url=self.api_base_url, max_retries=0)
+            self._clients[loop] = client
+        return client
+
+    async def close(self):
+        """Cierra el cliente de OpenAI del bucle de eventos actual"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client:
+            await client.close()
+
+    def invalidate_api(self):
+        """Descarta la validación en caché de la API key"""
+        self._api_valid_until = 0
+
     async def validate_api(self):
         """
         Valida la API key de OpenAI.
+
+        Una validación correcta se reutiliza durante `api_validation_ttl`
+        segundos; un error de autenticación en cualquier llamada la descarta.
         
         Returns:
             bool: True si la API key es válida
         """
+        if time.monotonic() < self._api_valid_until:
+            return True
         try:
-            client = AsyncOpenAI(api_key=self.api_key)
-            await client.models.list()
+            await self._client().models.list()
+            self._api_valid_until = time.monotonic() + self.api_validation_ttl
             return True
         except Exception:
+            self.invalidate_api()
             return False
 
-    async def process_video(self, url):
+    async def process_video(self, url, progress=None, until=None):
         """
         Procesa un video completo: descarga, genera subtítulos y HTML.
-        
+
         Args:
             url (str): URL del video de YouTube
+            progress (callable): Recibe los eventos de progreso (etapa, datos)
+            until (str): Última etapa a ejecutar (opcional, por defecto todas)
             
         Returns:
             bool: True si el proceso fue exitoso
         """
-        client = None
         try:
-            print(f"Procesando URL: {url}")
+            with metrics.VideoTrace(url, progress) as trace:
+                print(f"Procesando URL: {url}")
+
+                # Si el ID de la URL ya está procesado no hace falta ni
+                # consultar YouTube
+                video_dir = await self.limits.run('io', self.processed_dir, self.extract_video_id(url))
+                if video_dir is not None:
+                    print(f"El video ya está procesado en {video_dir}")
+                    trace.skipped = True
+                    trace.emit('artifacts', **await self.limits.run('io', self.artifacts, video_dir))
+                    return True
             
-            # Extraer información y crear directorio
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
+                # Extraer información y crear directorio (fuera del bucle de eventos)
+                with trace.span('metadata'):
+                    info = await self.limits.run('download', self._extract_info, url)
                 video_title = info.get('title', '').replace('/', '-')
                 video_id = info.get('id', '')
 
-            video_dir = self.output_dir / video_title
-            video_dir.mkdir(parents=True, exist_ok=True)
+                video_dir = await self.limits.run('io', self.video_dir, video_id, video_title)
+                manifest = await self.limits.run('io', self._open_manifest, video_dir)
+
+                async def stop(stage):
+                    """Indica si hay que terminar tras la etapa (la última pedida)"""
+                    if stage != until:
+                        return False
+                    trace.emit('artifacts', **await self.limits.run('io', self.artifacts, video_dir))
+                    return True
+
+                # Reanudar desde la primera etapa pendiente o desactualizada
+                pending = await self.limits.run('io', self._pending_stage, manifest)
+                last = STAGES.index(until) if until else len(STAGES) - 1
+                if pending is None or STAGES.index(pending) > last:
+                    print("El video ya está procesado" if pending is None else f"Etapas hasta {until} ya hechas")
+                    trace.skipped = True
+                    trace.emit('artifacts', **await self.limits.run('io', self.artifacts, video_dir))
+                    return True
+                if pending != STAGES[0]:
+                    print(f"Reanudando desde la etapa: {pending}")
+
+                def needed(stage):
+                    return STAGES.index(pending) <= STAGES.index(stage) <= last
+
+                if needed('metadata'):
+                    await self.limits.run(
+                        'io', manifest.complete, 'metadata', (), {'id': video_id, 'title': video_title, 'url': url}
+                    )
+                if await stop('metadata'):
+                    return True
+
+                # Descargar video (o solo audio); en modo solo audio el archivo
+                # descargado se elimina al extraer el audio, así que si hay que
+                # repetir la extracción también hay que repetir la descarga
+                download_data = manifest.data('download')
+                source_missing = needed('audio') and not (
+                    download_data.get('file') and (video_dir / download_data['file']).exists()
+                )
+                if needed('download') or source_missing:
+                    download = self._download_video if self.download_video else self._download_audio
+                    with trace.span('download'):
+                        video_info = await self.limits.run('download', download, info, video_dir, trace.emit)
+                    trace.add('downloaded_bytes', video_info['filesize'])
+                    download_data = {
+                        'title': video_info['title'],
+                        'duration': video_info['duration'],
+                        'thumbnail': video_info['thumbnail'],
+                        'file': video_info['path'].name
+                    }
+                    artifacts = [video_info['path']] if self.download_video else []
+                    await self.limits.run('io', manifest.complete, 'download', artifacts, download_data)
+                if await stop('download'):
+                    return True
+
+                # Extraer audio
+                if needed('audio'):
+                    with trace.span('audio'):
+                        audio_path = await self._extract_audio(
+                            video_dir / download_data['file'], download_data['duration']
+                        )
+                    trace.add('audio_bytes', audio_path.stat().st_size)
+                    await self.limits.run(
+                        'io', manifest.complete, 'audio', [audio_path], {'file': audio_path.name}
+                    )
+                if await stop('audio'):
+                    return True
+                audio_path = video_dir / manifest.data('audio')['file']
+                audio_hash = manifest.checksum('audio', audio_path.name)
+                client = self._client()
+                video_data = {
+                    'title': video_title,
+                    'url': url,
+                    'video_name': download_data['file'] if download_data['file'] == 'video.mp4' else None,
+                    'audio_name': audio_path.name,
+                    'languages': [SOURCE_LANGUAGE] + self.target_languages
+                }
+                publish, refresh = self._partial_publisher(video_dir, video_data, needed('html'))
+
+                # Generar y guardar subtítulos
+                source_srt_path = video_dir / self._srt_name(SOURCE_LANGUAGE)
 
-            # Procesar video y generar archivos
-            video_info = self._download_video(url, video_dir)
-            client = AsyncOpenAI(api_key=self.api_key)
+                if needed('transcription'):
+                    with trace.span('transcription'):
+                        source_srt = await self.transcribe_audio(
+                            client, audio_path, download_data['duration'], video_id, audio_hash, publish
+                        )
+                    await self.limits.run(
+                        'io', self._save_stage, manifest, 'transcription', {source_srt_path: source_srt}
+                    )
+                    if await stop('transcription'):
+                        return True
+                    # La página parcial muestra la transcripción completa mientras se traduce
+                    if refresh is not None and needed('translation'):
+                        await refresh()
+                else:
+                    source_srt = await self.limits.run('io', source_srt_path.read_text, 'utf-8')
+
+                # Todas las traducciones parten de la misma transcripción y
+                # se hacen a la vez: cada idioma más es una llamada en paralelo
+                if needed('translation'):
+                    with trace.span('translation'):
+                        translations = await self.translate_all(client, source_srt, video_id, audio_hash, publish)
+                    await self.limits.run('io', self._save_stage, manifest, 'translation', {
+                        video_dir / self._srt_name(language): srt
+                        for language, srt in translations.items()
+                    }, {'languages': self.target_languages})
+                if await stop('translation'):
+                    return True
+
+                # Generar HTML y reporte
+                if needed('html'):
+                    video_data['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    with trace.span('html'):
+                        await self.generate_html(video_data, video_dir)
+                    await self.limits.run('io', manifest.complete, 'html', [video_dir / 'index.html'])
+                if await stop('html'):
+                    return True
+
+                with trace.span('report'):
+                    await self.limits.run(
+                        'io', self._publish, manifest, video_dir, download_data, url, video_id, trace
+                    )
+
+                trace.emit('artifacts', **await self.limits.run('io', self.artifacts, video_dir))
             
-            # Generar y guardar subtítulos
-            es_srt, en_srt = await self.generate_subtitles(
-                str(video_dir / 'audio.mp3'),
-                video_info['duration']
+                return True
+
+        except Exception as e:
+            if isinstance(e, AuthenticationError):
+                self.invalidate_api()
+            print(f"Error procesando video: {str(e)}")
+            raise
+
+    def artifacts(self, video_dir):
+        """Página y archivos generados de un video, relativos a la raíz del servidor"""
+        base = f"output/{video_dir.name}"
+        return {
+            'page': f"{base}/index.html",
+            'files': sorted(
+                f"{base}/{path.name}" for path in video_dir.iterdir()
+                if path.is_file() and path.suffix != '.tmp' and path.name != PARTIAL_MARKER
             )
+        }
+
+    async def _gather_progress(self, stage, coros, **data):
+        """
+        Ejecuta corrutinas concurrentemente e informa del progreso de la
+        etapa cada vez que termina una.
+
+        Args:
+            stage (str): Etapa a la que se atribuye el progreso
+            coros (list): Corrutinas a ejecutar
+            **data: Datos añadidos a cada evento (p. ej. el idioma)
+
+        Returns:
+            list: Resultados en el mismo orden que las corrutinas
+        """
+        total = len(coros)
+        done = 0
+
+        async def track(coro):
+            nonlocal done
+            result = await coro
+            done += 1
+            metrics.emit(stage, done=done, total=total, percent=done * 100 // total, **data)
+            return result
+
+        return await asyncio.gather(*(track(coro) for coro in coros))
+
+    def video_dir(self, video_id, title):
+        """
+        Carpeta de salida de un video.
+
+        Los videos se identifican por su ID: se usa la carpeta registrada en
+        el catálogo para ese ID o, si no hay, una carpeta «título [ID]», de
+        modo que dos videos con el mismo título no se pisan. Las carpetas
+        antiguas con solo el título se reutilizan si su manifiesto (o la URL
+        de su reporte) es del mismo video.
+
+        Args:
+            video_id (str): ID del video de YouTube
+            title (str): Título saneado del video
+
+        Returns:
+            Path: Carpeta del video
+        """
+        if not video_id:
+            return self.output_dir / title
+
+        registered = self.catalog.find(video_id)
+        if registered and (self.output_dir / registered).exists():
+            return self.output_dir / registered
+
+        # El ID de una carpeta antigua sale de su manifiesto o de su reporte
+        legacy_dir = self.output_dir / title
+        if legacy_dir.is_dir() and self.catalog.read_video_id(legacy_dir) == video_id:
+            return legacy_dir
+
+        return self.output_dir / f'{title} [{video_id}]'
+
+    def processed_dir(self, video_id):
+        """
+        Carpeta de un video ya procesado y al día, sin consultar YouTube.
+
+        Las carpetas anteriores al manifiesto (solo con el título) cuentan
+        como procesadas si tienen la página, el reporte y los subtítulos de
+        todos los idiomas.
+
+        Args:
+            video_id (str): ID del video de YouTube
+
+        Returns:
+            Path: Carpeta del video, o None si no está procesado o tiene
+                etapas pendientes
+        """
+        registered = self.catalog.find(video_id) if video_id else None
+        if not registered:
+            return None
+        video_dir = self.output_dir / registered
+        if not (video_dir / StageManifest.FILENAME).exists():
+            required = ['index.html', 'report.txt'] + [
+                self._srt_name(language) for language in [SOURCE_LANGUAGE] + self.target_languages
+            ]
+            return video_dir if all((video_dir / name).exists() for name in required) else None
+        return video_dir if self._pending_stage(StageManifest(video_dir)) is None else None
+
+    def _pending_stage(self, manifest):
+        """
+        Primera etapa que hay que repetir de un video.
+
+        Además de las etapas pendientes o desactualizadas del manifiesto, si
+        han cambiado los idiomas de destino hay que volver a traducir (los
+        idiomas ya traducidos salen de la caché).
+
+        Args:
+            manifest (StageManifest): Manifiesto del video
+
+        Returns:
+            str: Nombre de la etapa o None si el video está al día
+        """
+        pending = manifest.first_pending()
+        translated = manifest.data('translation').get('languages', ['en'])
+        if translated != self.target_languages and (
+            pending is None or STAGES.index(pending) > STAGES.index('translation')
+        ):
+            pending = 'translation'
+        return pending
+
+    def _open_manifest(self, video_dir):
+        """Crea la carpeta del video y carga su manifiesto"""
+        video_dir.mkdir(parents=True, exist_ok=True)
+        return StageManifest(video_dir)
+
+    def _save_stage(self, manifest, stage, files, data=None):
+        """Guarda los archivos de una etapa ({ruta: contenido}) y la registra en el manifiesto"""
+        for path, content in files.items():
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        manifest.complete(stage, list(files), data)
+
+    def _srt_name(self, language):
+        """Nombre del archivo de subtítulos de un idioma"""
+        return f'subtitles_{language}.srt'
+
+    def _partial_publisher(self, video_dir, video_data, render):
+        """
+        Publicación de los subtítulos parciales de un video.
+
+        Args:
+            video_dir (Path): Carpeta del video
+            video_data (dict): Datos del video para la página
+            render (bool): Regenerar también la página con lo publicado
+
+        Returns:
+            tuple: Corrutinas publish(idioma, posición, subtítulos) y
+                refresh() que regenera la página, o (None, None) si no se
+                publican parciales
+        """
+        if not self.publish_partial:
+            return None, None
+
+        page = f"output/{video_dir.name}/index.html"
+
+        def render_partial(languages):
+            # La transcripción está publicada o ya completa; de los demás
+            # idiomas solo se muestran los que se están publicando
+            self._render_html({
+                **video_data,
+                'languages': [
+                    language for language in video_data['languages']
+                    if language == SOURCE_LANGUAGE or language in languages
+                ],
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }, video_dir, partial=True)
+
+        publisher = PartialPublisher(
+            lambda language: video_dir / self._srt_name(language),
+            render_partial if render else None
+        )
+
+        def emit(rendered):
+            if rendered:
+                metrics.emit('partial', page=page, published={
+                    language: round(ms / 1000, 3) for language, ms in publisher.published.items()
+                })
+
+        async def publish(language, position, cues):
+            emit(await self.limits.run('io', publisher.add, language, position, cues))
+
+        async def refresh():
+            emit(await self.limits.run('io', publisher.refresh))
+
+        return publish, refresh
+
+    def _publish(self, manifest, video_dir, video_info, url, video_id, trace=None):
+        """Genera el reporte, cierra el manifiesto y actualiza el catálogo"""
+        self._generate_report(video_dir, video_info, url, trace)
+        manifest.complete('report', [video_dir / 'report.txt'])
+        self.catalog.upsert(video_dir, url, video_id)
+
+    async def _detect_silences(self, audio_path):
+        """
+        Detecta los tramos de silencio del audio con el filtro silencedetect.
+        
+        Args:
+            audio_path (Path): Ruta al archivo de audio
             
-            es_srt_path = video_dir / 'subtitles_es.srt'
-            en_srt_path = video_dir / 'subtitles_en.srt'
+        Returns:
+            list: Tuplas (inicio, fin) en segundos; fin es None si el silencio
+                llega hasta el final del audio
+        """
+        _, stderr = await self._run_ffmpeg(ffmpeg.input(str(audio_path)).output(
+            '-',
+            format='null',
+            af=f'silencedetect=noise={self.silence_noise}:d={self.silence_min_duration}'
+        ))
+
+        silences = []
+        for line in stderr.decode('utf-8', errors='ignore').splitlines():
+            start = re.search(r'silence_start: (-?[\d.]+)', line)
+            end = re.search(r'silence_end: ([\d.]+)', line)
+            if start:
+                silences.append([max(float(start.group(1)), 0.0), None])
+            elif end and silences:
+                silences[-1][1] = float(end.group(1))
+        return [tuple(silence) for silence in silences]
+
+    def _plan_chunks(self, duration, silences):
+        """
+        Calcula los cortes del audio en fragmentos de unos chunk_seconds.
+        
+        Cada corte se coloca en el centro del silencio más cercano a la
+        posición ideal (dentro de un margen del 20%), para no partir frases.
+        
+        Args:
+            duration (float): Duración del audio en segundos
+            silences (list): Tramos de silencio (inicio, fin)
             
-            with open(es_srt_path, 'w', encoding='utf-8') as f:
-                f.write(es_srt)
-            with open(en_srt_path, 'w', encoding='utf-8') as f:
-                f.write(en_srt)
-
-            # Generar HTML y reporte
-            video_data = {
-                'title': video_title,
-                'url': url,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+        Returns:
+            list: Tuplas (inicio, fin) en segundos; el último fin es None
+        """
+        if not duration or duration <= self.chunk_seconds:
+            return [(0.0, None)]
+
+        window = self.chunk_seconds * 0.2
+        midpoints = [(start + (end if end is not None else duration)) / 2 for start, end in silences]
+        cuts = [0.0]
+
+        while duration - cuts[-1] > self.chunk_seconds:
+            target = cuts[-1] + self.chunk_seconds
+            candidates = [
+                point for point in midpoints
+                if abs(point - target) <= window and point - cuts[-1] > window
+            ]
+            cuts.append(min(candidates, key=lambda point: abs(point - target)) if candidates else target)
+
+        return list(zip(cuts, cuts[1:] + [None]))
+
+    def _plan_voiced(self, duration, silences):
+        """
+        Calcula los tramos del audio que se conservan al quitar los silencios.
+
+        Solo se quitan los silencios de al menos trim_min_silence segundos, y
+        a cada lado de la voz se conservan trim_padding segundos para no
+        cortar el principio o el final de las palabras.
+
+        Args:
+            duration (float): Duración del audio en segundos
+            silences (list): Tramos de silencio (inicio, fin)
+
+        Returns:
+            list: Tuplas (inicio, fin) en segundos; el último fin es None si
+                el tramo llega hasta el final del audio
+        """
+        padding = min(self.trim_padding, self.trim_min_silence / 2)
+        regions = []
+        voiced_from = 0.0
+
+        for start, end in silences:
+            end = duration if end is None else min(end, duration)
+            if end - start < self.trim_min_silence:
+                continue
+            if start > voiced_from:
+                regions.append((max(voiced_from - padding, 0.0), start + padding))
+            voiced_from = end
+
+        if voiced_from < duration:
+            regions.append((max(voiced_from - padding, 0.0), None))
+        return regions
+
+    async def _asr_audio(self, audio_path, regions=None):
+        """
+        Genera el audio que se envía a transcribir según el perfil asr_profile.
+
+        Si se indican tramos, el audio contiene solo esos tramos, uno tras
+        otro, en la misma pasada de ffmpeg.
 
-            await self.generate_html(video_data, video_dir)
-            self._generate_report(video_dir, video_info, url)
+        Args:
+            audio_path (Path): Ruta al audio guardado
+            regions (list): Tramos (inicio, fin) en segundos a conservar (opcional)
+
+        Returns:
+            Path: Ruta al audio para transcribir; es audio_path si el perfil es
+                'original' y no hay tramos
+        """
+        profile = AUDIO_PROFILES[self.asr_profile]
+        if profile is None and not regions:
+            return audio_path
+
+        options = dict(profile or {'ext': 'mp3', 'acodec': 'libmp3lame', 'ab': '128k'})
+        asr_path = audio_path.parent / f"asr.{options.pop('ext')}"
+        if regions:
+            expression = '+'.join(
+                f'between(t,{start:.3f},{end:.3f})' if end is not None else f'gte(t,{start:.3f})'
+                for start, end in regions
+            )
+            options['af'] = f"aselect='{expression}',asetpts=N/SR/TB"
+
+        await self._run_ffmpeg(ffmpeg.input(str(audio_path)).output(
+            str(asr_path),
+            vn=None,
+            **options
+        ).overwrite_output())
+        return asr_path
+
+    async def _split_audio(self, audio_path, chunks):
+        """
+        Divide el audio en fragmentos copiando el stream sin recodificar.
+
+        Los fragmentos se cortan en paralelo, dentro del límite de ffmpeg.
+        
+        Args:
+            audio_path (Path): Ruta al archivo de audio
+            chunks (list): Tuplas (inicio, fin) en segundos
             
-            return True
+        Returns:
+            list: Rutas de los fragmentos, en el mismo orden que chunks
+        """
+        chunk_dir = audio_path.parent / 'chunks'
+        chunk_dir.mkdir(exist_ok=True)
 
-        except Exception as e:
-            print(f"Error procesando video: {str(e)}")
-            raise
-        finally:
-            if client:
-                await client.close()
+        paths = []
+        commands = []
+        for i, (start, end) in enumerate(chunks):
+            chunk_path = chunk_dir / f'chunk_{i:03d}{audio_path.suffix}'
+            options = {'t': end - start} if end is not None else {}
+            commands.append(ffmpeg.input(str(audio_path), ss=start, **options).output(
+                str(chunk_path),
+                acodec='copy'
+            ).overwrite_output())
+            paths.append(chunk_path)
+
+        await asyncio.gather(*(self._run_ffmpeg(command) for command in commands))
+        return paths
 
-    async def generate_subtitles(self, audio_path, duration):
+    async def _transcribe(self, client, audio_path, duration, publish=None):
         """
-        Genera subtítulos en español e inglés usando OpenAI.
+        Transcribe el audio en fragmentos enviados a Whisper concurrentemente.
+
+        Se transcribe una copia del audio codificada con el perfil asr_profile.
+        Con trim_silence se quitan además los silencios largos, de modo que
+        solo se envía (y se paga) la voz; los tiempos de la transcripción se
+        devuelven después a su posición en el audio original.
         
         Args:
+            client (AsyncOpenAI): Cliente de OpenAI
             audio_path (str): Ruta al archivo de audio
-            duration (int): Duración del video en segundos
+            duration (int): Duración del audio en segundos
+            publish (callable): Publica los subtítulos de cada fragmento (opcional)
             
         Returns:
-            tuple: (subtítulos_español, subtítulos_inglés)
+            str: Transcripción en formato SRT con los tiempos del audio completo
         """
-        print("Transcribiendo audio...")
-        
+        source_path = Path(audio_path)
+        silences = None
+        regions = None
+
+        if self.trim_silence and duration:
+            silences = await self._detect_silences(source_path)
+            regions = self._plan_voiced(duration, silences)
+            voiced = sum((end if end is not None else duration) - start for start, end in regions)
+            if regions and duration - voiced >= self.trim_min_silence:
+                print(f"Quitando {duration - voiced:.0f} s de silencio de {duration:.0f} s de audio")
+                metrics.count('trimmed_seconds', duration - voiced)
+                # Los silencios cortos que quedan se buscan en el audio recortado
+                duration, silences = voiced, None
+            else:
+                regions = None
+
+        audio_path = await self._asr_audio(source_path, regions)
         try:
-            client = AsyncOpenAI(api_key=self.api_key)
-            async with client:
-                # Generar transcripción en español
-                with open(audio_path, 'rb') as audio_file:
-                    transcript = await client.audio.transcriptions.create(
+            return await self._transcribe_chunks(client, audio_path, duration, silences, regions, publish)
+        finally:
+            if audio_path != source_path:
+                audio_path.unlink(missing_ok=True)
+
+    async def _transcribe_chunks(self, client, audio_path, duration, silences=None, regions=None, publish=None):
+        """
+        Divide el audio en fragmentos y los transcribe concurrentemente.
+
+        Args:
+            client (AsyncOpenAI): Cliente de OpenAI
+            audio_path (Path): Ruta al archivo de audio
+            duration (float): Duración del audio en segundos
+            silences (list): Silencios ya detectados en el audio (opcional)
+            regions (list): Tramos del original que forman el audio, si es un
+                audio recortado (opcional)
+            publish (callable): Recibe (idioma, posición, subtítulos) de cada
+                fragmento en cuanto se transcribe (opcional)
+
+        Returns:
+            str: Transcripción en formato SRT con los tiempos del original
+        """
+        chunks = [(0.0, None)]
+        if duration and duration > self.chunk_seconds:
+            if silences is None:
+                silences = await self._detect_silences(audio_path)
+            chunks = self._plan_chunks(duration, silences)
+
+        if len(chunks) == 1:
+            paths = [audio_path]
+        else:
+            paths = await self._split_audio(audio_path, chunks)
+            print(f"Audio dividido en {len(paths)} fragmentos")
+
+        metrics.count('audio_seconds', duration or 0)
+        segments = [
+            (round(start * 1000), round(end * 1000) if end is not None else None)
+            for start, end in regions
+        ] if regions else None
+
+        async def transcribe_chunk(position, path, start):
+            metrics.count('openai_requests', 1, endpoint='transcriptions')
+            metrics.count('upload_bytes', path.stat().st_size)
+
+            # El archivo se vuelve a abrir en cada reintento
+            async def request():
+                with open(path, 'rb') as audio_file:
+                    return await client.audio.transcriptions.with_raw_response.create(
                         file=audio_file,
-                        model="whisper-1",
+                        model=self.transcription_model,
                         response_format="srt",
-                        language="es"
+                        language=SOURCE_LANGUAGE
                     )
 
-                # Traducir a inglés usando GPT-4
-                translation = await client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": "Eres un traductor profesional. Traduce los subtítulos manteniendo el formato SRT."},
-                        {"role": "user", "content": f"Traduce estos subtítulos al inglés:\n\n{transcript}"}
-                    ]
-                )
+            transcript = await self.rate_limiter.call(self.transcription_model, request)
 
-                return transcript, translation.choices[0].message.content
+            # Desplazar el fragmento a su posición en el audio completo
+            cues = subtitles.shift(subtitles.parse_string(transcript), round(start * 1000))
+            if segments:
+                cues = subtitles.remap(cues, segments)
+            cues = list(cues)
+            if publish is not None:
+                await publish(SOURCE_LANGUAGE, position, cues)
+            return cues
 
-        except Exception as e:
-            print(f"Error generando subtítulos: {str(e)}")
-            raise
+        try:
+            results = await self._gather_progress('transcription', [
+                transcribe_chunk(position, path, start)
+                for position, (path, (start, _)) in enumerate(zip(paths, chunks))
+            ])
+        finally:
+            if len(paths) > 1:
+                shutil.rmtree(paths[0].parent, ignore_errors=True)
 
-    def _sanitize_filename(self, filename):
-        """Limpia el nombre del archivo de caracteres no válidos"""
-        return "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_')).strip()
+        return subtitles.compose(itertools.chain.from_iterable(results))
 
-    def _parse_srt(self, srt_content):
+    async def _translate_texts(self, client, texts, language):
         """
-        Parsea el contenido SRT en una lista de diccionarios.
+        Traduce una lista de textos de subtítulos en una sola llamada.
+        
+        Solo se envía el texto de cada subtítulo, como lista JSON, y se exige
+        una lista JSON con el mismo número de elementos. Si la respuesta no
+        cuadra se reintenta y, en último caso, se divide el lote en dos.
         
         Args:
-            srt_content (str): Contenido del archivo SRT
+            client (AsyncOpenAI): Cliente de OpenAI
+            texts (list): Textos de los subtítulos
+            language (str): Código del idioma de destino
             
         Returns:
-            list: Lista de diccionarios con índice, timestamp y texto
+            list: Textos traducidos en el mismo orden
         """
-        entries = []
-        current_entry = {}
-        lines = srt_content.strip().split('\n')
-        i = 0
-        
-        while i < len(lines):
-            if not lines[i].strip():
-                i += 1
+        name = LANGUAGES.get(language, (language,))[0]
+        messages = [
+            {"role": "system", "content": (
+                "Eres un traductor profesional de subtítulos. Recibirás una lista JSON "
+                f"de textos. Tradúcelos al {name} y responde únicamente con una "
+                "lista JSON de cadenas con el mismo número de elementos y en el mismo orden."
+            )},
+            {"role": "user", "content": json.dumps(texts, ensure_ascii=False)}
+        ]
+        # Tokens del prompt más una respuesta de tamaño parecido al texto
+        tokens = estimate_tokens(messages[0]['content']) + 2 * estimate_tokens(messages[1]['content'])
+
+        for _ in range(TRANSLATION_RETRIES):
+            response = await self.rate_limiter.call(
+                self.translation_model,
+                lambda: client.chat.completions.with_raw_response.create(
+                    model=self.translation_model,
+                    temperature=0,
+                    messages=messages
+                ),
+                tokens
+            )
+            metrics.count('openai_requests', 1, endpoint='chat')
+            if response.usage:
+                metrics.count('openai_tokens', response.usage.prompt_tokens, model=self.translation_model, kind='prompt')
+                metrics.count('openai_tokens', response.usage.completion_tokens, model=self.translation_model, kind='completion')
+
+            content = (response.choices[0].message.content or '').strip()
+            fenced = JSON_FENCE.match(content)
+            try:
+                translated = json.loads(fenced.group(1) if fenced else content)
+            except ValueError:
                 continue
-                
-            current_entry = {
-                'index': lines[i],
-                'timestamp': lines[i + 1],
-                'text': lines[i + 2]
-            }
-            entries.append(current_entry)
-            i += 3
-            
-        return entries
+            if (isinstance(translated, list) and len(translated) == len(texts)
+                    and all(isinstance(text, str) for text in translated)):
+                return translated
+
+        if len(texts) == 1:
+            raise ValueError(f"La traducción no devolvió un subtítulo válido: {texts[0]!r}")
 
-    def _srt_to_text(self, srt_path):
+        # Dividir el lote para aislar los subtítulos problemáticos
+        middle = len(texts) // 2
+        first, second = await asyncio.gather(
+            self._translate_texts(client, texts[:middle], language),
+            self._translate_texts(client, texts[middle:], language)
+        )
+        return first + second
+
+    async def _translate(self, client, srt_content, language, publish=None):
         """
-        Convierte archivo SRT a texto plano.
+        Traduce un SRT por lotes de subtítulos enviados concurrentemente.
+        
+        Los índices y tiempos no pasan por el modelo: se vuelven a asociar
+        localmente a cada texto traducido.
         
         Args:
-            srt_path (Path): Ruta al archivo SRT
+            client (AsyncOpenAI): Cliente de OpenAI
+            srt_content (str): Subtítulos de origen en formato SRT
+            language (str): Código del idioma de destino
+            publish (callable): Recibe (idioma, posición, subtítulos) de cada
+                lote en cuanto se traduce (opcional)
             
         Returns:
-            str: Texto plano extraído del SRT
+            str: Subtítulos traducidos en formato SRT
         """
-        if not srt_path.exists():
-            return ""
+        cues = list(subtitles.parse_string(srt_content))
+        batches = [
+            cues[i:i + self.translation_batch_size]
+            for i in range(0, len(cues), self.translation_batch_size)
+        ]
+
+        async def translate_batch(position, batch):
+            texts = await self._translate_texts(client, [cue.text for cue in batch], language)
+            translated = [
+                subtitles.Cue(cue.start, cue.end, text.strip(), cue.index)
+                for cue, text in zip(batch, texts)
+            ]
+            if publish is not None:
+                await publish(language, position, translated)
+            return translated
+
+        results = await self._gather_progress('translation', [
+            translate_batch(position, batch) for position, batch in enumerate(batches)
+        ], language=language)
+        translated = list(itertools.chain.from_iterable(results))
+
+        # Comprobar que la estructura coincide exactamente con el original
+        if [(cue.start, cue.end) for cue in translated] != [(cue.start, cue.end) for cue in cues]:
+            raise ValueError("La traducción no conserva los tiempos de los subtítulos")
+
+        return subtitles.compose(translated)
+
+    async def transcribe_audio(self, client, audio_path, duration, video_id='', audio_hash=None, publish=None):
+        """
+        Transcribe el audio en español, consultando antes la caché.
+        
+        Args:
+            client (AsyncOpenAI): Cliente de OpenAI
+            audio_path (Path): Ruta al archivo de audio
+            duration (int): Duración del video en segundos
+            video_id (str): ID del video de YouTube
+            audio_hash (str): SHA-256 del audio (se calcula si no se indica)
+            publish (callable): Publica los subtítulos de cada fragmento que
+                se transcribe (opcional)
             
-        text = []
-        current_text = []
+        Returns:
+            str: Subtítulos en español en formato SRT
+        """
+        print("Transcribiendo audio...")
+
+        try:
+            if audio_hash is None:
+                audio_hash = await self.limits.run('io', file_hash, audio_path)
+
+            key = self.cache.key(video_id, audio_hash, self.transcription_model, SOURCE_LANGUAGE)
+            transcript = await self.limits.run('io', self.cache.get, 'transcripts', key)
+            if transcript is not None:
+                print("Transcripción obtenida de la caché")
+                metrics.count('cache_hits', 1, namespace='transcripts')
+                return transcript
+
+            # Transcribir por fragmentos en paralelo
+            transcript = await self._transcribe(client, audio_path, duration, publish)
+            await self.limits.run('io', self.cache.put, 'transcripts', key, transcript)
+            return transcript
+
+        except Exception as e:
+            print(f"Error transcribiendo audio: {str(e)}")
+            raise
+
+    async def translate_subtitles(self, client, transcript, video_id='', audio_hash='', language='en', publish=None):
+        """
+        Traduce los subtítulos a un idioma, consultando antes la caché.
         
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        Args:
+            client (AsyncOpenAI): Cliente de OpenAI
+            transcript (str): Subtítulos en español en formato SRT
+            video_id (str): ID del video de YouTube
+            audio_hash (str): SHA-256 del audio transcrito
+            language (str): Código del idioma de destino
+            publish (callable): Publica los subtítulos de cada lote que se
+                traduce (opcional)
             
-        for line in lines:
-            line = line.strip()
-            if line and not line.isdigit() and not '-->' in line:
-                current_text.append(line)
-            elif not line and current_text:
-                text.append(' '.join(current_text))
-                current_text = []
-                
-        if current_text:
-            text.append(' '.join(current_text))
+        Returns:
+            str: Subtítulos traducidos en formato SRT
+        """
+        print(f"Traduciendo subtítulos ({language})...")
+
+        try:
+            key = self.cache.key(video_id, audio_hash, self.translation_model, SOURCE_LANGUAGE, language)
+            translation = await self.limits.run('io', self.cache.get, 'translations', key)
+            if translation is not None:
+                print("Traducción obtenida de la caché")
+                metrics.count('cache_hits', 1, namespace='translations')
+                return translation
+
+            # Traducir por lotes de subtítulos en paralelo
+            translation = await self._translate(client, transcript, language, publish)
+            await self.limits.run('io', self.cache.put, 'translations', key, translation)
+            return translation
+
+        except Exception as e:
+            print(f"Error traduciendo subtítulos ({language}): {str(e)}")
+            raise
+
+    async def translate_all(self, client, transcript, video_id='', audio_hash='', publish=None):
+        """
+        Traduce los subtítulos a todos los idiomas de destino a la vez.
+
+        Args:
+            client (AsyncOpenAI): Cliente de OpenAI
+            transcript (str): Subtítulos en español en formato SRT
+            video_id (str): ID del video de YouTube
+            audio_hash (str): SHA-256 del audio transcrito
+            publish (callable): Publica los subtítulos de cada lote que se
+                traduce (opcional)
+
+        Returns:
+            dict: Subtítulos traducidos en formato SRT por código de idioma
+        """
+        translations = await asyncio.gather(*(
+            self.translate_subtitles(client, transcript, video_id, audio_hash, language, publish)
+            for language in self.target_languages
+        ))
+        return dict(zip(self.target_languages, translations))
+
+    async def generate_subtitles(self, audio_path, duration, video_id=''):
+        """
+        Genera subtítulos en español y en los idiomas de destino usando OpenAI.
+        
+        Antes de cada llamada de pago se consulta la caché de resultados,
+        indexada por ID del video, hash del audio, modelo e idioma.
+        
+        Args:
+            audio_path (str): Ruta al archivo de audio
+            duration (int): Duración del video en segundos
+            video_id (str): ID del video de YouTube
             
-        return '\n\n'.join(text)
+        Returns:
+            tuple: (subtítulos_español, {idioma: subtítulos_traducidos})
+        """
+        try:
+            audio_hash = await self.limits.run('io', file_hash, audio_path)
+
+            client = self._client()
+            transcript = await self.transcribe_audio(client, audio_path, duration, video_id, audio_hash)
+            translations = await self.translate_all(client, transcript, video_id, audio_hash)
+            return transcript, translations
+
+        except Exception as e:
+            if isinstance(e, AuthenticationError):
+                self.invalidate_api()
+            print(f"Error generando subtítulos: {str(e)}")
+            raise
+
+    def _sanitize_filename(self, filename):
+        """Limpia el nombre del archivo de caracteres no válidos"""
+        return "".join(c for c in filename if c.isalnum() or c in (' ', '-', '_')).strip()
 
     async def generate_html(self, video_data, video_dir):
         """
-        Genera el archivo HTML usando la plantilla.
+        Genera el archivo HTML usando la plantilla y actualiza el índice de
+        búsqueda con los subtítulos del video.
         
         Args:
             video_data (dict): Datos del video
             video_dir (Path): Directorio del video
         """
         try:
-            # Convertir subtítulos a texto
-            es_srt_path = video_dir / 'subtitles_es.srt'
-            en_srt_path = video_dir / 'subtitles_en.srt'
-            
-            es_text = self._srt_to_text(es_srt_path)
-            en_text = self._srt_to_text(en_srt_path)
-
-            # Preparar datos y generar HTML
-            template = self.jinja_env.get_template('index.html')
-            template_data = {
-                'title': video_data['title'],
-                'video_name': 'video.mp4',
-                'audio_name': 'audio.mp3',
-                'es_srt_name': 'subtitles_es.srt',
-                'en_srt_name': 'subtitles_en.srt',
-                'url': video_data['url'],
-                'timestamp': video_data['timestamp'],
-                'es_text': es_text,
-                'en_text': en_text
-            }
-
-            html_content = template.render(**template_data)
-            
-            # Guardar HTML
-            html_path = video_dir / 'index.html'
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            # Leer y renderizar fuera del bucle de eventos
+            await self.limits.run('io', self._render_html, video_data, video_dir)
 
         except Exception as e:
             print(f"Error generando HTML: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def _tracks(self, video_dir, languages):
+        """
+        Pistas de subtítulos de un video, con su texto, para la plantilla.
+
+        Args:
+            video_dir (Path): Directorio del video
+            languages (list): Códigos de idioma, el de origen primero
+
+        Returns:
+            list: Un dict por idioma con lang, name, label, srt_name y text
+        """
+        tracks = []
+        for language in languages:
+            srt_path = video_dir / self._srt_name(language)
+            if not srt_path.exists():
+                continue
+            name, label = LANGUAGES.get(language, (language, language))
+            tracks.append({
+                'lang': language,
+                'name': name,
+                'label': label,
+                'srt_name': srt_path.name,
+                'text': subtitles.to_text(subtitles.iter_file(srt_path))
+            })
+        return tracks
+
+    def _render_html(self, video_data, video_dir, partial=False):
+        """
+        Renderiza la plantilla con los subtítulos y guarda index.html.
+
+        Una página parcial se genera mientras se procesa el video, con los
+        subtítulos publicados hasta el momento. La carpeta queda marcada
+        (PARTIAL_MARKER) para que el catálogo no la liste ni la indexe hasta
+        la página definitiva.
+        """
+        languages = video_data.get('languages', [SOURCE_LANGUAGE] + self.target_languages)
+
+        # Preparar datos y generar HTML
+        template = self.jinja_env.get_template('index.html')
+        template_data = {
+            'title': video_data['title'],
+            'video_name': video_data.get('video_name'),
+            'audio_name': video_data.get('audio_name', 'audio.mp3'),
+            'url': video_data['url'],
+            'timestamp': video_data['timestamp'],
+            'tracks': self._tracks(video_dir, languages),
+            'partial': partial
+        }
+
+        html_content = template.render(**template_data)
+        
+        # La marca se pone antes de escribir la página parcial y se quita
+        # después de escribir la definitiva
+        marker = video_dir / PARTIAL_MARKER
+        if partial:
+            marker.touch()
+
+        # Guardar HTML
+        html_path = video_dir / 'index.html'
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+
+        if partial:
+            return
+        marker.unlink(missing_ok=True)
+
+        # Indexar los subtítulos nuevos o cambiados para la búsqueda
+        self.catalog.index_transcripts(video_dir)
@@ -0,0 +1,305 @@
+"""
+SRT YouTube Generator - Rate Limiter
+-------------------------------------
+Este módulo coordina todas las llamadas a la API de OpenAI para aprovechar
+los límites de la cuenta sin que un 429 haga fallar un video:
+- Presupuesto de peticiones y tokens por minuto de cada modelo
+- Límites aprendidos de las cabeceras x-ratelimit-* de las respuestas
+- Pausa del modelo durante el retry-after de un 429
+- Reintentos con espera exponencial aleatoria (jitter)
+- Concurrencia adaptativa: se reduce a la mitad con cada 429 y crece
+  poco a poco con cada respuesta correcta
+- Techo global de llamadas simultáneas (OPENAI_CONCURRENCY) para todos los
+  modelos juntos
+
+Clases:
+    ModelBudget: Presupuesto y concurrencia de un modelo
+    RateLimiter: Planificador compartido de las llamadas a OpenAI
+
+Funciones:
+    estimate_tokens: Estimación rápida de los tokens de un texto
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from dotenv import load_dotenv
+from openai import RateLimitError, InternalServerError, APIConnectionError
+import metrics
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Segundos entre comprobaciones cuando no hay hueco de concurrencia
+CONCURRENCY_POLL = 0.05
+
+# Espera base y máxima de los reintentos sin retry-after, en segundos
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Duraciones de las cabeceras x-ratelimit-reset-* (p. ej. 1s, 6m0s, 20ms)
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+def estimate_tokens(text):
+    """
+    Estimación rápida y por exceso de los tokens de un texto.
+
+    Args:
+        text (str): Texto
+
+    Returns:
+        int: Tokens aproximados (unos 3 caracteres por token)
+    """
+    return len(text) // 3 + 1
+
+def _parse_duration(value):
+    """Segundos de una duración de cabecera, o None si no se reconoce"""
+    parts = DURATION_PART.findall(value or '')
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+def _retry_after(headers):
+    """Segundos indicados por retry-after-ms o retry-after, o None"""
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return None
+
+class ModelBudget:
+    """
+    Presupuesto de llamadas de un modelo.
+
+    Las peticiones y los tokens por minuto se controlan con dos cubos que se
+    rellenan de forma continua; un límite de 0 significa desconocido (sin
+    control) hasta que lo indiquen las cabeceras.
+
+    Atributos:
+        rpm (float): Peticiones por minuto permitidas (0: sin límite)
+        tpm (float): Tokens por minuto permitidos (0: sin límite)
+        max_concurrency (int): Techo de llamadas simultáneas
+        concurrency (float): Llamadas simultáneas permitidas ahora
+        in_flight (int): Llamadas en curso
+        paused_until (float): Instante (time.monotonic) hasta el que no se llama
+    """
+
+    def __init__(self, rpm=0, tpm=0, max_concurrency=4):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        """Rellena los cubos según el tiempo transcurrido"""
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def try_acquire(self, tokens, now):
+        """
+        Intenta reservar una llamada.
+
+        Args:
+            tokens (int): Tokens estimados de la llamada
+            now (float): Instante actual (time.monotonic)
+
+        Returns:
+            float: 0 si se ha reservado o segundos que conviene esperar
+        """
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= max(int(self.concurrency), 1):
+            return CONCURRENCY_POLL
+
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        waits = [0]
+        if self.rpm and self._requests < 1:
+            waits.append((1 - self._requests) * 60 / self.rpm)
+        if tokens and self._tokens < tokens:
+            waits.append((tokens - self._tokens) * 60 / self.tpm)
+        if max(waits) > 0:
+            return max(waits)
+
+        if self.rpm:
+            self._requests -= 1
+        self._tokens -= tokens
+        self.in_flight += 1
+        return 0
+
+    def settle(self, estimated, used):
+        """Corrige el cubo de tokens con los tokens realmente usados"""
+        if self.tpm and used is not None:
+            self._tokens = min(self.tpm, self._tokens + min(estimated, self.tpm) - used)
+
+    def learn(self, headers, now):
+        """
+        Ajusta los límites con las cabeceras x-ratelimit-* de una respuesta.
+
+        Si no quedan peticiones o tokens, el modelo se pausa hasta que la
+        API indica que se reponen.
+
+        Args:
+            headers: Cabeceras de la respuesta
+            now (float): Instante actual (time.monotonic)
+        """
+        for kind in ('requests', 'tokens'):
+            limit = headers.get(f'x-ratelimit-limit-{kind}')
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            if limit is None or remaining is None:
+                continue
+            try:
+                limit, remaining = float(limit), float(remaining)
+            except ValueError:
+                continue
+
+            # Un límite recién conocido empieza con lo que queda según la API,
+            # no con el cubo vacío de cuando no había límite
+            if kind == 'requests':
+                bucket = self._requests if self.rpm else limit
+                self.rpm = limit
+                self._requests = min(bucket, limit, remaining)
+            else:
+                bucket = self._tokens if self.tpm else limit
+                self.tpm = limit
+                self._tokens = min(bucket, limit, remaining)
+
+            reset = _parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+            if remaining <= 0 and reset:
+                self.paused_until = max(self.paused_until, now + reset)
+
+    def throttle(self, delay, now):
+        """Reduce la concurrencia a la mitad y, si se indica, pausa el modelo"""
+        self.concurrency = max(1.0, self.concurrency / 2)
+        if delay:
+            self.paused_until = max(self.paused_until, now + delay)
+
+    def succeed(self):
+        """Aumenta poco a poco la concurrencia hasta el techo"""
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+class RateLimiter:
+    """
+    Planificador compartido de las llamadas a la API de OpenAI.
+
+    Todas las llamadas pasan por call(), que espera hueco en el presupuesto
+    del modelo, ejecuta la petición y reintenta los 429, los errores 5xx y
+    los de conexión. El estado se comparte entre hilos y bucles de eventos
+    del proceso (la cola de trabajos y las peticiones de Flask).
+
+    Atributos:
+        rpm (float): Peticiones por minuto de cada modelo (0: aprender de la API)
+        tpm (float): Tokens por minuto de cada modelo (0: aprender de la API)
+        max_concurrency (int): Techo de llamadas simultáneas de todos los
+            modelos juntos (también el de cada modelo)
+        max_retries (int): Reintentos de una llamada antes de fallar
+        budgets (dict): Presupuesto de cada modelo
+        in_flight (int): Llamadas en curso de todos los modelos
+    """
+
+    def __init__(self, rpm=None, tpm=None, max_concurrency=None, max_retries=None):
+        self.rpm = rpm if rpm is not None else float(os.getenv('OPENAI_RPM', '0'))
+        self.tpm = tpm if tpm is not None else float(os.getenv('OPENAI_TPM', '0'))
+        self.max_concurrency = max_concurrency or int(os.getenv('OPENAI_CONCURRENCY', '4'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('OPENAI_MAX_RETRIES', '6'))
+        self.budgets = {}
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def budget(self, model):
+        """Presupuesto de un modelo, creado con los límites por defecto"""
+        with self._lock:
+            if model not in self.budgets:
+                self.budgets[model] = ModelBudget(self.rpm, self.tpm, self.max_concurrency)
+            return self.budgets[model]
+
+    async def _acquire(self, budget, tokens):
+        """Espera hasta poder reservar una llamada en el presupuesto y en el techo global"""
+        while True:
+            with self._lock:
+                if self.in_flight >= self.max_concurrency:
+                    wait = CONCURRENCY_POLL
+                else:
+                    wait = budget.try_acquire(tokens, time.monotonic())
+                    if not wait:
+                        self.in_flight += 1
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def _backoff(self, attempt):
+        """Espera exponencial con jitter para el reintento número attempt"""
+        return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+
+    async def call(self, model, request, tokens=0):
+        """
+        Ejecuta una llamada a la API dentro del presupuesto del modelo.
+
+        La petición debe devolver la respuesta cruda (with_raw_response) para
+        poder leer las cabeceras de límites; se devuelve ya interpretada.
+
+        Args:
+            model (str): Modelo al que se atribuye la llamada
+            request (callable): Crea la corrutina de la petición; se vuelve a
+                llamar en cada reintento
+            tokens (int): Tokens estimados de la llamada (0 si no aplica)
+
+        Returns:
+            Respuesta interpretada de la API
+        """
+        budget = self.budget(model)
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(budget, tokens)
+            try:
+                # La reserva se libera una sola vez en cualquier caso, también
+                # si la llamada se cancela (p. ej. al perder el lease del trabajo)
+                try:
+                    raw = await request()
+                finally:
+                    with self._lock:
+                        budget.in_flight -= 1
+                        self.in_flight -= 1
+            except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                if isinstance(e, RateLimitError):
+                    with self._lock:
+                        now = time.monotonic()
+                        headers = e.response.headers
+                        budget.learn(headers, now)
+                        budget.throttle(_retry_after(headers), now)
+                        metrics.metrics.set('srt_openai_concurrency', budget.concurrency, model=model)
+                if attempt == self.max_retries:
+                    raise
+                reason = {RateLimitError: 'rate_limit', InternalServerError: 'server'}.get(type(e), 'connection')
+                metrics.count('openai_retries', 1, model=model, reason=reason)
+                if not isinstance(e, RateLimitError) or _retry_after(e.response.headers) is None:
+                    await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            response = raw.parse()
+            usage = getattr(response, 'usage', None)
+            with self._lock:
+                budget.learn(raw.headers, time.monotonic())
+                budget.settle(tokens, getattr(usage, 'total_tokens', None))
+                budget.succeed()
+                metrics.metrics.set('srt_openai_concurrency', budget.concurrency, model=model)
+            return response
+
+# Planificador compartido por todos los procesadores del proceso
+rate_limiter = RateLimiter()
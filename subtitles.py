@@ -0,0 +1,302 @@
+"""
+SRT YouTube Generator - Subtitles
+-------------------------------------
+Este módulo implementa el modelo de datos y el tratamiento de archivos SRT:
+- Subtítulo compacto con tiempos en milisegundos enteros
+- Parser en streaming que admite subtítulos de varias líneas
+- Serialización a SRT y exportación a texto plano
+- Operaciones de desplazamiento, unión y recorte
+
+Clases:
+    Cue: Subtítulo individual
+
+Funciones:
+    parse: Genera subtítulos a partir de líneas SRT
+    parse_string: Genera subtítulos a partir de un contenido SRT
+    iter_file: Genera subtítulos leyendo un archivo SRT en streaming
+    compose: Serializa subtítulos a contenido SRT
+    write_file: Escribe subtítulos en un archivo SRT
+    shift: Desplaza los tiempos de los subtítulos
+    remap: Lleva los tiempos de un audio recortado al audio original
+    merge: Une varias secuencias ordenadas de subtítulos
+    slice_cues: Recorta los subtítulos a un intervalo de tiempo
+    to_text: Convierte subtítulos a texto plano por párrafos
+"""
+
+import re
+import heapq
+from bisect import bisect_left, bisect_right
+
+# Línea de tiempos de un subtítulo SRT (00:00:01,000 --> 00:00:04,000)
+TIMING = re.compile(
+    r'(\d+):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{3})'
+)
+
+class Cue:
+    """
+    Subtítulo individual.
+
+    Atributos:
+        start (int): Inicio en milisegundos
+        end (int): Fin en milisegundos
+        text (str): Texto, con saltos de línea si ocupa varias líneas
+        index (int): Número del subtítulo en el archivo de origen
+    """
+
+    __slots__ = ('start', 'end', 'text', 'index')
+
+    def __init__(self, start, end, text, index=0):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.index = index
+
+    def shifted(self, offset):
+        """
+        Copia del subtítulo desplazada en el tiempo.
+
+        Args:
+            offset (int): Desplazamiento en milisegundos
+
+        Returns:
+            Cue: Subtítulo desplazado
+        """
+        return Cue(self.start + offset, self.end + offset, self.text, self.index)
+
+    def __eq__(self, other):
+        if not isinstance(other, Cue):
+            return NotImplemented
+        return (self.start, self.end, self.text) == (other.start, other.end, other.text)
+
+    def __repr__(self):
+        return f"Cue({format_timestamp(self.start)} --> {format_timestamp(self.end)}, {self.text!r})"
+
+def _to_ms(h, m, s, ms):
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms)
+
+def format_timestamp(ms):
+    """
+    Formatea milisegundos como marca de tiempo SRT.
+
+    Args:
+        ms (int): Tiempo en milisegundos
+
+    Returns:
+        str: Marca de tiempo (HH:MM:SS,mmm)
+    """
+    h, ms = divmod(max(int(ms), 0), 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+def _parse_block(lines, position):
+    """Convierte las líneas de un bloque SRT en un subtítulo"""
+    for i, line in enumerate(lines):
+        timing = TIMING.search(line)
+        if timing:
+            text = '\n'.join(text_line.strip() for text_line in lines[i + 1:]).strip()
+            if not text:
+                return None
+            index = lines[i - 1].strip() if i > 0 else ''
+            groups = timing.groups()
+            return Cue(
+                _to_ms(*groups[:4]),
+                _to_ms(*groups[4:]),
+                text,
+                int(index) if index.isdigit() else position
+            )
+    return None
+
+def parse(lines):
+    """
+    Genera subtítulos a partir de líneas SRT sin cargar el archivo entero.
+
+    Los bloques se separan por líneas vacías; el texto puede ocupar varias
+    líneas. Los bloques sin línea de tiempos o sin texto se ignoran.
+
+    Args:
+        lines (iterable): Líneas SRT (un archivo abierto, una lista...)
+
+    Yields:
+        Cue: Subtítulos en el orden del archivo
+    """
+    block = []
+    position = 0
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not position and not block:
+            line = line.lstrip('\ufeff')
+        if line.strip():
+            block.append(line)
+            continue
+        if block:
+            cue = _parse_block(block, position + 1)
+            block = []
+            if cue:
+                position += 1
+                yield cue
+
+    if block:
+        cue = _parse_block(block, position + 1)
+        if cue:
+            yield cue
+
+def parse_string(content):
+    """
+    Genera subtítulos a partir de un contenido SRT.
+
+    Args:
+        content (str): Contenido SRT
+
+    Yields:
+        Cue: Subtítulos en el orden del contenido
+    """
+    return parse(content.splitlines())
+
+def iter_file(path):
+    """
+    Genera subtítulos leyendo un archivo SRT en streaming.
+
+    Args:
+        path (Path): Ruta al archivo SRT
+
+    Yields:
+        Cue: Subtítulos en el orden del archivo
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        yield from parse(f)
+
+def _serialize(cues, start=1):
+    for number, cue in enumerate(cues, start):
+        yield f"{number}\n{format_timestamp(cue.start)} --> {format_timestamp(cue.end)}\n{cue.text}\n\n"
+
+def compose(cues, start=1):
+    """
+    Serializa subtítulos a contenido SRT numerado consecutivamente.
+
+    Args:
+        cues (iterable): Subtítulos
+        start (int): Número del primer subtítulo
+
+    Returns:
+        str: Contenido SRT
+    """
+    return ''.join(_serialize(cues, start))
+
+def write_file(cues, path, start=1, append=False):
+    """
+    Escribe subtítulos en un archivo SRT sin construir el contenido entero.
+
+    Args:
+        cues (iterable): Subtítulos
+        path (Path): Ruta al archivo SRT
+        start (int): Número del primer subtítulo
+        append (bool): Añadir al final del archivo en lugar de sobrescribirlo
+
+    Returns:
+        int: Número de subtítulos escritos
+    """
+    count = 0
+    with open(path, 'a' if append else 'w', encoding='utf-8') as f:
+        for block in _serialize(cues, start):
+            f.write(block)
+            count += 1
+    return count
+
+def shift(cues, offset):
+    """
+    Desplaza los tiempos de los subtítulos.
+
+    Args:
+        cues (iterable): Subtítulos
+        offset (int): Desplazamiento en milisegundos
+
+    Yields:
+        Cue: Subtítulos desplazados
+    """
+    for cue in cues:
+        yield cue.shifted(offset)
+
+def remap(cues, segments):
+    """
+    Lleva los tiempos de subtítulos de un audio recortado al audio original.
+
+    El audio recortado es la concatenación de los tramos conservados del
+    original; cada tiempo se sitúa en su tramo y se desplaza al inicio de
+    ese tramo en el original. Un fin que coincide con el final de un tramo
+    se queda en ese tramo y no salta al inicio del siguiente.
+
+    Args:
+        cues (iterable): Subtítulos con tiempos del audio recortado
+        segments (list): Tramos (inicio, fin) en milisegundos del original
+            conservados, en orden; el fin del último puede ser None
+
+    Yields:
+        Cue: Subtítulos con tiempos del audio original
+    """
+    # Inicio de cada tramo en el audio recortado
+    offsets = []
+    position = 0
+    for start, end in segments:
+        offsets.append(position)
+        if end is not None:
+            position += end - start
+
+    def to_original(ms, search):
+        i = max(search(offsets, ms) - 1, 0)
+        return segments[i][0] + ms - offsets[i]
+
+    for cue in cues:
+        start = to_original(cue.start, bisect_right)
+        end = max(to_original(cue.end, bisect_left), start)
+        yield Cue(start, end, cue.text, cue.index)
+
+def merge(*streams):
+    """
+    Une varias secuencias de subtítulos ordenadas por inicio.
+
+    Args:
+        *streams (iterable): Secuencias de subtítulos ordenadas
+
+    Yields:
+        Cue: Subtítulos de todas las secuencias ordenados por inicio
+    """
+    return heapq.merge(*streams, key=lambda cue: cue.start)
+
+def slice_cues(cues, start, end=None):
+    """
+    Recorta los subtítulos a un intervalo de tiempo.
+
+    Los subtítulos que cruzan los límites se ajustan al intervalo.
+
+    Args:
+        cues (iterable): Subtítulos ordenados por inicio
+        start (int): Inicio del intervalo en milisegundos
+        end (int): Fin del intervalo en milisegundos (None: hasta el final)
+
+    Yields:
+        Cue: Subtítulos dentro del intervalo
+    """
+    for cue in cues:
+        if end is not None and cue.start >= end:
+            break
+        if cue.end <= start:
+            continue
+        yield Cue(
+            max(cue.start, start),
+            cue.end if end is None else min(cue.end, end),
+            cue.text,
+            cue.index
+        )
+
+def to_text(cues):
+    """
+    Convierte subtítulos a texto plano, un párrafo por subtítulo.
+
+    Args:
+        cues (iterable): Subtítulos
+
+    Returns:
+        str: Texto con los párrafos separados por líneas vacías
+    """
+    return '\n\n'.join(' '.join(cue.text.split('\n')) for cue in cues)
@@ -0,0 +1,8 @@
+"""
+Configuración de las pruebas: los módulos del proyecto están en la raíz
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
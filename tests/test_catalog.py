@@ -0,0 +1,100 @@
+"""
+Pruebas de la resolución de carpetas por ID de video (catalog.py, processor.py)
+"""
+
+import asyncio
+import pytest
+from pathlib import Path
+import metrics
+from processor import VideoProcessor
+
+VIDEO_ID = 'VYfGCMojSDk'
+TITLE = 'Ilustres Ignorantes'
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.setenv('OUTPUT_DIR', str(tmp_path / 'output'))
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('TARGET_LANGUAGES', 'en')
+    return VideoProcessor()
+
+def make_baseline_dir(output_dir):
+    """Carpeta con el formato original: solo el título y sin manifest.json"""
+    video_dir = output_dir / TITLE
+    video_dir.mkdir(parents=True)
+    (video_dir / 'index.html').write_text('<h1>Ilustres Ignorantes</h1>', encoding='utf-8')
+    (video_dir / 'report.txt').write_text(
+        f"URL: https://www.youtube.com/watch?v={VIDEO_ID}\n"
+        f"Título: {TITLE}\n"
+        "Duración: 356 segundos\n",
+        encoding='utf-8'
+    )
+    for language in ('es', 'en'):
+        (video_dir / f'subtitles_{language}.srt').write_text(
+            '1\n00:00:01,000 --> 00:00:02,000\nHola\n', encoding='utf-8'
+        )
+    return video_dir
+
+def test_baseline_dir_is_processed(processor):
+    """Una carpeta antigua completa se reconoce por la URL de su reporte"""
+    video_dir = make_baseline_dir(processor.output_dir)
+    processor.catalog.reconcile(force=True)
+    assert processor.processed_dir(VIDEO_ID) == video_dir
+    assert processor.catalog.find(VIDEO_ID) == TITLE
+
+def test_baseline_dir_is_reused(processor):
+    """Si hay que reprocesarla, se usa la misma carpeta y no una «título [ID]»"""
+    video_dir = make_baseline_dir(processor.output_dir)
+    (video_dir / 'subtitles_en.srt').unlink()
+    processor.catalog.reconcile(force=True)
+    assert processor.processed_dir(VIDEO_ID) is None
+    assert processor.video_dir(VIDEO_ID, TITLE) == video_dir
+
+def test_unregistered_baseline_dir_is_reused(processor):
+    """Sin entrada en el catálogo, la carpeta del título se reconoce por su reporte"""
+    video_dir = make_baseline_dir(processor.output_dir)
+    (video_dir / 'index.html').unlink()
+    processor.catalog.reconcile(force=True)
+    assert processor.catalog.find(VIDEO_ID) is None
+    assert processor.video_dir(VIDEO_ID, TITLE) == video_dir
+
+def test_other_video_with_same_title(processor):
+    """Otro video con el mismo título no reutiliza la carpeta"""
+    make_baseline_dir(processor.output_dir)
+    assert processor.video_dir('xxxxxxxxxxx', TITLE) == processor.output_dir / f'{TITLE} [xxxxxxxxxxx]'
+
+def test_processed_video_counts_as_skipped(processor, monkeypatch):
+    """Un video ya procesado no se vuelve a procesar ni cuenta como hecho"""
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, 'metrics', registry)
+    make_baseline_dir(processor.output_dir)
+    processor.catalog.reconcile(force=True)
+    assert asyncio.run(processor.process_video(f'https://www.youtube.com/watch?v={VIDEO_ID}'))
+    assert 'srt_videos_total{status="skipped"} 1' in registry.render()
+    assert 'status="done"' not in registry.render()
+
+def test_lookups_do_not_walk_archive(processor, monkeypatch):
+    """Las búsquedas por ID y el listado no vuelven a recorrer la carpeta de salida"""
+    make_baseline_dir(processor.output_dir)
+    processor.catalog.reconcile(force=True)
+
+    walks = []
+    iterdir = Path.iterdir
+    def counting_iterdir(path):
+        if path == processor.output_dir:
+            walks.append(path)
+        return iterdir(path)
+    monkeypatch.setattr(Path, 'iterdir', counting_iterdir)
+
+    for _ in range(20):
+        assert processor.catalog.find(VIDEO_ID) == TITLE
+        processor.catalog.reconcile()
+        assert processor.catalog.query()[1] == 1
+
+    # Un video publicado se añade al índice sin recorrer la carpeta
+    other_dir = processor.output_dir / 'Otro video [xxxxxxxxxxx]'
+    other_dir.mkdir()
+    (other_dir / 'index.html').write_text('<h1>Otro</h1>', encoding='utf-8')
+    processor.catalog.upsert(other_dir, 'https://youtu.be/xxxxxxxxxxx', 'xxxxxxxxxxx')
+    assert processor.catalog.find('xxxxxxxxxxx') == other_dir.name
+    assert walks == []
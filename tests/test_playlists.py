@@ -0,0 +1,91 @@
+"""
+Pruebas de la paginación de playlists (playlists.py)
+"""
+
+import pytest
+from yt_dlp.utils import OnDemandPagedList
+import playlists
+from cache import PlaylistCache, ResultCache
+
+IDS = [f'v{i:09d}x' for i in range(300)]
+PAGE_SIZE = 50
+
+class FakeYoutubeDL:
+    """YoutubeDL con una playlist de IDS y un contador de entradas pedidas"""
+
+    ids = IDS
+    paged = False
+    pulled = 0
+    opened = 0
+
+    def __init__(self, options):
+        FakeYoutubeDL.opened += 1
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _info(video_id):
+        FakeYoutubeDL.pulled += 1
+        return {'id': video_id, 'title': 'Video ' + video_id, 'url': 'https://youtu.be/' + video_id, 'duration': 60}
+
+    def extract_info(self, url, download=False, process=True, ie_key=None):
+        ids = list(self.ids)
+        if self.paged:
+            def page(number):
+                return [self._info(video_id) for video_id in ids[number * PAGE_SIZE:(number + 1) * PAGE_SIZE]]
+            entries = OnDemandPagedList(page, PAGE_SIZE)
+        else:
+            entries = (self._info(video_id) for video_id in ids)
+        return {'_type': 'playlist', 'title': 'Lista', 'entries': entries}
+
+@pytest.fixture
+def expander(tmp_path, monkeypatch):
+    monkeypatch.setattr(playlists, 'YoutubeDL', FakeYoutubeDL)
+    monkeypatch.setattr(FakeYoutubeDL, 'ids', IDS)
+    monkeypatch.setattr(FakeYoutubeDL, 'pulled', 0)
+    monkeypatch.setattr(FakeYoutubeDL, 'opened', 0)
+    return playlists.PlaylistExpander(PlaylistCache(ResultCache(cache_dir=tmp_path)))
+
+def entries(events):
+    return [(event['index'], event['id']) for event in events if event['type'] == 'entry']
+
+@pytest.mark.parametrize('paged', [False, True])
+def test_next_page_fetches_only_new_entries(expander, monkeypatch, paged):
+    """Cada página continúa donde acabó la anterior, sin volver al principio"""
+    monkeypatch.setattr(FakeYoutubeDL, 'paged', paged)
+    first = list(expander.expand('lista', 1, 100))
+    assert entries(first) == list(enumerate(IDS[:100], 1))
+    assert first[-1]['more'] and first[-1]['total'] is None
+
+    FakeYoutubeDL.pulled = 0
+    second = list(expander.expand('lista', 101, 200))
+    assert entries(second) == list(enumerate(IDS[100:200], 101))
+    assert FakeYoutubeDL.pulled == 100
+
+    # La caché guarda las dos páginas
+    cached = list(expander.expand('lista', 1, 200))
+    assert cached[0]['cached'] and len(entries(cached)) == 200
+
+    last = list(expander.expand('lista', 201))
+    assert entries(last) == list(enumerate(IDS[200:], 201))
+    assert last[-1] == {'type': 'end', 'count': 100, 'total': 300, 'more': False}
+
+def test_page_without_cache_starts_at_offset(expander, monkeypatch):
+    """Sin caché, una lista paginada solo pide las páginas del tramo"""
+    monkeypatch.setattr(FakeYoutubeDL, 'paged', True)
+    events = list(expander.expand('lista', 151, 200))
+    assert entries(events) == list(enumerate(IDS[150:200], 151))
+    # yt-dlp puede pedir también la página siguiente, nunca las anteriores
+    assert FakeYoutubeDL.pulled <= 2 * PAGE_SIZE
+
+def test_stale_cache_fetches_new_head(expander, monkeypatch):
+    """Con la caché caducada solo se piden las entradas nuevas del principio"""
+    list(expander.expand('lista', 1, 100))
+    expander.cache.ttl = -1
+    monkeypatch.setattr(FakeYoutubeDL, 'ids', ['nuevo00001x'] + IDS)
+    FakeYoutubeDL.pulled = 0
+
+    events = list(expander.expand('lista', 1, 5))
+    assert entries(events) == list(enumerate(['nuevo00001x'] + IDS[:4], 1))
+    assert FakeYoutubeDL.pulled == 2
@@ -0,0 +1,90 @@
+"""
+Pruebas del planificador de llamadas a OpenAI (ratelimit.py)
+"""
+
+import asyncio
+from ratelimit import RateLimiter
+
+class Raw:
+    """Respuesta cruda mínima (with_raw_response)"""
+
+    headers = {}
+
+    def parse(self):
+        return 'ok'
+
+def test_cancelled_call_releases_slot():
+    """Una llamada cancelada a mitad no se queda con su hueco de concurrencia"""
+    limiter = RateLimiter(rpm=0, tpm=0, max_concurrency=2, max_retries=0)
+
+    async def hang():
+        await asyncio.sleep(3600)
+
+    async def ok():
+        return Raw()
+
+    async def main():
+        for _ in range(2):
+            task = asyncio.create_task(limiter.call('model', hang))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        assert limiter.budget('model').in_flight == 0 and limiter.in_flight == 0
+        return await asyncio.wait_for(limiter.call('model', ok), timeout=1)
+
+    assert asyncio.run(main()) == 'ok'
+
+def test_failed_call_releases_slot():
+    """Un error que no se reintenta también libera el hueco"""
+    limiter = RateLimiter(rpm=0, tpm=0, max_concurrency=1, max_retries=0)
+
+    async def fail():
+        raise ValueError('fallo')
+
+    async def main():
+        try:
+            await limiter.call('model', fail)
+        except ValueError:
+            pass
+        return limiter.budget('model').in_flight
+
+    assert asyncio.run(main()) == 0
+
+def test_learned_limits_start_with_remaining_budget():
+    """Los primeros límites aprendidos parten de lo que queda, no de cero"""
+    limiter = RateLimiter(rpm=0, tpm=0, max_concurrency=2, max_retries=0)
+    budget = limiter.budget('model')
+    budget.learn({
+        'x-ratelimit-limit-requests': '500',
+        'x-ratelimit-remaining-requests': '499',
+        'x-ratelimit-limit-tokens': '30000',
+        'x-ratelimit-remaining-tokens': '29000'
+    }, budget._updated)
+    assert budget.try_acquire(1000, budget._updated) == 0
+
+def test_concurrency_cap_is_shared_by_models():
+    """OPENAI_CONCURRENCY limita las llamadas de todos los modelos juntos"""
+    limiter = RateLimiter(rpm=0, tpm=0, max_concurrency=2, max_retries=0)
+    started = []
+
+    async def hang(model):
+        started.append(model)
+        await asyncio.sleep(3600)
+
+    async def main():
+        tasks = [
+            asyncio.create_task(limiter.call(model, lambda model=model: hang(model)))
+            for model in ('whisper-1', 'gpt-4o-mini', 'whisper-1', 'gpt-4o-mini')
+        ]
+        await asyncio.sleep(0.2)
+        running = len(started)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return running
+
+    assert asyncio.run(main()) == 2
+    assert limiter.in_flight == 0
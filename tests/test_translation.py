@@ -0,0 +1,33 @@
+"""
+Pruebas de la traducción por lotes (processor.py)
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from processor import VideoProcessor
+
+class FencedLimiter:
+    """Planificador que responde como un modelo que envuelve el JSON en ```json"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def call(self, model, request, tokens=0):
+        self.calls += 1
+        content = '```json\n' + json.dumps(['Hello', 'Goodbye']) + '\n```\n'
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.setenv('OUTPUT_DIR', str(tmp_path / 'output'))
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path / 'cache'))
+    return VideoProcessor()
+
+def test_fenced_json_reply_is_accepted(processor):
+    """Una respuesta con el JSON en un bloque de código vale a la primera"""
+    processor.rate_limiter = FencedLimiter()
+    translated = asyncio.run(processor._translate_texts(None, ['Hola', 'Adiós'], 'en'))
+    assert translated == ['Hello', 'Goodbye']
+    assert processor.rate_limiter.calls == 1
@@ -0,0 +1,34 @@
+"""
+Pruebas de la cola de trabajos persistente (workqueue.py)
+"""
+
+import time
+from jobs import Job
+from workqueue import WorkQueue
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    """Un trabajo cuyo lease caduca pasa a otro worker y el primero ya no puede tocarlo"""
+    db_path = tmp_path / 'jobs.db'
+    first = WorkQueue(db_path, lease_seconds=0.2)
+    second = WorkQueue(db_path, lease_seconds=60)
+    job = first.add(Job('https://www.youtube.com/watch?v=VYfGCMojSDk').to_dict())
+
+    claimed = first.claim()
+    assert claimed['id'] == job['id'] and claimed['worker'] == first.owner
+    assert second.claim() is None
+    assert first.heartbeat(claimed)
+
+    time.sleep(0.3)
+    reclaimed = second.claim()
+    assert reclaimed['id'] == job['id']
+    assert reclaimed['worker'] == second.owner and reclaimed['attempts'] == 2
+
+    # El primer worker ha perdido el lease: su progreso y su resultado se descartan
+    assert not first.heartbeat(claimed)
+    claimed.update(status='done', finished_at='2026-01-01 00:00:00')
+    assert not first.finish(claimed)
+    assert not first.release(claimed['id'])
+    assert second.get(job['id'])['status'] == 'running'
+
+    assert second.release(job['id'])
+    assert second.get(job['id'])['status'] == 'queued'
@@ -0,0 +1,519 @@
+"""
+SRT YouTube Generator - Work Queue
+-------------------------------------
+Este módulo implementa la cola de trabajos persistente (SQLite) que comparten
+el servidor web y los procesos de trabajo, en la misma máquina o en varias
+que usen la misma base de datos (JOBS_DB):
+- Los trabajos sobreviven a un reinicio del servidor a mitad de un lote
+- Cada trabajo en curso tiene un lease que su worker renueva (heartbeat)
+- Los trabajos cuyo lease caduca (worker caído) se vuelven a reclamar
+- Número máximo de intentos por trabajo abandonado
+- Registro de cambios para notificar el progreso entre procesos
+- Limpieza de los trabajos terminados antiguos
+
+Clases:
+    WorkQueue: Cola de trabajos persistente con leases
+
+Funciones:
+    journal_mode: Modo de diario de las bases de datos SQLite compartidas
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Columnas de un trabajo que se guardan como JSON
+JSON_COLUMNS = ('progress', 'result')
+
+# Modos de diario de SQLite admitidos. WAL necesita memoria compartida, así
+# que no funciona con la base de datos en NFS o SMB (workers en varias
+# máquinas); ahí hay que usar el diario clásico (delete).
+JOURNAL_MODES = ('wal', 'delete', 'truncate', 'persist')
+
+# Segundos mínimos entre dos limpiezas de trabajos terminados
+PRUNE_INTERVAL = 3600
+
+def journal_mode():
+    """
+    Modo de diario de las bases de datos SQLite compartidas (trabajos y catálogo).
+
+    Returns:
+        str: Valor de SQLITE_JOURNAL_MODE (wal por defecto)
+    """
+    mode = os.getenv('SQLITE_JOURNAL_MODE', 'wal').lower()
+    if mode not in JOURNAL_MODES:
+        raise ValueError(f"Modo de diario de SQLite desconocido: {mode}")
+    return mode
+
+class WorkQueue:
+    """
+    Cola de trabajos persistente con leases.
+
+    Cada operación abre su propia conexión, así que una instancia se puede
+    usar desde varios hilos. Las operaciones que reclaman o modifican
+    trabajos usan transacciones inmediatas, de modo que dos workers nunca
+    reclaman el mismo trabajo aunque estén en procesos distintos.
+
+    Cada cambio incrementa la versión del trabajo (un contador global) y
+    guarda qué instancia lo hizo, para que cada proceso pueda publicar solo
+    los cambios hechos por otros (ver changes).
+
+    Los trabajos terminados hace más de retention_days se borran (ver prune).
+
+    La base de datos guarda las URLs y los errores de todos los trabajos, así
+    que por defecto está fuera de la carpeta output, que se sirve por HTTP.
+
+    Atributos:
+        db_path (Path): Ruta de la base de datos SQLite
+        lease_seconds (float): Duración del lease de un trabajo en curso
+        max_attempts (int): Veces que se reclama un trabajo antes de darlo por fallido
+        retention_days (float): Días que se guardan los trabajos terminados (0: siempre)
+        owner (str): Identificador de esta instancia (máquina:pid:aleatorio)
+    """
+
+    def __init__(self, db_path=None, lease_seconds=None, max_attempts=None, retention_days=None):
+        self.db_path = Path(db_path or os.getenv('JOBS_DB', Path(os.getenv('CACHE_DIR', '.cache')) / 'jobs.db'))
+        self.lease_seconds = lease_seconds or float(os.getenv('JOB_LEASE_SECONDS', '60'))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+        self.retention_days = (
+            retention_days if retention_days is not None else float(os.getenv('JOB_RETENTION_DAYS', '7'))
+        )
+        self._pruned_at = 0
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._init_db()
+
+    def _connect(self):
+        """
+        Abre una conexión nueva (una por operación, segura entre hilos); hay
+        que cerrarla al terminar (closing)
+        """
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _init_db(self):
+        """Crea las tablas si no existen"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        db = self._connect()
+        try:
+            db.execute(f'PRAGMA journal_mode={journal_mode().upper()}')
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    batch_id TEXT,
+                    video_id TEXT,
+                    skipped INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires REAL,
+                    version INTEGER NOT NULL,
+                    updated_by TEXT
+                )
+            ''')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_video_id ON jobs (video_id, status)')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_version ON jobs (version)')
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    batch_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    job_id TEXT NOT NULL,
+                    PRIMARY KEY (batch_id, position)
+                )
+            ''')
+        finally:
+            db.close()
+
+    def _transaction(self, db):
+        """Inicia una transacción que bloquea la escritura desde el principio"""
+        db.execute('BEGIN IMMEDIATE')
+
+    def _next_version(self, db):
+        """Siguiente versión del registro de cambios"""
+        return db.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM jobs').fetchone()[0]
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def _row_to_dict(row):
+        """Convierte una fila en el diccionario de campos de un trabajo"""
+        data = dict(row)
+        for column in JSON_COLUMNS:
+            data[column] = json.loads(data[column]) if data[column] else None
+        data['progress'] = data['progress'] or {}
+        data['skipped'] = bool(data['skipped'])
+        return data
+
+    def add(self, job):
+        """
+        Guarda un trabajo nuevo.
+
+        Si el trabajo está en cola y ya hay otro en cola o en curso para el
+        mismo video, no se guarda y se devuelve el existente.
+
+        Args:
+            job (dict): Campos del trabajo (ver Job.to_dict)
+
+        Returns:
+            dict: El trabajo guardado o el existente del mismo video
+        """
+        self._maybe_prune()
+        db = self._connect()
+        try:
+            self._transaction(db)
+            if job['video_id'] and job['status'] == 'queued':
+                existing = db.execute(
+                    "SELECT * FROM jobs WHERE video_id = ? AND status IN ('queued', 'running') LIMIT 1",
+                    (job['video_id'],)
+                ).fetchone()
+                if existing is not None:
+                    db.execute('COMMIT')
+                    return self._row_to_dict(existing)
+
+            db.execute('''
+                INSERT INTO jobs (
+                    id, url, batch_id, video_id, skipped, status, error, created_at,
+                    started_at, finished_at, progress, result, version, updated_by
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                job['id'], job['url'], job['batch_id'], job['video_id'], int(job['skipped']),
+                job['status'], job['error'], job['created_at'], job['started_at'],
+                job['finished_at'], json.dumps(job['progress']),
+                json.dumps(job['result']) if job['result'] is not None else None,
+                self._next_version(db), self.owner
+            ))
+            db.execute('COMMIT')
+            return job
+        except Exception:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        finally:
+            db.close()
+
+    def add_batch(self, batch_id, job_ids):
+        """
+        Guarda los trabajos que forman un lote, en orden.
+
+        Args:
+            batch_id (str): Identificador del lote
+            job_ids (list): Identificadores de los trabajos
+        """
+        with closing(self._connect()) as db:
+            self._transaction(db)
+            try:
+                db.executemany(
+                    'INSERT INTO batch_jobs (batch_id, position, job_id) VALUES (?, ?, ?)',
+                    [(batch_id, position, job_id) for position, job_id in enumerate(job_ids)]
+                )
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+
+    def claim(self):
+        """
+        Reclama el trabajo en cola más antiguo, o uno abandonado.
+
+        Un trabajo en curso cuyo lease ha caducado se considera abandonado
+        por su worker: se vuelve a reclamar si le quedan intentos y, si no,
+        se da por fallido.
+
+        Returns:
+            dict: Trabajo reclamado (ahora en curso) o None si no hay ninguno
+        """
+        self._maybe_prune()
+        db = self._connect()
+        try:
+            self._transaction(db)
+            now = time.time()
+
+            abandoned = db.execute(
+                "SELECT id, attempts FROM jobs WHERE status = 'running' AND lease_expires < ?",
+                (now,)
+            ).fetchall()
+            for row in abandoned:
+                if row['attempts'] >= self.max_attempts:
+                    print(f"El trabajo {row['id']} se ha abandonado {row['attempts']} veces; se da por fallido")
+                    db.execute('''
+                        UPDATE jobs SET status = 'failed', error = ?, finished_at = ?,
+                            worker = NULL, lease_expires = NULL, version = ?, updated_by = ?
+                        WHERE id = ?
+                    ''', (
+                        f"El trabajo se abandonó {row['attempts']} veces sin terminar",
+                        self._now(), self._next_version(db), self.owner, row['id']
+                    ))
+
+            row = db.execute('''
+                SELECT * FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?)
+                ORDER BY status = 'running' DESC, created_at, rowid
+                LIMIT 1
+            ''', (now,)).fetchone()
+            if row is None:
+                db.execute('COMMIT')
+                return None
+
+            if row['status'] == 'running':
+                print(f"Reclamando el trabajo abandonado {row['id']} (worker {row['worker']})")
+            db.execute('''
+                UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1,
+                    worker = ?, lease_expires = ?, version = ?, updated_by = ?
+                WHERE id = ?
+            ''', (
+                self._now(), self.owner, now + self.lease_seconds,
+                self._next_version(db), self.owner, row['id']
+            ))
+            claimed = db.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+            db.execute('COMMIT')
+            return self._row_to_dict(claimed)
+        except Exception:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        finally:
+            db.close()
+
+    def _update_owned(self, job_id, assignments, params):
+        """
+        Actualiza un trabajo en curso solo si esta instancia tiene su lease.
+
+        Returns:
+            bool: False si el lease se ha perdido (otro worker lo reclamó)
+        """
+        db = self._connect()
+        try:
+            self._transaction(db)
+            cursor = db.execute(f'''
+                UPDATE jobs SET {assignments}, version = ?, updated_by = ?
+                WHERE id = ? AND worker = ? AND status = 'running'
+            ''', (*params, self._next_version(db), self.owner, job_id, self.owner))
+            db.execute('COMMIT')
+            return cursor.rowcount == 1
+        except Exception:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        finally:
+            db.close()
+
+    def heartbeat(self, job):
+        """
+        Renueva el lease de un trabajo en curso y guarda su progreso.
+
+        Args:
+            job (dict): Campos del trabajo (ver Job.to_dict)
+
+        Returns:
+            bool: False si el lease se ha perdido
+        """
+        return self._update_owned(
+            job['id'],
+            'lease_expires = ?, progress = ?, result = ?',
+            (
+                time.time() + self.lease_seconds, json.dumps(job['progress']),
+                json.dumps(job['result']) if job['result'] is not None else None
+            )
+        )
+
+    def finish(self, job):
+        """
+        Guarda el resultado de un trabajo terminado y libera su lease.
+
+        Args:
+            job (dict): Campos del trabajo (ver Job.to_dict)
+
+        Returns:
+            bool: False si el lease se había perdido y el resultado se descarta
+        """
+        return self._update_owned(
+            job['id'],
+            'status = ?, error = ?, finished_at = ?, progress = ?, result = ?, '
+            'worker = NULL, lease_expires = NULL',
+            (
+                job['status'], job['error'], job['finished_at'], json.dumps(job['progress']),
+                json.dumps(job['result']) if job['result'] is not None else None
+            )
+        )
+
+    def release(self, job_id):
+        """
+        Devuelve a la cola un trabajo en curso que este worker no va a
+        terminar (por ejemplo al pararlo), sin gastar un intento.
+
+        Args:
+            job_id (str): Identificador del trabajo
+
+        Returns:
+            bool: False si el lease ya se había perdido
+        """
+        return self._update_owned(
+            job_id,
+            "status = 'queued', started_at = NULL, attempts = MAX(attempts - 1, 0), "
+            "worker = NULL, lease_expires = NULL",
+            ()
+        )
+
+    def get(self, job_id):
+        """
+        Obtiene un trabajo por su identificador.
+
+        Args:
+            job_id (str): Identificador del trabajo
+
+        Returns:
+            dict: Campos del trabajo o None si no existe
+        """
+        with closing(self._connect()) as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, status=None):
+        """
+        Lista los trabajos, del más antiguo al más reciente.
+
+        Args:
+            status (str): Filtrar por estado (opcional)
+
+        Returns:
+            list: Campos de cada trabajo
+        """
+        where, params = '', ()
+        if status:
+            where, params = 'WHERE status = ?', (status,)
+        with closing(self._connect()) as db:
+            rows = db.execute(f'SELECT * FROM jobs {where} ORDER BY created_at, rowid', params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def counts(self):
+        """
+        Cuenta los trabajos por estado.
+
+        Returns:
+            dict: Número de trabajos de cada estado presente
+        """
+        with closing(self._connect()) as db:
+            rows = db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def batch_job_ids(self, batch_id):
+        """
+        Identificadores de los trabajos de un lote, en orden.
+
+        Args:
+            batch_id (str): Identificador del lote
+
+        Returns:
+            list: Identificadores (vacío si el lote no existe)
+        """
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                'SELECT job_id FROM batch_jobs WHERE batch_id = ? ORDER BY position',
+                (batch_id,)
+            ).fetchall()
+        return [row['job_id'] for row in rows]
+
+    def batch(self, batch_id):
+        """
+        Trabajos de un lote, en orden.
+
+        Args:
+            batch_id (str): Identificador del lote
+
+        Returns:
+            list: Campos de cada trabajo, o None si el lote no existe
+        """
+        with closing(self._connect()) as db:
+            rows = db.execute('''
+                SELECT jobs.* FROM batch_jobs JOIN jobs ON jobs.id = batch_jobs.job_id
+                WHERE batch_jobs.batch_id = ? ORDER BY batch_jobs.position
+            ''', (batch_id,)).fetchall()
+        return [self._row_to_dict(row) for row in rows] or None
+
+    def version(self):
+        """Versión actual del registro de cambios"""
+        with closing(self._connect()) as db:
+            return db.execute('SELECT COALESCE(MAX(version), 0) FROM jobs').fetchone()[0]
+
+    def changes(self, since):
+        """
+        Trabajos cambiados por otras instancias desde una versión.
+
+        Args:
+            since (int): Última versión ya vista
+
+        Returns:
+            tuple: (lista de trabajos cambiados, versión más reciente)
+        """
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                'SELECT * FROM jobs WHERE version > ? ORDER BY version',
+                (since,)
+            ).fetchall()
+        if not rows:
+            return [], since
+        changed = [self._row_to_dict(row) for row in rows if row['updated_by'] != self.owner]
+        return changed, rows[-1]['version']
+
+    def prune(self):
+        """
+        Borra los trabajos terminados hace más de retention_days y sus
+        entradas en los lotes.
+
+        El trabajo con la versión más reciente no se borra nunca, para que
+        el registro de cambios no vuelva a números ya usados.
+
+        Returns:
+            int: Trabajos borrados
+        """
+        if not self.retention_days:
+            return 0
+        cutoff = datetime.fromtimestamp(time.time() - self.retention_days * 86400).strftime('%Y-%m-%d %H:%M:%S')
+        with closing(self._connect()) as db:
+            self._transaction(db)
+            try:
+                cursor = db.execute('''
+                    DELETE FROM jobs
+                    WHERE status IN ('done', 'failed') AND finished_at < ?
+                        AND version < (SELECT MAX(version) FROM jobs)
+                ''', (cutoff,))
+                if cursor.rowcount:
+                    db.execute('DELETE FROM batch_jobs WHERE job_id NOT IN (SELECT id FROM jobs)')
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        return cursor.rowcount
+
+    def _maybe_prune(self):
+        """Limpia los trabajos terminados como mucho cada PRUNE_INTERVAL segundos"""
+        if time.time() - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = time.time()
+        try:
+            removed = self.prune()
+        except sqlite3.Error as e:
+            print(f"Error limpiando la cola de trabajos: {str(e)}")
+            return
+        if removed:
+            print(f"Borrados {removed} trabajos terminados de la cola")